@@ -0,0 +1,22 @@
+# gunicorn の設定（リポジトリのルートで gunicorn -c myproject/gunicorn.conf.py を実行）
+#
+# マスターでアプリを読み込み（preload_app）、モジュール・URL表・テンプレートを準備してから
+# ワーカーをフォークする。DB接続はワーカーごとに持つため、フォーク後に各ワーカーで準備する。
+
+wsgi_app = 'myproject.myproject.wsgi:application'
+bind = '127.0.0.1:8000'
+workers = 4
+preload_app = True
+
+
+def when_ready(server):
+    from myproject.myapp import metrics
+    from myproject.myapp.warmup import warm_up
+    warm_up(steps=['imports', 'urls', 'templates'])
+    # 前回起動時のワーカーのメトリクスを消してから、ワーカーをフォークする
+    metrics.clear_dir()
+
+
+def post_fork(server, worker):
+    from myproject.myapp.warmup import warm_up
+    warm_up(steps=['database'])
@@ -1,9 +1,137 @@
-from django.contrib import admin
+from contextlib import nullcontext
+from datetime import date
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from . import cube, snapshot
 from .models import (
     HabitCategory, DailyDiary, ActionLog, Goal, 
-    AIRecommendation, UserProfile
+    AIRecommendation, UserProfile, RecommendationRule, ActionItemStat,
+    CohortAnalytics, ArchiveSegment, RecommendationTemplate, ChangeLog, Notification, Job
 )
 
+# =====================
+# 大規模テーブル向けの管理画面部品
+# =====================
+def estimate_row_count(queryset):
+    """
+    テーブルの概算件数。統計情報（PostgreSQL の reltuples / SQLite の sqlite_stat1）を使い、
+    なければ主キーの最大値で代用する（いずれも全件走査しない）。
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    table = model._meta.db_table
+    row = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 は ANALYZE 実行前は存在しない
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+
+    if row and row[0] is not None:
+        estimate = int(float(str(row[0]).split()[0]))
+        if estimate > 0:
+            return estimate
+    return model._default_manager.using(queryset.db).aggregate(last=Max('pk'))['last'] or 0
+
+
+def prefix_range(field, term):
+    """
+    前方一致を索引の範囲検索（>= term かつ < term + 最大文字）で表す
+    """
+    return Q(**{f'{field}__gte': term, f'{field}__lt': term + '\U0010ffff'})
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    絞り込みのない一覧では COUNT(*) の代わりに概算件数を使うページネータ
+    """
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            return estimate_row_count(self.object_list)
+        return super().count
+
+
+class DateDrilldownFilter(admin.SimpleListFilter):
+    """
+    年→月の日付ドリルダウン。
+    選択肢は最古・最新の日付（索引で各1回の参照）から作るため、
+    date_hierarchy のような DISTINCT 集計クエリを発行しない。
+    """
+    title = '年月'
+    parameter_name = 'month'
+    field_name = 'date'
+
+    def lookups(self, request, model_admin):
+        manager = model_admin.model._default_manager
+        first = manager.order_by(self.field_name).values_list(self.field_name, flat=True).first()
+        last = manager.order_by(f'-{self.field_name}').values_list(self.field_name, flat=True).first()
+        if first is None:
+            return []
+
+        choices = []
+        selected_year = (self.value() or '')[:4]
+        for year in range(last.year, first.year - 1, -1):
+            choices.append((str(year), f'{year}年'))
+            if str(year) == selected_year:
+                choices += [(f'{year}-{month:02d}', f'{year}年{month}月') for month in range(12, 0, -1)]
+        return choices
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        try:
+            year, _, month = value.partition('-')
+            year = int(year)
+            if month:
+                start = date(year, int(month), 1)
+                end = date(year + (start.month == 12), start.month % 12 + 1, 1)
+            else:
+                start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        except ValueError:
+            return queryset
+        return queryset.filter(**{f'{self.field_name}__gte': start, f'{self.field_name}__lt': end})
+
+
+class LargeTableAdminMixin:
+    """
+    行数の多いテーブル向けの管理画面設定。
+    ・概算件数によるページング（全件数の COUNT(*) も行わない）
+    ・外部キーは select_related で一括取得
+    ・検索はユーザー名の完全一致と、索引のある項目の前方一致（範囲検索）のみ
+    ・日付は DISTINCT 集計を伴わないドリルダウンで絞り込み
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # 前方一致で検索する（索引のある）文字列項目
+    prefix_search_fields = []
+    search_help_text = 'ユーザー名（完全一致）またはタイトル・行動名の先頭一致で検索'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(self.get_search_condition(term)), False
+
+    def get_search_condition(self, term):
+        # ユーザー名は先に ID を引き、同一テーブル内の索引だけで絞り込めるようにする
+        condition = Q(user_id__in=list(User.objects.filter(username=term).values_list('id', flat=True)))
+        for field in self.prefix_search_fields:
+            condition |= prefix_range(field, term)
+        return condition
+
 # =====================
 # 管理画面：習慣カテゴリ
 # =====================
@@ -20,21 +148,23 @@ class HabitCategoryAdmin(admin.ModelAdmin):
 # 管理画面：日記
 # =====================
 @admin.register(DailyDiary)
-class DailyDiaryAdmin(admin.ModelAdmin):
-    list_display = ['user', 'date', 'mood_score', 'energy_level', 'created_at']
-    list_filter = ['date', 'mood_score', 'energy_level', 'created_at']
-    search_fields = ['user__username', 'content']
-    date_hierarchy = 'date'  # 日付階層ナビ
+class DailyDiaryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['user', 'date', 'mood_score', 'energy_level', 'sentiment', 'created_at']
+    list_filter = [DateDrilldownFilter, 'mood_score', 'energy_level']  # 日付ドリルダウン
+    list_select_related = ['user']
+    search_fields = ['=user__username']
+    search_help_text = 'ユーザー名（完全一致）で検索'
 
 # =====================
 # 管理画面：行動ログ
 # =====================
 @admin.register(ActionLog)
-class ActionLogAdmin(admin.ModelAdmin):
+class ActionLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'category', 'action_name', 'duration_minutes', 'completed', 'date']
-    list_filter = ['category', 'completed', 'date', 'created_at']
-    search_fields = ['user__username', 'action_name', 'notes']
-    date_hierarchy = 'date'
+    list_filter = [DateDrilldownFilter, 'category', 'completed']
+    list_select_related = ['user', 'category']
+    search_fields = ['=user__username', '^action_name']
+    prefix_search_fields = ['action_name']
 
 # =====================
 # 管理画面：目標
@@ -50,18 +180,159 @@ class GoalAdmin(admin.ModelAdmin):
 # 管理画面：AI提案
 # =====================
 @admin.register(AIRecommendation)
-class AIRecommendationAdmin(admin.ModelAdmin):
+class AIRecommendationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'date', 'recommendation_type', 'title', 'priority', 'is_implemented', 'feedback_rating']
-    list_filter = ['recommendation_type', 'priority', 'is_implemented', 'date', 'created_at']
-    search_fields = ['user__username', 'title', 'content']
-    date_hierarchy = 'date'
+    list_filter = [DateDrilldownFilter, 'recommendation_type', 'priority', 'is_implemented']
+    list_select_related = ['user']
+    raw_id_fields = ['template']
+    search_fields = ['=user__username', '^title']
+    prefix_search_fields = ['title']
+
+    def get_search_condition(self, term):
+        # テンプレート参照の提案はタイトルをテンプレート側で検索（テンプレートは少数）
+        template_ids = list(
+            RecommendationTemplate.objects.filter(prefix_range('title', term)).values_list('id', flat=True)
+        )
+        return super().get_search_condition(term) | Q(template_id__in=template_ids)
 
 # =====================
 # 管理画面：ユーザープロフィール
 # =====================
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'ai_feedback_frequency', 'notification_enabled', 'created_at']
+    list_display = ['user', 'ai_feedback_frequency', 'notification_enabled', 'reminder_time', 'created_at']
     list_filter = ['ai_feedback_frequency', 'notification_enabled', 'created_at']
     search_fields = ['user__username', 'bio']
     filter_horizontal = ['preferred_categories']  # 多対多カテゴリを横並びUIで選択可
+
+# =====================
+# 管理画面：AI提案ルール
+# =====================
+@admin.register(RecommendationRule)
+class RecommendationRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'stage', 'order', 'conditions', 'title', 'priority', 'is_active', 'updated_at']
+    list_filter = ['stage', 'priority', 'is_active']
+    list_editable = ['order', 'is_active']
+    search_fields = ['name', 'title']
+
+# =====================
+# 管理画面：アクション評価統計
+# =====================
+@admin.register(ActionItemStat)
+class ActionItemStatAdmin(admin.ModelAdmin):
+    list_display = ['action_item', 'user', 'trials', 'reward_sum', 'updated_at']
+    search_fields = ['action_item', 'user__username']
+    list_select_related = ['user']
+
+# =====================
+# 管理画面：全体分析（集計キューブ）
+# =====================
+@admin.register(CohortAnalytics)
+class CohortAnalyticsAdmin(admin.ModelAdmin):
+    """
+    集計キューブの一覧の代わりに、運営向けの全体分析ページを表示
+    """
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method == 'POST':
+            days = cube.refresh()
+            messages.success(request, f'{days}日分を再集計しました。')
+            # 再集計した直後の値を表示する
+            reading = nullcontext()
+        else:
+            reading = snapshot.reading()
+
+        weeks = request.GET.get('weeks', '12')
+        weeks = min(int(weeks), 104) if weeks.isdigit() and int(weeks) > 0 else 12
+        with reading:
+            summary = cube.summary(weeks)
+            snapshot_status = snapshot.status()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': '全体分析',
+            'weeks': weeks,
+            'cube': summary,
+            'snapshot': snapshot_status,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/myapp/cohort_analytics.html', context)
+
+# =====================
+# 管理画面：アーカイブセグメント
+# =====================
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ['model_name', 'month', 'min_date', 'max_date', 'row_count', 'path', 'created_at']
+    list_filter = ['model_name']
+    readonly_fields = ['model_name', 'month', 'path', 'min_date', 'max_date', 'row_count', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+# =====================
+# 管理画面：AI提案テンプレート
+# =====================
+@admin.register(RecommendationTemplate)
+class RecommendationTemplateAdmin(admin.ModelAdmin):
+    list_display = ['title', 'digest', 'created_at']
+    search_fields = ['title']
+    readonly_fields = ['digest', 'title', 'content', 'reasoning', 'action_items', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+# =====================
+# 管理画面：変更履歴（差分同期）
+# =====================
+@admin.register(ChangeLog)
+class ChangeLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['id', 'user', 'model_name', 'object_id', 'deleted', 'created_at']
+    list_filter = ['model_name', 'deleted']
+    list_select_related = ['user']
+    search_fields = ['=user__username']
+    search_help_text = 'ユーザー名（完全一致）で検索'
+    readonly_fields = ['user', 'model_name', 'object_id', 'deleted', 'created_at']
+
+    def has_add_permission(self, request):
+        return False
+
+# =====================
+# 管理画面：通知
+# =====================
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ['user', 'kind', 'date', 'read_at', 'created_at']
+    list_filter = [DateDrilldownFilter, 'kind']
+    list_select_related = ['user']
+    search_fields = ['=user__username']
+    search_help_text = 'ユーザー名（完全一致）で検索'
+
+# =====================
+# 管理画面：バックグラウンドジョブ
+# =====================
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'key', 'user', 'status', 'attempts', 'run_at', 'locked_by', 'finished_at']
+    list_filter = ['status', 'name']
+    list_select_related = ['user']
+    search_fields = ['=key', 'name']
+    readonly_fields = ['locked_by', 'locked_at', 'result', 'last_error', 'created_at', 'updated_at', 'finished_at']
+    actions = ['retry_jobs']
+
+    @admin.action(description='選択したジョブを再実行')
+    def retry_jobs(self, request, queryset):
+        # 同じキーのジョブが実行待ち・実行中なら戻さない
+        active_keys = Job.objects.filter(status__in=Job.ACTIVE_STATUSES, key__isnull=False).values('key')
+        count = queryset.filter(status='failed').exclude(key__in=active_keys).update(
+            status='queued', attempts=0, run_at=timezone.now(), finished_at=None
+        )
+        messages.success(request, f'{count}件のジョブを実行待ちに戻しました。')
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'  # デフォルト主キー型
     name = 'myproject.myapp'  # アプリ名
+
+    def ready(self):
+        # シグナルハンドラ・バックグラウンドジョブを登録
+        from . import signals, tasks  # noqa: F401
+        # メトリクスのファイルへの書き出しを開始
+        from . import metrics
+        metrics.start()
+        # 遅いクエリの記録を、以降に作られるDB接続に登録
+        from . import slowlog
+        slowlog.install()
@@ -0,0 +1,191 @@
+from datetime import date, timedelta
+import gzip
+import json
+from pathlib import Path
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, Q
+from django.db.models.functions import Cast, Mod
+from django.utils import timezone
+from . import changes, cube, durations, shards
+from .models import ActionLog, AIRecommendation, ArchiveSegment, RecommendationTemplate
+
+# =====================
+# ホット/コールド階層化（古い行動ログ・AI提案のアーカイブ）
+# =====================
+
+# アーカイブ対象のモデルと、セグメントに保存する項目
+ARCHIVED_MODELS = {
+    'actionlog': (ActionLog, [
+        'id', 'user_id', 'category_id', 'action_name', 'duration_minutes',
+        'completed', 'notes', 'date', 'client_id', 'created_at',
+    ]),
+    'airecommendation': (AIRecommendation, [
+        'id', 'user_id', 'date', 'recommendation_type', 'title', 'content', 'reasoning',
+        'action_items', 'template_id', 'params', 'priority', 'is_implemented',
+        'feedback_rating', 'created_at',
+    ]),
+}
+
+# 1回のトランザクションで移動する行数（SQLite のパラメータ上限 999 以内）
+ARCHIVE_BATCH_SIZE = 900
+
+
+def user_buckets():
+    return getattr(settings, 'ARCHIVE_USER_BUCKETS', 64)
+
+
+def archive_dir():
+    return Path(getattr(settings, 'ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def archive_cutoff(today=None):
+    """
+    これより前の日付がアーカイブ対象（ARCHIVE_HORIZON_DAYS 日より古いもの）
+    """
+    today = today or date.today()
+    return today - timedelta(days=getattr(settings, 'ARCHIVE_HORIZON_DAYS', 90))
+
+
+def archived_until(model_name):
+    """
+    アーカイブ済みの最新日付（なければ None）。これ以前の日付はコールド側を読む必要がある。
+    """
+    return ArchiveSegment.objects.filter(model_name=model_name).aggregate(
+        last=Max('max_date')
+    )['last']
+
+
+def covers(model_name, start):
+    """
+    start 以降を読むのにアーカイブ側も必要かどうか
+    """
+    last_archived = archived_until(model_name)
+    return last_archived is not None and start <= last_archived
+
+
+def archive_old_rows(today=None):
+    """
+    保存期間を過ぎた行を月・ユーザーの区分（ユーザーID % ARCHIVE_USER_BUCKETS）ごとの圧縮JSONLセグメントへ移し、
+    ホットテーブルから削除。モデル名ごとの移動件数を返す。
+    """
+    cutoff = archive_cutoff(today)
+    buckets = user_buckets()
+    # 移動前に未反映の変更を集計キューブへ反映しておく（アーカイブ後も集計値は残る）
+    cube.refresh()
+
+    moved = dict.fromkeys(ARCHIVED_MODELS, 0)
+    for alias in shards.aliases():
+        with shards.use(alias):
+            for model_name, (model, fields) in ARCHIVED_MODELS.items():
+                old_rows = model.objects.filter(date__lt=cutoff).annotate(
+                    user_bucket=Cast(Mod('user_id', buckets), IntegerField())
+                )
+                for bucket in sorted(set(old_rows.order_by().values_list('user_bucket', flat=True).distinct())):
+                    while True:
+                        rows = list(
+                            old_rows.filter(user_bucket=bucket).order_by('date', 'id').values(*fields)[:ARCHIVE_BATCH_SIZE]
+                        )
+                        if not rows:
+                            break
+                        _move_batch(model_name, model, rows, alias, bucket, buckets)
+                        moved[model_name] += len(rows)
+    return moved
+
+
+def _move_batch(model_name, model, rows, alias='default', bucket=None, buckets=None):
+    """
+    1バッチ分（同じユーザーの区分 bucket の行）をセグメントに書き出し、索引の登録（default）とホットテーブル（alias のシャード）からの削除を
+    それぞれのトランザクションで、削除が失敗すれば索引の登録も取り消されるように行う
+    """
+    by_month = {}
+    for row in rows:
+        if row.get('template_id'):
+            # テンプレート参照の提案は文面を展開して、セグメント単体で読めるようにする
+            row['title'], row['content'], row['reasoning'], row['action_items'] = (
+                RecommendationTemplate.cached(row['template_id']).render(row['params'])
+            )
+        by_month.setdefault(row['date'].replace(day=1), []).append(row)
+
+    written = []
+    try:
+        with transaction.atomic(), transaction.atomic(using=alias), cube.paused(), changes.paused(), durations.paused():
+            for month, month_rows in by_month.items():
+                path = _write_segment(model_name, month, month_rows, bucket)
+                written.append(path)
+                ArchiveSegment.objects.create(
+                    model_name=model_name,
+                    month=month,
+                    path=str(path.relative_to(archive_dir())),
+                    min_date=month_rows[0]['date'],
+                    max_date=month_rows[-1]['date'],
+                    row_count=len(month_rows),
+                    user_bucket=bucket,
+                    user_buckets=buckets,
+                )
+            model.objects.using(alias).filter(id__in=[row['id'] for row in rows]).delete()
+    except Exception:
+        # DBへの反映に失敗した場合は書き出したファイルを消す
+        for path in written:
+            path.unlink(missing_ok=True)
+        raise
+
+
+def _write_segment(model_name, month, rows, bucket=None):
+    directory = archive_dir() / model_name / f"{month:%Y-%m}"
+    if bucket is not None:
+        directory /= f"{bucket:03d}"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{timezone.now():%Y%m%d%H%M%S%f}-{rows[0]['id']}.jsonl.gz"
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False))
+            f.write('\n')
+    return path
+
+
+def iter_archived_rows(model_name, start, end, user=None):
+    """
+    アーカイブから [start, end] の行を dict で順に返す（日付は date 型に戻す）。
+    user を指定すると、そのユーザーの区分のセグメント（と区分のない古いセグメント）だけを開く。
+    """
+    segments = ArchiveSegment.objects.filter(
+        model_name=model_name,
+        max_date__gte=start,
+        min_date__lte=end,
+    ).order_by('month', 'id')
+    if user is not None:
+        segments = segments.filter(
+            Q(user_bucket__isnull=True) | Q(user_bucket=Cast(Mod(user.pk, F('user_buckets')), IntegerField()))
+        )
+
+    for segment in segments:
+        with gzip.open(archive_dir() / segment.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                row['date'] = date.fromisoformat(row['date'])
+                if start <= row['date'] <= end and (user is None or row['user_id'] == user.pk):
+                    yield row
+
+
+def tiered_rows(model_name, start, end, user=None, fields=None):
+    """
+    ホットテーブルとアーカイブを透過的に読み、[start, end] の行を dict のリストで返す。
+    期間がアーカイブ済みの日付にかからなければ、ホットテーブルだけを読む。
+    """
+    model, archived_fields = ARCHIVED_MODELS[model_name]
+    fields = fields or archived_fields
+
+    hot = model.objects.filter(date__gte=start, date__lte=end)
+    if user is not None:
+        hot = hot.filter(user=user)
+    rows = list(hot.values(*fields))
+
+    if covers(model_name, start):
+        last_archived = archived_until(model_name)
+        rows += [
+            {field: row.get(field) for field in fields}
+            for row in iter_archived_rows(model_name, start, min(end, last_archived), user)
+        ]
+    return rows
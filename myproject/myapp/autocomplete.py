@@ -0,0 +1,194 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import date, datetime
+import heapq
+import threading
+import time
+import unicodedata
+from django.db.models import Count
+from django.utils import timezone
+from . import categories, metrics, shards
+from .models import ActionLog
+from .versioncache import cache
+
+# =====================
+# 行動名の入力補完（ユーザーごとのプロセス内前方一致インデックス）
+# =====================
+#
+# ユーザーが過去に記録した行動名を、正規化した文字列の昇順に並べたリストで持ち、
+# 入力中の文字列で二分探索して候補を取り出す（1文字ごとに ActionLog へ LIKE 検索しない）。
+# インデックスは最初の補完時に1回の集計クエリで作り、以降は行動ログの作成時に差分で更新する。
+# 他のプロセスでの変更は、ユーザーごとのバージョン（キャッシュ）を CHECK_INTERVAL 秒ごとに確認して反映する。
+#
+# 候補の順位は「使った回数を、使った日からの経過日数で減衰させた合計」（半減期 HALF_LIFE_DAYS 日）。
+# よく使う行動ほど、また最近使った行動ほど上に来る。
+
+# 減衰の半減期（日）
+HALF_LIFE_DAYS = 14
+
+# 返す候補数の既定値と上限
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# インデックスを保持するユーザー数の上限（超えたら最も長く使われていないものを捨てる）
+MAX_USERS = 1000
+
+# 他のプロセスでの変更を確認する間隔（秒）
+CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_indexes = OrderedDict()  # ユーザーID → _Index
+
+
+def normalize(text):
+    """
+    比較用の正規化（全角・半角の統一と大文字・小文字の同一視）
+    """
+    return unicodedata.normalize('NFKC', text).casefold().strip()
+
+
+def _version_key(user_id):
+    return f'action-name-version:{user_id}'
+
+
+class _Index:
+    """
+    1ユーザー分のインデックス。
+    keys は (正規化した行動名, 行動名) の昇順リスト、
+    stats は {行動名: {カテゴリID: [減衰後の回数, 回数, 最後に使った日]}}。
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.base = date.today()  # 減衰の基準日（順位の比較にだけ使うため、作成日で固定）
+        self.keys = []
+        self.stats = {}
+
+    def add(self, action_name, category_id, day, count=1):
+        by_category = self.stats.get(action_name)
+        if by_category is None:
+            by_category = self.stats[action_name] = {}
+            insort(self.keys, (normalize(action_name), action_name))
+        stat = by_category.get(category_id)
+        if stat is None:
+            stat = by_category[category_id] = [0.0, 0, day]
+        stat[0] += count * 2 ** ((day - self.base).days / HALF_LIFE_DAYS)
+        stat[1] += count
+        stat[2] = max(stat[2], day)
+
+    def search(self, prefix, category_id, limit):
+        prefix = normalize(prefix)
+        lo = bisect_left(self.keys, (prefix,))
+        hi = bisect_left(self.keys, (prefix + '\U0010ffff',), lo)
+
+        candidates = []
+        for _, action_name in self.keys[lo:hi]:
+            by_category = self.stats[action_name]
+            if category_id is not None:
+                stat = by_category.get(category_id)
+                if stat is None:
+                    continue
+                candidates.append((stat[0], action_name, category_id, stat[1], stat[2]))
+            else:
+                # カテゴリを問わない場合は合算し、最もよく使うカテゴリを添える
+                main_category = max(by_category, key=lambda key: by_category[key][0])
+                candidates.append((
+                    sum(stat[0] for stat in by_category.values()),
+                    action_name,
+                    main_category,
+                    sum(stat[1] for stat in by_category.values()),
+                    max(stat[2] for stat in by_category.values()),
+                ))
+        return heapq.nlargest(limit, candidates)
+
+
+def _build(user_id, version):
+    index = _Index(version)
+    with shards.for_user(user_id):
+        rows = ActionLog.objects.filter(user_id=user_id).values_list(
+            'action_name', 'category_id', 'date'
+        ).annotate(count=Count('id')).order_by()
+        for action_name, category_id, day, count in rows:
+            index.add(action_name, category_id, day, count)
+    return index
+
+
+def _get(user_id):
+    """
+    ユーザーのインデックス（なければ作る。他のプロセスで変更されていれば作り直す）
+    """
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+            if time.monotonic() - index.checked_at < CHECK_INTERVAL:
+                metrics.cache_lookup('action_names', True)
+                return index
+
+    version = cache.get_or_set(_version_key(user_id), time.time_ns, None)
+    if index is not None and index.version == version:
+        index.checked_at = time.monotonic()
+        metrics.cache_lookup('action_names', True)
+        return index
+
+    metrics.cache_lookup('action_names', False)
+    index = _build(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def suggest(user_id, prefix='', category_id=None, limit=DEFAULT_LIMIT):
+    """
+    prefix で始まる過去の行動名を順位の高い順に返す（category_id を指定するとそのカテゴリのものだけ）
+    """
+    index = _get(user_id)
+    category_names = categories.names()
+    with _lock:
+        candidates = index.search(prefix, category_id, min(limit, MAX_LIMIT))
+    return [
+        {
+            'action_name': action_name,
+            'category_id': category,
+            'category': category_names.get(category),
+            'count': count,
+            'last_date': last_date.isoformat(),
+        }
+        for _, action_name, category, count, last_date in candidates
+    ]
+
+
+def record(action_log):
+    """
+    作成された行動ログをこのプロセスのインデックスへ追加し、他のプロセスには作り直させる
+    """
+    user_id = action_log.user_id
+    version = time.time_ns()
+    previous = cache.get(_version_key(user_id))
+    cache.set(_version_key(user_id), version, None)
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            return
+        if index.version != previous:
+            # 他のプロセスでの変更を取り込んでいないインデックスは、次の補完時に作り直す
+            del _indexes[user_id]
+            return
+        day = action_log.date
+        if isinstance(day, datetime):  # 既定値（timezone.now）のまま保存された場合
+            day = timezone.localdate(day)
+        index.add(action_log.action_name, action_log.category_id, day)
+        index.version = version
+
+
+def invalidate(user_id):
+    """
+    行動ログの編集・削除・一括保存のときに呼ぶ（全プロセスで次の補完時に作り直す）
+    """
+    cache.set(_version_key(user_id), time.time_ns(), None)
+    with _lock:
+        _indexes.pop(user_id, None)
@@ -0,0 +1,270 @@
+from datetime import date, timedelta
+import numpy as np
+from django.contrib.auth.models import User
+from django.db.models import Count, Min, Q
+from . import archive, categories, shards
+from .models import DailyDiary, ActionLog, ArchiveSegment, RecommendationRule
+from .rules import DEFAULT_SCORE, RuleSet, get_ruleset
+
+# =====================
+# AI提案ロジックのバックテスト
+# =====================
+#
+# 過去の各日について「その日に生成されていたはずの日次提案」をルール表で判定し、
+# その後 horizon 日間の気分・行動完了率が直前1週間と比べてどう動いたかを、ルールごとに集計する。
+# generate_daily_recommendation を日ごとに呼ぶ（クエリ発行・AIRecommendation の保存）代わりに、
+# ユーザー×日の配列を一度に読み込み、累積和の差分で1週間の移動窓の特徴量を全日分まとめて計算して
+# RuleSet.evaluate に渡す。特徴量の定義は rules.build_daily_features と同じ。
+
+# 特徴量の窓（日）。build_daily_features の「過去1週間」に合わせる。
+FEATURE_WINDOW_DAYS = 7
+
+# 結果を観測する期間の既定値（日）
+DEFAULT_HORIZON_DAYS = 7
+
+# 一度に読み込むユーザー数（配列の大きさ = ユーザー数 × 日数 × カテゴリ数）
+CHUNK_USERS = 500
+
+# 基本提案に一致しなかった日の集計の名前
+NO_RECOMMENDATION = '（提案なし）'
+
+
+def first_date():
+    """
+    日記・行動ログ（アーカイブを含む）の最も古い日付（データがなければ None）
+    """
+    candidates = [ArchiveSegment.objects.aggregate(first=Min('min_date'))['first']]
+    for alias in shards.aliases():
+        with shards.use(alias):
+            candidates.append(DailyDiary.objects.aggregate(first=Min('date'))['first'])
+            candidates.append(ActionLog.objects.aggregate(first=Min('date'))['first'])
+    candidates = [day for day in candidates if day is not None]
+    return min(candidates) if candidates else None
+
+
+def window_sum(cumulative, start, end):
+    """
+    累積和（日の軸の先頭に 0 を足したもの）から、各日 t の [t + start, t + end) の合計を返す
+    """
+    days = cumulative.shape[1] - 1
+    index = np.arange(days)
+    upper = np.clip(index + end, 0, days)
+    lower = np.clip(index + start, 0, days)
+    return cumulative[:, upper] - cumulative[:, lower]
+
+
+def _cumulative(values):
+    return np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+
+
+def _ratio(numerator, denominator, default=np.nan):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), default)
+
+
+class _Tally:
+    """
+    ルールごとの集計（チャンクをまたいで合計し、最後に平均を出す）
+    """
+
+    def __init__(self, name, stage):
+        self.name = name
+        self.stage = stage
+        self.fired = 0
+        self.sums = {'mood': 0.0, 'completion': 0.0}
+        self.samples = {'mood': 0, 'completion': 0}
+        self.improved = {'mood': 0, 'completion': 0}
+
+    def add(self, mask, outcomes):
+        self.fired += int(mask.sum())
+        for key, delta in outcomes.items():
+            selected = delta[mask]
+            selected = selected[~np.isnan(selected)]
+            self.sums[key] += float(selected.sum())
+            self.samples[key] += len(selected)
+            self.improved[key] += int((selected > 0).sum())
+
+    def result(self, total):
+        result = {
+            'rule': self.name,
+            'stage': self.stage,
+            'fired': self.fired,
+            'share': self.fired / total if total else 0.0,
+        }
+        for key in ('mood', 'completion'):
+            samples = self.samples[key]
+            result[f'{key}_delta'] = self.sums[key] / samples if samples else None
+            result[f'{key}_improved'] = self.improved[key] / samples if samples else None
+            result[f'{key}_samples'] = samples
+        return result
+
+
+class Backtest:
+    """
+    期間 [start, end] の各日について、ルール表の提案とその後の変化を集計する。
+    ruleset を省略すると有効なルール表（get_ruleset）を使う。
+    """
+
+    def __init__(self, start, end, horizon=DEFAULT_HORIZON_DAYS, ruleset=None):
+        self.start = start
+        self.end = end
+        self.horizon = horizon
+        self.ruleset = ruleset or get_ruleset()
+        # 特徴量の窓の分だけ前から、結果の観測期間の分だけ後まで読む
+        self.load_start = start - timedelta(days=FEATURE_WINDOW_DAYS)
+        self.load_end = end + timedelta(days=horizon - 1)
+        self.days = (self.load_end - self.load_start).days + 1
+        self.category_column = {category.pk: i for i, category in enumerate(categories.all_categories())}
+
+        self.users = 0
+        self.user_days = 0
+        self.base = [_Tally(rule.name, 'base') for rule in self.ruleset.base] + [_Tally(NO_RECOMMENDATION, 'base')]
+        self.addons = [_Tally(rule.name, 'addon') for rule in self.ruleset.addons]
+
+    def run(self, users=None):
+        """
+        対象ユーザー（省略時は有効な全ユーザー）を、シャードごと・CHUNK_USERS 人ずつ評価して集計を返す
+        """
+        if users is None:
+            users = User.objects.filter(is_active=True)
+        archived = self._load_archived_actions()
+        for alias in shards.aliases():
+            with shards.use(alias):
+                user_ids = list(shards.shard_users(users, alias).order_by('id').values_list('id', flat=True))
+                for offset in range(0, len(user_ids), CHUNK_USERS):
+                    self._run_chunk(np.array(user_ids[offset:offset + CHUNK_USERS]), archived)
+        return self.summary()
+
+    def _load_archived_actions(self):
+        """
+        期間にかかるアーカイブ済みの行動ログを、(ユーザーID, 日, カテゴリ列, 完了) の配列で読み込む
+        （圧縮ファイルをチャンクごとに読み直さないよう、最初に一度だけ読む）
+        """
+        rows = []
+        last_archived = archive.archived_until('actionlog')
+        if last_archived is not None and self.load_start <= last_archived:
+            for row in archive.iter_archived_rows('actionlog', self.load_start, min(self.load_end, last_archived)):
+                column = self.category_column.get(row['category_id'])
+                if column is not None:
+                    rows.append((row['user_id'], (row['date'] - self.load_start).days, column, bool(row['completed'])))
+        return np.array(rows, dtype=np.int64).reshape(-1, 4)
+
+    def _load_chunk(self, user_ids, archived):
+        size = len(user_ids)
+        row_of = {user_id: i for i, user_id in enumerate(user_ids.tolist())}
+        shape = (size, self.days)
+        arrays = {
+            'mood': np.zeros(shape),
+            'energy': np.zeros(shape),
+            'sentiment': np.zeros(shape),
+            'diaries': np.zeros(shape),
+            'actions': np.zeros(shape),
+            'completed': np.zeros(shape),
+            'by_category': np.zeros((len(self.category_column), size, self.days)),
+        }
+
+        diaries = DailyDiary.objects.filter(
+            user_id__in=user_ids.tolist(), date__gte=self.load_start, date__lte=self.load_end
+        ).values_list('user_id', 'date', 'mood_score', 'energy_level', 'sentiment')
+        for user_id, day, mood, energy, sentiment in diaries:
+            i, t = row_of[user_id], (day - self.load_start).days
+            arrays['mood'][i, t] += mood
+            arrays['energy'][i, t] += energy
+            arrays['sentiment'][i, t] += sentiment
+            arrays['diaries'][i, t] += 1
+
+        actions = ActionLog.objects.filter(
+            user_id__in=user_ids.tolist(), date__gte=self.load_start, date__lte=self.load_end
+        ).values_list('user_id', 'date', 'category_id').annotate(
+            count=Count('id'), done=Count('id', filter=Q(completed=True))
+        ).order_by()
+        for user_id, day, category_id, count, done in actions:
+            i, t = row_of[user_id], (day - self.load_start).days
+            arrays['actions'][i, t] += count
+            arrays['completed'][i, t] += done
+            column = self.category_column.get(category_id)
+            if column is not None:
+                arrays['by_category'][column, i, t] += count
+
+        if len(archived):
+            selected = archived[np.isin(archived[:, 0], user_ids)]
+            rows = np.searchsorted(user_ids, selected[:, 0])
+            np.add.at(arrays['actions'], (rows, selected[:, 1]), 1)
+            np.add.at(arrays['completed'], (rows, selected[:, 1]), selected[:, 3])
+            np.add.at(arrays['by_category'], (selected[:, 2], rows, selected[:, 1]), 1)
+        return arrays
+
+    def _run_chunk(self, user_ids, archived):
+        arrays = self._load_chunk(user_ids, archived)
+        cumulative = {key: _cumulative(values) for key, values in arrays.items() if key != 'by_category'}
+
+        # 各日 t の特徴量：[t - 7, t) の集計（build_daily_features と同じ定義）
+        def past(key):
+            return window_sum(cumulative[key], -FEATURE_WINDOW_DAYS, 0)
+
+        diaries = past('diaries')
+        top_category_count = np.zeros_like(diaries)
+        for values in arrays['by_category']:
+            top_category_count = np.maximum(top_category_count, window_sum(_cumulative(values), -FEATURE_WINDOW_DAYS, 0))
+        features = {
+            'avg_mood': _ratio(past('mood'), diaries, DEFAULT_SCORE),
+            'avg_energy': _ratio(past('energy'), diaries, DEFAULT_SCORE),
+            'avg_sentiment': _ratio(past('sentiment'), diaries, 0.0),
+            'top_category_count': top_category_count,
+        }
+
+        # 結果：[t, t + horizon) の平均と直前1週間の平均の差（どちらかにデータがなければ NaN）
+        def future(key):
+            return window_sum(cumulative[key], 0, self.horizon)
+
+        outcomes = {
+            'mood': _ratio(future('mood'), future('diaries')) - _ratio(past('mood'), diaries),
+            'completion': _ratio(future('completed'), future('actions')) - _ratio(past('completed'), past('actions')),
+        }
+
+        # 評価対象：期間内の日のうち、直前1週間に日記か行動ログがあるユーザー×日
+        evaluated = slice(FEATURE_WINDOW_DAYS, FEATURE_WINDOW_DAYS + (self.end - self.start).days + 1)
+        active = (diaries + past('actions') > 0)[:, evaluated].ravel()
+        flat_features = {key: values[:, evaluated].ravel()[active] for key, values in features.items()}
+        flat_outcomes = {key: values[:, evaluated].ravel()[active] for key, values in outcomes.items()}
+
+        self.users += len(user_ids)
+        self.user_days += int(active.sum())
+        if not active.any():
+            return
+
+        base_index, addon_masks = self.ruleset.evaluate(flat_features)
+        for j, tally in enumerate(self.base[:-1]):
+            tally.add(base_index == j, flat_outcomes)
+        self.base[-1].add(base_index < 0, flat_outcomes)
+        for j, tally in enumerate(self.addons):
+            tally.add(addon_masks[j], flat_outcomes)
+
+    def summary(self):
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'horizon_days': self.horizon,
+            'users': self.users,
+            'user_days': self.user_days,
+            'rules': [tally.result(self.user_days) for tally in self.base + self.addons],
+        }
+
+
+def ruleset_for(rule_ids):
+    """
+    ID を指定したルール（有効かどうかを問わない）のルール表。変更前のルールを本番に反映せずに比べるためのもの。
+    """
+    return RuleSet(list(RecommendationRule.objects.filter(id__in=rule_ids)))
+
+
+def default_period(horizon=DEFAULT_HORIZON_DAYS, today=None):
+    """
+    既定の期間：最も古いデータの翌週から、結果を horizon 日分観測できる最後の日まで
+    """
+    today = today or date.today()
+    first = first_date()
+    end = today - timedelta(days=horizon)
+    if first is None:
+        return end, end
+    return min(first + timedelta(days=FEATURE_WINDOW_DAYS), end), end
@@ -0,0 +1,95 @@
+import threading
+import time
+from . import metrics
+from .models import HabitCategory
+from .versioncache import cache
+
+# =====================
+# 習慣カテゴリのプロセス内レジストリ
+# =====================
+
+# カテゴリ一覧のバージョン（変更時に更新し、他のプロセスにも再読み込みさせる）
+CATEGORY_VERSION_KEY = 'habit-category-version'
+
+# バージョンを確認する間隔（秒）。この間は他のプロセスでの変更が反映されないことがある。
+CATEGORY_CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+_state = {'version': None, 'checked_at': 0.0, 'all': None, 'by_id': {}, 'by_name': {}}
+
+
+def _load():
+    """
+    バージョンが変わっていればカテゴリ一覧を読み直し、現在の状態を返す
+    """
+    now = time.monotonic()
+    state = _state
+    if state['all'] is not None and now - state['checked_at'] < CATEGORY_CHECK_INTERVAL:
+        metrics.cache_lookup('categories', True)
+        return state
+
+    version = cache.get_or_set(CATEGORY_VERSION_KEY, time.time_ns, None)
+    with _lock:
+        reload = _state['all'] is None or _state['version'] != version
+        metrics.cache_lookup('categories', not reload)
+        if reload:
+            categories = list(HabitCategory.objects.order_by('id'))
+            _state.update(
+                version=version,
+                all=categories,
+                by_id={category.pk: category for category in categories},
+                by_name={category.name: category for category in categories},
+            )
+        _state['checked_at'] = now
+        return _state
+
+
+def invalidate():
+    """
+    カテゴリが変わったときに呼ぶ（このプロセスはすぐに、他のプロセスは次の確認時に読み直す）
+    """
+    cache.set(CATEGORY_VERSION_KEY, time.time_ns(), None)
+    with _lock:
+        _state['all'] = None
+
+
+def all_categories():
+    """
+    全カテゴリのリスト（ID順）。返したインスタンスは共有のため変更しない。
+    """
+    return _load()['all']
+
+
+def get(category_id):
+    """
+    ID からカテゴリを返す（なければ None）。数字の文字列も受け付ける。
+    """
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return None
+    return _load()['by_id'].get(category_id)
+
+
+def get_by_name(name):
+    return _load()['by_name'].get(name)
+
+
+def names():
+    """
+    {カテゴリID: カテゴリ名}
+    """
+    return {category_id: category.name for category_id, category in _load()['by_id'].items()}
+
+
+def attach(objects):
+    """
+    行動ログ・目標などの category をレジストリのインスタンスで埋める（行ごとの問い合わせを防ぐ）。
+    渡したリストをそのまま返す。
+    """
+    by_id = _load()['by_id']
+    for obj in objects:
+        category = by_id.get(obj.category_id)
+        if category is not None:
+            obj._meta.get_field('category').set_cached_value(obj, category)
+    return objects
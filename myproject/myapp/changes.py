@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import threading
+from django.db import transaction
+from django.utils import timezone
+from .models import DailyDiary, ActionLog, Goal, AIRecommendation, ChangeLog
+
+# =====================
+# 端末との差分同期（変更番号つきの変更履歴）
+# =====================
+
+# 差分同期の対象モデルと、端末へ返す項目
+SYNCED_MODELS = {
+    'dailydiary': (DailyDiary, [
+        'id', 'date', 'mood_score', 'energy_level', 'content', 'gratitude',
+        'client_id', 'created_at', 'updated_at',
+    ]),
+    'actionlog': (ActionLog, [
+        'id', 'category_id', 'action_name', 'duration_minutes', 'completed', 'notes',
+        'date', 'client_id', 'created_at',
+    ]),
+    'goal': (Goal, [
+        'id', 'title', 'description', 'category_id', 'target_date', 'status', 'priority',
+        'created_at', 'updated_at',
+    ]),
+    'airecommendation': (AIRecommendation, [
+        'id', 'date', 'recommendation_type', 'title', 'content', 'reasoning', 'action_items',
+        'priority', 'is_implemented', 'feedback_rating', 'created_at',
+    ]),
+}
+
+# 1回の取得件数（既定値と上限）
+CHANGES_PAGE_SIZE = 200
+CHANGES_MAX_PAGE_SIZE = 1000
+
+# 記録直後の変更は返さない秒数。
+# 先に番号を取った書き込みが後からコミットされても、取りこぼさないようにする。
+CHANGE_SETTLE_SECONDS = 2
+
+_state = threading.local()
+
+
+@contextmanager
+def paused():
+    """
+    このブロック内（同一スレッド）の変更は記録しない。
+    アーカイブのように、端末側のデータはそのままにして行を移す処理で使う。
+    """
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = False
+
+
+def record(model, rows, deleted=False):
+    """
+    (対象ID, ユーザーID) の並びを変更として記録する。
+    同じ対象の古い変更は削除し、新しい変更番号で置き換える。
+    """
+    if getattr(_state, 'paused', False):
+        return
+    rows = list(rows)
+    if not rows:
+        return
+    model_name = model._meta.model_name
+    ChangeLog.objects.filter(
+        model_name=model_name, object_id__in=[object_id for object_id, _ in rows]
+    ).delete()
+    ChangeLog.objects.bulk_create([
+        ChangeLog(user_id=user_id, model_name=model_name, object_id=object_id, deleted=deleted)
+        for object_id, user_id in rows
+    ])
+
+
+def record_on_commit(model, rows, using, deleted=False):
+    """
+    using のDBのトランザクションがコミットされたら record する（ロールバックされた変更は記録しない）。
+    シャードへの書き込みのシグナルから呼ぶ。一時停止中かどうかは呼び出した時点で判定する。
+    """
+    if getattr(_state, 'paused', False):
+        return
+    rows = list(rows)
+    transaction.on_commit(lambda: record(model, rows, deleted), using=using)
+
+
+def changes_since(user, since=0, limit=CHANGES_PAGE_SIZE):
+    """
+    変更番号 since より後の変更を番号順に返す。
+    削除はトゥームストーン（deleted=True）として返し、それ以外は現在の内容を添える。
+    アーカイブへ移された行は端末側に残すため、返さない。
+    """
+    entries = list(
+        ChangeLog.objects.filter(
+            user=user,
+            id__gt=since,
+            created_at__lte=timezone.now() - timedelta(seconds=CHANGE_SETTLE_SECONDS),
+        ).order_by('id')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # モデルごとに1回のクエリで現在の内容を取得
+    current = {}
+    for model_name, (model, fields) in SYNCED_MODELS.items():
+        ids = [entry.object_id for entry in entries if entry.model_name == model_name and not entry.deleted]
+        if ids:
+            current[model_name] = {
+                obj.pk: {field: getattr(obj, field) for field in fields}
+                for obj in model.objects.filter(user=user, id__in=ids)
+            }
+
+    changes = []
+    for entry in entries:
+        change = {'seq': entry.pk, 'model': entry.model_name, 'id': entry.object_id, 'deleted': entry.deleted}
+        if not entry.deleted:
+            data = current.get(entry.model_name, {}).get(entry.object_id)
+            if data is None:
+                continue
+            change['data'] = data
+        changes.append(change)
+
+    return {
+        'changes': changes,
+        'next': entries[-1].pk if entries else since,
+        'has_more': has_more,
+    }
@@ -0,0 +1,286 @@
+from contextlib import contextmanager
+from datetime import date, timedelta
+import threading
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+from . import archive, shards
+from .models import (
+    DailyDiary, ActionLog, AIRecommendation, ArchiveSegment,
+    CubeDirtyDay, CategoryDailyStat, MoodDailyStat,
+    PlatformDailyStat, RecommendationDailyStat
+)
+
+# =====================
+# 運営向け集計キューブ
+# =====================
+
+# 1回の再集計でまとめて処理する日数
+REFRESH_BATCH_DAYS = 200
+
+_state = threading.local()
+
+
+@contextmanager
+def paused():
+    """
+    このブロック内（同一スレッド）の変更は再集計待ちに登録しない。
+    アーカイブのように、集計済みの値を残したまま行を移す処理で使う。
+    """
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = False
+
+
+def mark_dirty(*dates):
+    """
+    指定日を再集計待ちとして登録（既に登録済みなら登録日時のみ更新）
+    """
+    if getattr(_state, 'paused', False):
+        return
+    dates = {d for d in dates if d is not None}
+    if not dates:
+        return
+    now = timezone.now()
+    CubeDirtyDay.objects.bulk_create(
+        [CubeDirtyDay(date=d, marked_at=now) for d in dates],
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=['marked_at']
+    )
+
+
+def mark_dirty_on_commit(using, *dates):
+    """
+    using のDBのトランザクションがコミットされたら mark_dirty する（ロールバックされた変更は登録しない）。
+    シャードへの書き込みのシグナルから呼ぶ。一時停止中かどうかは呼び出した時点で判定する。
+    """
+    if getattr(_state, 'paused', False):
+        return
+    transaction.on_commit(lambda: mark_dirty(*dates), using=using)
+
+
+def mark_all_dirty():
+    """
+    行動ログ・日記・AI提案が存在する全日付を再集計待ちにする（初回構築用、アーカイブ済みの日付を含む）
+    """
+    dates = set()
+    for alias in shards.aliases():
+        with shards.use(alias):
+            dates |= set(ActionLog.objects.values_list('date', flat=True).distinct())
+            dates |= set(DailyDiary.objects.values_list('date', flat=True).distinct())
+            dates |= set(AIRecommendation.objects.values_list('date', flat=True).distinct())
+    for min_date, max_date in ArchiveSegment.objects.values_list('min_date', 'max_date').distinct():
+        dates |= {min_date + timedelta(days=i) for i in range((max_date - min_date).days + 1)}
+    mark_dirty(*dates)
+
+
+def refresh():
+    """
+    再集計待ちの日付だけを集計し直す。処理した日数を返す。
+    処理中に再度変更された日付は登録が残り、次回の再集計対象になる。
+    """
+    started_at = timezone.now()
+    dates = sorted(CubeDirtyDay.objects.values_list('date', flat=True))
+
+    for i in range(0, len(dates), REFRESH_BATCH_DAYS):
+        batch = dates[i:i + REFRESH_BATCH_DAYS]
+        with transaction.atomic():
+            _rebuild_days(batch)
+            CubeDirtyDay.objects.filter(date__in=batch, marked_at__lte=started_at).delete()
+
+    return len(dates)
+
+
+def _rebuild_days(dates):
+    """
+    指定日の集計行を削除し、各シャードのグループ集計クエリとアーカイブの結果を合算して作り直す
+    """
+    for model in (CategoryDailyStat, MoodDailyStat, PlatformDailyStat, RecommendationDailyStat):
+        model.objects.filter(date__in=dates).delete()
+
+    category_stats = {}
+    mood_stats = {}
+    action_users = {}
+    diary_users = {}
+    recommendation_stats = {}
+    for alias in shards.aliases():
+        with shards.use(alias):
+            _collect_shard(
+                dates, category_stats, mood_stats, action_users, diary_users, recommendation_stats
+            )
+    # アーカイブ済みの日付は、ホットテーブルから移した行の分も足す（日記はアーカイブしない）
+    _collect_archive(dates, category_stats, action_users, recommendation_stats)
+
+    CategoryDailyStat.objects.bulk_create([
+        CategoryDailyStat(date=day, category_id=category_id, **values)
+        for (day, category_id), values in category_stats.items()
+    ])
+
+    MoodDailyStat.objects.bulk_create([
+        MoodDailyStat(date=day, mood_score=mood_score, diaries=diaries)
+        for (day, mood_score), diaries in mood_stats.items()
+    ])
+
+    # アクティブユーザー（行動ログと日記の両方を重複なく数える）
+    PlatformDailyStat.objects.bulk_create([
+        PlatformDailyStat(
+            date=day,
+            active_users=len(action_users.get(day, set()) | diary_users.get(day, set())),
+            action_users=len(action_users.get(day, ())),
+            diary_users=len(diary_users.get(day, ())),
+        )
+        for day in set(action_users) | set(diary_users)
+    ])
+
+    RecommendationDailyStat.objects.bulk_create([
+        RecommendationDailyStat(date=day, recommendation_type=recommendation_type, **values)
+        for (day, recommendation_type), values in recommendation_stats.items()
+    ])
+
+
+def _add(totals, key, values):
+    current = totals.setdefault(key, dict.fromkeys(values, 0))
+    for name, value in values.items():
+        current[name] += value or 0
+
+
+def _collect_shard(dates, category_stats, mood_stats, action_users, diary_users, recommendation_stats):
+    """
+    有効なシャードの指定日の集計を、各辞書に足し込む
+    """
+    actions = ActionLog.objects.filter(date__in=dates)
+    diaries = DailyDiary.objects.filter(date__in=dates)
+
+    for row in actions.values('date', 'category_id').annotate(
+        total_actions=Count('id'),
+        completed_actions=Count('id', filter=Q(completed=True)),
+        total_minutes=Sum('duration_minutes'),
+    ).order_by():
+        _add(category_stats, (row.pop('date'), row.pop('category_id')), row)
+
+    for row in diaries.values('date', 'mood_score').annotate(diaries=Count('id')).order_by():
+        key = (row['date'], row['mood_score'])
+        mood_stats[key] = mood_stats.get(key, 0) + row['diaries']
+
+    for day, user_id in actions.values_list('date', 'user_id').distinct():
+        action_users.setdefault(day, set()).add(user_id)
+    for day, user_id in diaries.values_list('date', 'user_id'):
+        diary_users.setdefault(day, set()).add(user_id)
+
+    for row in AIRecommendation.objects.filter(date__in=dates).values(
+        'date', 'recommendation_type'
+    ).annotate(
+        recommendations=Count('id'),
+        rated=Count('feedback_rating'),
+        rating_sum=Sum('feedback_rating'),
+        implemented=Count('id', filter=Q(is_implemented=True)),
+    ).order_by():
+        _add(recommendation_stats, (row.pop('date'), row.pop('recommendation_type')), row)
+
+
+def _collect_archive(dates, category_stats, action_users, recommendation_stats):
+    """
+    アーカイブ済みの行動ログ・AI提案のうち指定日の分を、各辞書に足し込む
+    """
+    for model_name in ('actionlog', 'airecommendation'):
+        last_archived = archive.archived_until(model_name)
+        archived_dates = {day for day in dates if last_archived is not None and day <= last_archived}
+        if not archived_dates:
+            continue
+        for row in archive.iter_archived_rows(model_name, min(archived_dates), max(archived_dates)):
+            day = row['date']
+            if day not in archived_dates:
+                continue
+            if model_name == 'actionlog':
+                _add(category_stats, (day, row['category_id']), {
+                    'total_actions': 1,
+                    'completed_actions': 1 if row['completed'] else 0,
+                    'total_minutes': row['duration_minutes'],
+                })
+                action_users.setdefault(day, set()).add(row['user_id'])
+            else:
+                _add(recommendation_stats, (day, row['recommendation_type']), {
+                    'recommendations': 1,
+                    'rated': 0 if row['feedback_rating'] is None else 1,
+                    'rating_sum': row['feedback_rating'],
+                    'implemented': 1 if row['is_implemented'] else 0,
+                })
+
+
+def summary(weeks=12, today=None):
+    """
+    集計キューブから運営向けの指標をまとめる（管理画面・JSON共通）
+    """
+    today = today or date.today()
+    start = today - timedelta(weeks=weeks)
+
+    # カテゴリ×週の完了率
+    category_weekly = [
+        {
+            'week': row['week'].isoformat(),
+            'category': row['category__name'],
+            'total_actions': row['total'],
+            'completed_actions': row['completed'],
+            'total_minutes': row['minutes'],
+            'completion_rate': round(row['completed'] * 100.0 / row['total'], 1) if row['total'] else 0.0,
+        }
+        for row in CategoryDailyStat.objects.filter(date__gte=start).annotate(
+            week=TruncWeek('date')
+        ).values('week', 'category__name').annotate(
+            total=Sum('total_actions'),
+            completed=Sum('completed_actions'),
+            minutes=Sum('total_minutes'),
+        ).order_by('week', 'category__name')
+    ]
+
+    # 気分スコアの分布
+    mood_distribution = {
+        row['mood_score']: row['diaries']
+        for row in MoodDailyStat.objects.filter(date__gte=start).values('mood_score').annotate(
+            diaries=Sum('diaries')
+        ).order_by('mood_score')
+    }
+
+    # 日別アクティブユーザー数
+    active_users = list(
+        PlatformDailyStat.objects.filter(date__gte=start).order_by('date').values(
+            'date', 'active_users', 'action_users', 'diary_users'
+        )
+    )
+    for row in active_users:
+        row['date'] = row['date'].isoformat()
+
+    # 提案タイプ別の評価
+    recommendation_ratings = [
+        {
+            'recommendation_type': row['recommendation_type'],
+            'recommendations': row['total'],
+            'rated': row['rated'],
+            'avg_rating': round(row['rating_sum'] / row['rated'], 2) if row['rated'] else None,
+            'implemented': row['implemented'],
+        }
+        for row in RecommendationDailyStat.objects.filter(date__gte=start).values(
+            'recommendation_type'
+        ).annotate(
+            total=Sum('recommendations'),
+            rated=Sum('rated'),
+            rating_sum=Sum('rating_sum'),
+            implemented=Sum('implemented'),
+        ).order_by('recommendation_type')
+    ]
+
+    return {
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'pending_days': CubeDirtyDay.objects.count(),
+        'category_weekly': category_weekly,
+        'mood_distribution': [
+            {'mood_score': score, 'diaries': mood_distribution.get(score, 0)} for score in range(1, 11)
+        ],
+        'active_users': active_users,
+        'recommendation_ratings': recommendation_ratings,
+    }
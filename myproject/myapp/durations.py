@@ -0,0 +1,251 @@
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+import math
+import threading
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from . import archive, categories, shards
+from .models import ActionLog, DurationBucket
+
+# =====================
+# 行動時間の分布（対数バケットのスケッチ）
+# =====================
+#
+# 行動時間を、幅が値に比例するバケット（相対誤差 RELATIVE_ACCURACY 以内）に数える。
+# DurationBucket にユーザー・カテゴリ・週ごとのバケット別件数として持ち、行動ログの保存・編集・削除のたびに
+# 該当するバケットの件数だけを増減する。複数の週・ユーザーの分布は、バケットごとの件数を足すだけで作れる
+# （SQL の集計1回）。中央値・90パーセンタイル・ヒストグラムは、行動ログの件数によらない数（数百以下）の
+# バケットを順にたどって求め、行動ログの全行を並べ替えない。
+
+# 分位点の相対誤差（値が 25 分程度までは1分ごとのバケットになり、誤差なし）
+RELATIVE_ACCURACY = 0.02
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# ヒストグラムの区切り（分）
+HISTOGRAM_EDGES = [5, 15, 30, 60, 120]
+
+# 作り直しで一度に書き込む行数
+REBUILD_BATCH_SIZE = 1000
+
+_state = threading.local()
+
+
+def bucket_of(minutes):
+    """
+    行動時間のバケット（0分以下は 0、それ以外は 1 以上）
+    """
+    if minutes <= 0:
+        return 0
+    return math.ceil(math.log(minutes) / _LOG_GAMMA) + 1
+
+
+def bucket_value(bucket):
+    """
+    バケットの代表値（バケット内のどの値とも相対誤差 RELATIVE_ACCURACY 以内）。
+    行動時間は整数の分のため、バケットに入る整数が1つだけならその値を返す。
+    """
+    if bucket <= 0:
+        return 0.0
+    low, high = GAMMA ** (bucket - 2), GAMMA ** (bucket - 1)
+    if math.floor(high) == math.floor(low) + 1:
+        return float(math.floor(high))
+    return 2 * high / (GAMMA + 1)
+
+
+def week_start(day):
+    if isinstance(day, datetime):  # 既定値（timezone.now）のまま保存された場合
+        day = timezone.localdate(day)
+    return day - timedelta(days=day.weekday())
+
+
+class Sketch:
+    """
+    1つの分布（バケット → 件数）。merge で足し合わせられる。
+    """
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def add(self, minutes, count=1):
+        self.counts[bucket_of(minutes)] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    @property
+    def total(self):
+        return sum(count for count in self.counts.values() if count > 0)
+
+    def quantiles(self, *qs):
+        """
+        分位点（0〜1）ごとの値。件数がなければ None。
+        """
+        buckets = sorted((bucket, count) for bucket, count in self.counts.items() if count > 0)
+        total = sum(count for _, count in buckets)
+        if not total:
+            return [None] * len(qs)
+        values = []
+        for q in qs:
+            rank = q * (total - 1)
+            seen = 0
+            for bucket, count in buckets:
+                seen += count
+                if seen > rank:
+                    break
+            values.append(bucket_value(bucket))
+        return values
+
+    def histogram(self, edges=HISTOGRAM_EDGES):
+        """
+        区切りごとの件数（[0, edges[0])、[edges[0], edges[1])、…、[edges[-1], ∞)）。
+        区切りと同じバケットに入る値は、区切りより上に数える。
+        """
+        bounds = [bucket_of(edge) for edge in edges]
+        counts = [0] * (len(edges) + 1)
+        for bucket, count in self.counts.items():
+            if count > 0:
+                counts[sum(1 for bound in bounds if bucket >= bound)] += count
+        return counts
+
+
+def histogram_labels(edges=HISTOGRAM_EDGES):
+    return (
+        [f'〜{edges[0]}分']
+        + [f'{low}〜{high}分' for low, high in zip(edges, edges[1:])]
+        + [f'{edges[-1]}分〜']
+    )
+
+
+# =====================
+# スケッチの更新（行動ログの保存時）
+# =====================
+@contextmanager
+def paused():
+    """
+    このブロック内（同一スレッド）の行動ログの削除は分布から差し引かない。
+    アーカイブのように、行動を記録したまま行を移す処理で使う。
+    """
+    _state.paused = True
+    try:
+        yield
+    finally:
+        _state.paused = False
+
+
+def record(user_id, added=(), removed=()):
+    """
+    行動ログの (カテゴリID, 日付, 時間) を分布に加える（added）・分布から除く（removed）
+    """
+    if getattr(_state, 'paused', False):
+        return
+    deltas = Counter()
+    for sign, entries in ((1, added), (-1, removed)):
+        for category_id, day, minutes in entries:
+            if category_id is not None and day is not None and minutes is not None:
+                deltas[(category_id, week_start(day), bucket_of(minutes))] += sign
+
+    for (category_id, week, bucket), delta in sorted(deltas.items()):
+        if delta:
+            _increment(user_id, category_id, week, bucket, delta)
+
+
+def record_on_commit(using, user_id, added=(), removed=()):
+    """
+    using のDBのトランザクションがコミットされたら record する（ロールバックされた保存・削除は反映しない）。
+    行動ログのシグナルから呼ぶ。一時停止中かどうかは呼び出した時点で判定する。
+    """
+    if getattr(_state, 'paused', False):
+        return
+    added, removed = list(added), list(removed)
+    transaction.on_commit(lambda: record(user_id, added, removed), using=using)
+
+
+def _increment(user_id, category_id, week, bucket, delta):
+    rows = DurationBucket.objects.filter(user_id=user_id, category_id=category_id, week_start=week, bucket=bucket)
+    if rows.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            DurationBucket.objects.create(
+                user_id=user_id, category_id=category_id, week_start=week, bucket=bucket, count=delta
+            )
+    except IntegrityError:
+        # 同時に作成された場合は、その行に加える
+        rows.update(count=F('count') + delta)
+
+
+def rebuild():
+    """
+    すべての行動ログ（アーカイブを含む）から分布を作り直す（初回構築用）。作成した行数を返す。
+    """
+    deltas = Counter()
+    for alias in shards.aliases():
+        with shards.use(alias):
+            for row in ActionLog.objects.values_list('user_id', 'category_id', 'date', 'duration_minutes').iterator():
+                user_id, category_id, day, minutes = row
+                deltas[(user_id, category_id, week_start(day), bucket_of(minutes))] += 1
+    last_archived = archive.archived_until('actionlog')
+    if last_archived is not None:
+        for row in archive.iter_archived_rows('actionlog', date.min, last_archived):
+            deltas[(row['user_id'], row['category_id'], week_start(row['date']), bucket_of(row['duration_minutes']))] += 1
+
+    rows = [
+        DurationBucket(user_id=user_id, category_id=category_id, week_start=week, bucket=bucket, count=count)
+        for (user_id, category_id, week, bucket), count in deltas.items()
+        if category_id is not None
+    ]
+    with transaction.atomic():
+        DurationBucket.objects.all().delete()
+        DurationBucket.objects.bulk_create(rows, batch_size=REBUILD_BATCH_SIZE)
+    return len(rows)
+
+
+# =====================
+# 分布の取得
+# =====================
+def sketches(start, end=None, user=None):
+    """
+    start の週から end の週までの分布をカテゴリごとに合わせる（user を省略すると全ユーザー）。
+    {カテゴリID: Sketch} を返す。
+    """
+    rows = DurationBucket.objects.filter(week_start__gte=week_start(start))
+    if end is not None:
+        rows = rows.filter(week_start__lte=week_start(end))
+    if user is not None:
+        rows = rows.filter(user=user)
+    result = {}
+    for category_id, bucket, count in rows.values_list('category_id', 'bucket').annotate(
+        total=Sum('count')
+    ).order_by():
+        result.setdefault(category_id, Sketch()).counts[bucket] += count
+    return result
+
+
+def summary(start, end=None, user=None):
+    """
+    カテゴリごとの件数・中央値・90パーセンタイル・ヒストグラム（分析ページ・運営向けJSON共通）
+    """
+    names = categories.names()
+    labels = histogram_labels()
+    result = []
+    for category_id, sketch in sorted(sketches(start, end, user).items()):
+        total = sketch.total
+        if not total:
+            continue
+        median, p90 = sketch.quantiles(0.5, 0.9)
+        result.append({
+            'category_id': category_id,
+            'category': names.get(category_id, ''),
+            'actions': total,
+            'median_minutes': round(median, 1),
+            'p90_minutes': round(p90, 1),
+            'histogram': [
+                {'label': label, 'actions': count, 'share': round(count * 100.0 / total, 1)}
+                for label, count in zip(labels, sketch.histogram())
+            ],
+        })
+    return result
@@ -0,0 +1,120 @@
+import math
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from .models import ActionItemStat
+
+# =====================
+# フィードバックによるアクション項目のランキング（バンディット方式）
+# =====================
+
+# 全体統計の事前分布（平均0.5相当）
+PRIOR_REWARD = 1.0
+PRIOR_TRIALS = 2.0
+# ユーザー別の平均を全体平均へ寄せる強さ（擬似的な評価回数）
+USER_PRIOR_WEIGHT = 5.0
+# 評価の少ない項目を試すための探索ボーナス係数
+EXPLORATION = 0.1
+
+
+def feedback_reward(rating, is_implemented):
+    """
+    評価（1〜5）と実装状況から報酬（0〜1）を計算。
+    どちらもなければ None（未観測）。
+    """
+    if rating is None:
+        return 0.75 if is_implemented else None
+    reward = (rating - 1) / 4
+    if is_implemented:
+        reward = min(1.0, reward + 0.25)
+    return reward
+
+
+def record_feedback(recommendation, previous_rating, previous_implemented):
+    """
+    フィードバック更新を統計に反映。
+    変更前後の報酬の差分だけを加算するので、項目数に比例した O(1) 更新で済む。
+    """
+    old = feedback_reward(previous_rating, previous_implemented)
+    new = feedback_reward(recommendation.feedback_rating, recommendation.is_implemented)
+    if old == new:
+        return
+
+    trials = (new is not None) - (old is not None)
+    reward = (new or 0.0) - (old or 0.0)
+
+    with transaction.atomic():
+        for item in recommendation.action_items:
+            _increment(recommendation.user_id, item, trials, reward)
+            _increment(None, item, trials, reward)
+
+
+def _increment(user_id, action_item, trials, reward):
+    """
+    統計行に加算（なければ作成）
+    """
+    stats = ActionItemStat.objects.filter(user_id=user_id, action_item=action_item)
+    if stats.update(trials=F('trials') + trials, reward_sum=F('reward_sum') + reward):
+        return
+    try:
+        with transaction.atomic():
+            ActionItemStat.objects.create(
+                user_id=user_id, action_item=action_item,
+                trials=max(trials, 0), reward_sum=max(reward, 0.0)
+            )
+    except IntegrityError:
+        # 同時に作成された場合は加算し直す
+        stats.update(trials=F('trials') + trials, reward_sum=F('reward_sum') + reward)
+
+
+class FeedbackScorer:
+    """
+    アクション項目のスコアラー。
+    ユーザー別の平均報酬を全体平均で補正し、評価の少ない項目に探索ボーナスを加える。
+    """
+
+    def __init__(self, user_ids, action_items):
+        self.global_stats = {}
+        self.user_stats = {}
+        self.user_trials = {}
+
+        rows = ActionItemStat.objects.filter(
+            Q(user__isnull=True) | Q(user_id__in=user_ids),
+            action_item__in=set(action_items)
+        ).values_list('user_id', 'action_item', 'trials', 'reward_sum')
+        for user_id, item, trials, reward_sum in rows:
+            if user_id is None:
+                self.global_stats[item] = (trials, reward_sum)
+            else:
+                self.user_stats[(user_id, item)] = (trials, reward_sum)
+                self.user_trials[user_id] = self.user_trials.get(user_id, 0) + trials
+
+    def score(self, user_id, action_item):
+        global_trials, global_sum = self.global_stats.get(action_item, (0, 0.0))
+        global_mean = (global_sum + PRIOR_REWARD) / (global_trials + PRIOR_TRIALS)
+
+        trials, reward_sum = self.user_stats.get((user_id, action_item), (0, 0.0))
+        mean = (reward_sum + USER_PRIOR_WEIGHT * global_mean) / (trials + USER_PRIOR_WEIGHT)
+        bonus = EXPLORATION * math.sqrt(math.log(1 + self.user_trials.get(user_id, 0)) / (1 + trials))
+        return mean + bonus
+
+    def rank(self, user_id, action_items):
+        """
+        スコアの高い順に並べ替え（同点は元の順序を維持）
+        """
+        return sorted(action_items, key=lambda item: -self.score(user_id, item))
+
+
+def rank_recommendations(recommendations, user_ids=None):
+    """
+    提案（未保存）のアクション項目を、まとめて読み込んだ統計でランキング。
+    user_ids には対象ユーザーのサブクエリを渡してもよい。
+    """
+    if not recommendations:
+        return recommendations
+    scorer = FeedbackScorer(
+        user_ids if user_ids is not None else {recommendation.user_id for recommendation in recommendations},
+        [item for recommendation in recommendations for item in recommendation.action_items]
+    )
+    for recommendation in recommendations:
+        recommendation.action_items = scorer.rank(recommendation.user_id, recommendation.action_items)
+    return recommendations
@@ -1,6 +1,43 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from . import categories
 from .models import DailyDiary, ActionLog, Goal, HabitCategory
 
+# =====================
+# カテゴリ選択欄（プロセス内のカテゴリ一覧を使い、表示・入力チェックでクエリを発行しない）
+# =====================
+class CategoryChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for category in categories.all_categories():
+            yield self.choice(category)
+
+    def __len__(self):
+        return len(categories.all_categories()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(categories.all_categories())
+
+
+class CategoryChoiceField(forms.ModelChoiceField):
+    iterator = CategoryChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, HabitCategory):
+            value = value.pk
+        category = categories.get(value)
+        if category is None:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return category
+
 # =====================
 # 日記フォーム
 # =====================
@@ -58,12 +95,15 @@ class ActionLogForm(forms.ModelForm):
     class Meta:
         model = ActionLog
         fields = ['category', 'action_name', 'duration_minutes', 'completed', 'notes', 'date']
+        field_classes = {'category': CategoryChoiceField}
         widgets = {
             'category': forms.Select(attrs={'class': 'form-control'}),
             'action_name': forms.TextInput(
                 attrs={
                     'class': 'form-control',
-                    'placeholder': '例：30分の散歩、読書、瞑想など'
+                    'placeholder': '例：30分の散歩、読書、瞑想など',
+                    'list': 'action-name-suggestions',  # 過去の行動名の入力補完
+                    'autocomplete': 'off',
                 }
             ),
             'duration_minutes': forms.NumberInput(
@@ -109,6 +149,7 @@ class GoalForm(forms.ModelForm):
     class Meta:
         model = Goal
         fields = ['title', 'description', 'category', 'target_date', 'priority']
+        field_classes = {'category': CategoryChoiceField}
         widgets = {
             'title': forms.TextInput(
                 attrs={
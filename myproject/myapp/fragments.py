@@ -0,0 +1,103 @@
+from datetime import date, timedelta
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from . import categories, jobs
+from .models import DailyDiary, ActionLog, AIRecommendation
+from .services import AIHabitCoach
+
+# =====================
+# ダッシュボードのセクション（部分更新用の断片）
+# =====================
+#
+# ダッシュボードの各セクションは partials/dashboard_<名前>.html をそれぞれのコンテキストで描画したもの。
+# 全体の表示（dashboard ビュー）と、セクションだけの取得（dashboard_fragment ビュー）、
+# 書き込みビューの部分更新の応答で同じテンプレート・コンテキストを使う。
+#
+# 書き込みビューは、リクエストに X-Fragments: 1 ヘッダーがあれば、リダイレクトの代わりに
+# 影響するセクションの断片だけを {'fragments': {名前: HTML}} で返す（ページ全体を描画し直さない）。
+
+
+def mood_context(user, today):
+    """
+    今日の気分・エネルギー
+    """
+    return {'today_diary': DailyDiary.objects.filter(user=user, date=today).first()}
+
+
+def recommendation_context(user, today):
+    """
+    今日のAI提案（バックグラウンド生成のときは、できているものだけ）
+    """
+    if jobs.is_async():
+        recommendation = AIRecommendation.objects.filter(
+            user=user, date=today, recommendation_type='daily_goal'
+        ).first()
+    else:
+        recommendation = AIHabitCoach(user).generate_daily_recommendation(today)
+    return {'today_recommendation': recommendation}
+
+
+def actions_context(user, today):
+    """
+    今日の行動ログ（と、その場で記録するフォームのカテゴリ）
+    """
+    return {
+        'today_actions': categories.attach(list(ActionLog.objects.filter(
+            user=user,
+            date=today
+        ).order_by('-created_at'))),
+        'categories': categories.all_categories(),
+    }
+
+
+def category_stats_context(user, today):
+    """
+    習慣カテゴリ別の行動統計（過去1週間。カテゴリ名は結合せずにレジストリから引く）
+    """
+    past_week = today - timedelta(days=7)
+    category_names = categories.names()
+    return {'category_stats': [
+        dict(stat, category__name=category_names.get(stat['category_id'], ''))
+        for stat in ActionLog.objects.filter(
+            user=user,
+            date__gte=past_week,
+            date__lte=today
+        ).values('category_id').annotate(
+            total_actions=Count('id'),
+            completed_actions=Count('id', filter=Q(completed=True))
+        ).order_by('category_id')
+    ]}
+
+
+# セクション名 → コンテキストを作る関数
+SECTIONS = {
+    'mood': mood_context,
+    'recommendation': recommendation_context,
+    'actions': actions_context,
+    'category_stats': category_stats_context,
+}
+
+
+def template_name(name):
+    return f'myapp/partials/dashboard_{name}.html'
+
+
+def render_section(request, name, today=None):
+    today = today or date.today()
+    context = SECTIONS[name](request.user, today)
+    return render_to_string(template_name(name), {**context, 'today': today}, request)
+
+
+def wants_fragments(request):
+    """
+    部分更新の応答を求めるリクエストか（ダッシュボードの JavaScript が X-Fragments: 1 を付ける）
+    """
+    return request.headers.get('X-Fragments') == '1'
+
+
+def fragments_response(request, names, today=None):
+    """
+    書き込みの影響を受けたセクションの断片だけを返す
+    """
+    return JsonResponse({'fragments': {name: render_section(request, name, today) for name in names}})
@@ -0,0 +1,118 @@
+from array import array
+from datetime import date, timedelta
+import time
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from . import archive, metrics, snapshot, versioncache
+from .models import DailyDiary, ActionLog
+
+# =====================
+# 1年分の活動カレンダー（ヒートマップ）
+# =====================
+
+HEATMAP_DAYS = 365
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# 1日分を1つの整数に詰める: 気分(4bit) | 完了行動数(8bit) | 行動時間・分(20bit)
+MOOD_BITS = 4
+COMPLETED_BITS = 8
+MAX_COMPLETED = (1 << COMPLETED_BITS) - 1
+MAX_MINUTES = (1 << 20) - 1
+
+
+def pack_day(completed, minutes, mood):
+    return (
+        min(minutes, MAX_MINUTES) << (MOOD_BITS + COMPLETED_BITS)
+        | min(completed, MAX_COMPLETED) << MOOD_BITS
+        | mood
+    )
+
+
+def unpack_day(value):
+    """
+    (完了行動数, 行動時間, 気分) を返す（気分 0 は日記なし）
+    """
+    return (
+        value >> MOOD_BITS & MAX_COMPLETED,
+        value >> (MOOD_BITS + COMPLETED_BITS),
+        value & ((1 << MOOD_BITS) - 1),
+    )
+
+
+def _version_key(user_id):
+    return f'heatmap-version:{user_id}'
+
+
+def invalidate(user_id):
+    """
+    ユーザーの日記・行動ログが変わったときに呼ぶ（キャッシュ済みのデータを無効化）
+    """
+    versioncache.cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def activity_heatmap(user, today=None):
+    """
+    過去365日分の活動データ {'start', 'end', 'days'} を返す。
+    days は1日1要素の整数配列（pack_day 形式）で、ユーザーのデータが変わるまでキャッシュする。
+    """
+    today = today or date.today()
+    version = versioncache.cache.get_or_set(_version_key(user.pk), time.time_ns, None)
+    key = f'heatmap:{user.pk}:{version}:{today.isoformat()}'
+
+    days = cache.get(key)
+    metrics.cache_lookup('heatmap', days is not None)
+    if days is None:
+        # キャッシュはデータの変更時に無効化されるため、スナップショットではなく最新のデータから作る
+        with snapshot.live():
+            days = build_days(user, today).tobytes()
+        cache.set(key, days, CACHE_TIMEOUT)
+
+    return {
+        'start': (today - timedelta(days=HEATMAP_DAYS - 1)).isoformat(),
+        'end': today.isoformat(),
+        'days': array('I', days).tolist(),
+    }
+
+
+def build_days(user, today):
+    """
+    行動ログと日記を日付ごとに集計する1回のクエリ（UNION ALL）から、1年分の配列を作る
+    """
+    start = today - timedelta(days=HEATMAP_DAYS - 1)
+    completed = [0] * HEATMAP_DAYS
+    minutes = [0] * HEATMAP_DAYS
+    mood = [0] * HEATMAP_DAYS
+
+    actions = ActionLog.objects.filter(
+        user=user, date__gte=start, date__lte=today
+    ).values('date').annotate(
+        completed=Count('id', filter=Q(completed=True)),
+        minutes=Coalesce(Sum('duration_minutes'), 0),
+        mood=Value(0, output_field=IntegerField()),
+    ).order_by()
+    diaries = DailyDiary.objects.filter(
+        user=user, date__gte=start, date__lte=today
+    ).values('date').annotate(
+        completed=Value(0, output_field=IntegerField()),
+        minutes=Value(0, output_field=IntegerField()),
+        mood=Max('mood_score'),
+    ).order_by()
+
+    rows = list(actions.union(diaries, all=True).values_list('date', 'completed', 'minutes', 'mood'))
+    if archive.covers('actionlog', start):
+        # アーカイブ済みの行動ログは日付ごとに足し合わせる
+        rows += [
+            (row['date'], int(bool(row['completed'])), row['duration_minutes'], 0)
+            for row in archive.iter_archived_rows(
+                'actionlog', start, min(today, archive.archived_until('actionlog')), user
+            )
+        ]
+
+    for day, day_completed, day_minutes, day_mood in rows:
+        i = (day - start).days
+        completed[i] += day_completed
+        minutes[i] += day_minutes
+        mood[i] = max(mood[i], day_mood)
+
+    return array('I', (pack_day(completed[i], minutes[i], mood[i]) for i in range(HEATMAP_DAYS)))
@@ -0,0 +1,194 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import logging
+import threading
+import traceback
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# =====================
+# データベースを使ったジョブキュー
+# =====================
+
+# 登録済みの処理（ジョブ名 → 関数）
+TASKS = {}
+
+# 再試行までの待ち時間（秒、試行ごとに倍、上限あり）
+JOB_RETRY_DELAY = 30
+JOB_RETRY_MAX_DELAY = 60 * 60
+
+# 実行中のままこの秒数を過ぎたジョブは、ワーカーが落ちたものとして取り直す
+JOB_LOCK_TIMEOUT = 10 * 60
+
+# 実行中のジョブの locked_at をこの秒数ごとに更新する（JOB_LOCK_TIMEOUT より長いジョブを取り直させない）
+JOB_HEARTBEAT_INTERVAL = 60
+
+# 1回の取り出しで候補にするジョブ数（他のワーカーと取り合った場合の予備）
+CLAIM_CANDIDATES = 10
+
+
+def task(name):
+    """
+    ジョブとして実行できる処理を登録するデコレータ。
+    引数・戻り値は JSON で保存できる値にする。
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, *, key=None, user=None, run_at=None, max_attempts=3, **args):
+    """
+    ジョブを登録して返す。key が同じ実行待ち・実行中のジョブがあれば、それを返す。
+    """
+    if name not in TASKS:
+        raise ValueError(f'未登録のジョブです: {name}')
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                return Job.objects.create(
+                    name=name,
+                    key=key,
+                    user=user,
+                    args=args,
+                    run_at=run_at or timezone.now(),
+                    max_attempts=max_attempts,
+                )
+        except IntegrityError:
+            if key is None:
+                raise
+            job = Job.objects.filter(key=key, status__in=Job.ACTIVE_STATUSES).first()
+            if job is not None:
+                return job
+            # 確認の間に終了した場合はもう一度登録する
+    raise IntegrityError(f'ジョブを登録できませんでした: {key}')
+
+
+def claim(worker_name, now=None):
+    """
+    実行できるジョブを1件取り出す（なければ None）。
+    状態を条件にした UPDATE で取り出すため、複数のワーカーが同じジョブを実行することはない。
+    """
+    now = now or timezone.now()
+    claimable = (
+        Q(status='queued', run_at__lte=now)
+        | Q(status='running', locked_at__lt=now - timedelta(seconds=JOB_LOCK_TIMEOUT))
+    )
+    candidates = Job.objects.filter(claimable).order_by('run_at', 'id').values_list('id', flat=True)
+    for job_id in candidates[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(claimable, id=job_id).update(
+            status='running',
+            locked_by=worker_name,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def execute(job):
+    """
+    取り出したジョブを実行し、結果（完了・再試行・失敗）を記録する
+    """
+    owned = Job.objects.filter(id=job.pk, status='running', locked_by=job.locked_by)
+    if job.attempts > job.max_attempts:
+        # 実行中に落ちたワーカーのジョブを取り直したが、試行回数を使い切っている
+        owned.update(status='failed', last_error=job.last_error or 'タイムアウトしました。',
+                     finished_at=timezone.now(), updated_at=timezone.now())
+        return
+
+    try:
+        with _heartbeat(job):
+            result = TASKS[job.name](**job.args)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        logger.exception('ジョブ %s #%s が失敗しました', job.name, job.pk)
+        if job.attempts < job.max_attempts:
+            delay = min(JOB_RETRY_DELAY * 2 ** (job.attempts - 1), JOB_RETRY_MAX_DELAY)
+            owned.update(status='queued', run_at=now + timedelta(seconds=delay),
+                         last_error=error, updated_at=now)
+        else:
+            owned.update(status='failed', last_error=error, finished_at=now, updated_at=now)
+        return
+
+    now = timezone.now()
+    owned.update(status='succeeded', result=result, finished_at=now, updated_at=now)
+
+
+@contextmanager
+def _heartbeat(job):
+    """
+    ブロックの実行中、別スレッドで JOB_HEARTBEAT_INTERVAL 秒ごとにジョブの locked_at を更新する。
+    ワーカーが生きている間は JOB_LOCK_TIMEOUT を過ぎても他のワーカーに取り直されない。
+    """
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(JOB_HEARTBEAT_INTERVAL):
+                now = timezone.now()
+                updated = Job.objects.filter(id=job.pk, status='running', locked_by=job.locked_by).update(
+                    locked_at=now, updated_at=now,
+                )
+                if not updated:
+                    break  # 取り直された（このワーカーのジョブではなくなった）
+        except Exception:
+            logger.exception('ジョブ %s #%s の実行中の記録に失敗しました', job.name, job.pk)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'job-heartbeat-{job.pk}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+class Worker:
+    """
+    ジョブを取り出して実行し続けるワーカー（1スレッドで1つ動かす）
+    """
+
+    def __init__(self, name, poll_interval=1.0):
+        self.name = name
+        self.poll_interval = poll_interval
+
+    def run_once(self):
+        """
+        ジョブを1件処理する。処理するジョブがなければ False を返す。
+        """
+        close_old_connections()
+        job = claim(self.name)
+        if job is None:
+            return False
+        execute(job)
+        return True
+
+    def run(self, stop):
+        """
+        stop（threading.Event）が立つまで処理を続け、ジョブがなければ poll_interval 秒待つ
+        """
+        try:
+            while not stop.is_set():
+                if not self.run_once():
+                    stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+
+def is_async():
+    """
+    AI提案の生成などをワーカーに任せる設定かどうか
+    """
+    return getattr(settings, 'AI_COACH_ASYNC', False)
@@ -0,0 +1,352 @@
+from bisect import bisect_left, insort
+from datetime import date, datetime, timedelta
+import threading
+import time
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from . import shards
+from .models import ActionLog, LeaderboardScore, UserProfile
+from .versioncache import cache
+
+# =====================
+# 習慣ランキング（オプトイン）
+# =====================
+#
+# 参加ユーザーのカテゴリ・期間（週間・月間）ごとの集計値を LeaderboardScore に保存し、
+# 各プロセスはランキングごとに「スコア → 人数」のフェニック木（Binary Indexed Tree）を持つ。
+# 上位K人は O(K log M)、自分の順位は O(log M) で求まり（M はスコアの上限）、表示のたびに全員を並べ替えない。
+#
+# 行動ログの保存時には、そのユーザー・カテゴリ・期間の集計値だけを計算し直し、行を作り直す（新しいIDになる）。
+# 各プロセスは前回読んだIDより後の行だけを読み、手元のランキングに差分を反映する。
+
+# ランキングの種類：名前 → (表示名, 単位)
+METRICS = {
+    'minutes': ('完了した時間', '分'),
+    'streak': ('最長連続日数', '日'),
+    'rate': ('完了率', '%'),
+}
+
+# 完了率のランキングに載るのに必要な行動数
+MIN_ACTIONS_FOR_RATE = 3
+
+# スコアの上限（これを超える値は上限として扱う）。完了率は 0.1% 単位。
+MAX_SCORES = {
+    'minutes': 31 * 24 * 60,
+    'streak': 31,
+    'rate': 1000,
+}
+
+# 表示する上位の人数
+TOP_SIZE = 20
+
+# 記録直後の行は読み直す秒数（先に番号を取った書き込みが後からコミットされても取りこぼさない）
+SETTLE_SECONDS = 2
+
+# 全プロセスにランキングを読み直させるためのバージョン（ユーザー削除・作り直しのとき）
+GENERATION_KEY = 'leaderboard-generation'
+
+_lock = threading.Lock()
+_state = {'generation': None, 'cursor': None, 'boards': {}}
+
+
+def period_start(period, day):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_end(period, start):
+    if period == 'week':
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def is_tracked(day, today=None):
+    """
+    ランキングを保つ日付か（先月以降。アーカイブのような古い行の移動では集計し直さない）
+    """
+    today = today or date.today()
+    return day >= period_start('month', period_start('month', today) - timedelta(days=1))
+
+
+class FenwickTree:
+    """
+    1〜size の位置ごとの件数を持ち、先頭からの合計と「合計が k に達する位置」を O(log size) で求める
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.step = 1 << size.bit_length()
+
+    def add(self, position, delta):
+        while position <= self.size:
+            self.tree[position] += delta
+            position += position & -position
+
+    def prefix(self, position):
+        total = 0
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+    def find(self, k):
+        """
+        先頭からの合計が k 以上になる最小の位置
+        """
+        position = 0
+        step = self.step
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < k:
+                position = nxt
+                k -= self.tree[nxt]
+            step >>= 1
+        return position + 1
+
+
+class ScoreIndex:
+    """
+    1つのランキング。スコアの高い順の位置（上限 - スコア + 1）に人数を数え、
+    同じスコアのユーザーはID順のリストで持つ。
+    """
+
+    def __init__(self, max_score):
+        self.max_score = max_score
+        self.tree = FenwickTree(max_score + 1)
+        self.users = {}    # スコア → ユーザーIDのリスト（昇順）
+        self.scores = {}   # ユーザーID → スコア
+
+    def _position(self, score):
+        return self.max_score - score + 1
+
+    def set(self, user_id, score):
+        """
+        ユーザーのスコアを設定する（None ならランキングから外す）
+        """
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self.tree.add(self._position(old), -1)
+            users = self.users[old]
+            del users[bisect_left(users, user_id)]
+        if score is not None:
+            score = max(0, min(score, self.max_score))
+            self.scores[user_id] = score
+            self.tree.add(self._position(score), 1)
+            insort(self.users.setdefault(score, []), user_id)
+
+    def rank(self, user_id):
+        """
+        順位（自分より高いスコアの人数 + 1。同じスコアは同じ順位）。載っていなければ None。
+        """
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.tree.prefix(self._position(score) - 1) + 1
+
+    def top(self, k):
+        """
+        上位 k 人の (順位, ユーザーID, スコア)
+        """
+        entries = []
+        rank = 1
+        while len(entries) < k and rank <= len(self.scores):
+            score = self.max_score + 1 - self.tree.find(rank)
+            users = self.users[score]
+            entries.extend((rank, user_id, score) for user_id in users[:k - len(entries)])
+            rank += len(users)
+        return entries
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def scores_of(row):
+    """
+    集計値から各ランキングのスコア（完了率は行動数が足りなければ None）
+    """
+    return {
+        'minutes': row['completed_minutes'],
+        'streak': row['streak'],
+        'rate': (
+            row['completed_count'] * 1000 // row['total_count']
+            if row['total_count'] >= MIN_ACTIONS_FOR_RATE else None
+        ),
+    }
+
+
+class Board:
+    """
+    カテゴリ・期間ごとのランキング（種類ごとの ScoreIndex）
+    """
+
+    def __init__(self):
+        self.indexes = {metric: ScoreIndex(MAX_SCORES[metric]) for metric in METRICS}
+
+    def apply(self, row):
+        scores = scores_of(row) if row['is_public'] else dict.fromkeys(METRICS)
+        for metric, index in self.indexes.items():
+            index.set(row['user_id'], scores[metric])
+
+
+_FIELDS = [
+    'id', 'user_id', 'category_id', 'period', 'period_start', 'completed_minutes',
+    'completed_count', 'total_count', 'streak', 'is_public', 'updated_at',
+]
+
+
+def _sync():
+    """
+    前回以降に作り直された行を、読み込み済みのランキングに反映する（_lock を持って呼ぶ）
+    """
+    generation = cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+    if _state['generation'] != generation or _state['cursor'] is None:
+        # 初回・読み直し：ここから後の変更だけを読む
+        _state['generation'] = generation
+        _state['boards'] = {}
+        _state['cursor'] = LeaderboardScore.objects.using('default').aggregate(last=Max('id'))['last'] or 0
+        return
+
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    boards = _state['boards']
+    advancing = True
+    for row in LeaderboardScore.objects.using('default').filter(id__gt=_state['cursor']).order_by('id').values(*_FIELDS):
+        board = boards.get((row['category_id'], row['period'], row['period_start']))
+        if board is not None:
+            board.apply(row)
+        # コミット順が前後しうる直近の行からは、次回も読み直す（反映は何度行っても同じ結果）
+        advancing = advancing and row['updated_at'] <= settled
+        if advancing:
+            _state['cursor'] = row['id']
+
+
+def _board(category_id, period, start):
+    """
+    ランキング（読み込んでいなければ、公開中の行から作る）。_lock を持って呼ぶ。
+    """
+    key = (category_id, period, start)
+    board = _state['boards'].get(key)
+    if board is None:
+        board = _state['boards'][key] = Board()
+        for row in LeaderboardScore.objects.using('default').filter(
+            period=period, period_start=start, category_id=category_id, is_public=True
+        ).values(*_FIELDS):
+            board.apply(row)
+    return board
+
+
+def standings(category_id, period, metric, user_id=None, today=None, size=TOP_SIZE):
+    """
+    今の期間の上位 size 人と、user_id の順位・スコアを返す
+    """
+    start = period_start(period, today or date.today())
+    with _lock:
+        _sync()
+        index = _board(category_id, period, start).indexes[metric]
+        top = index.top(size)
+        own = None
+        if user_id is not None and user_id in index.scores:
+            own = {'rank': index.rank(user_id), 'score': index.scores[user_id]}
+        return {
+            'start': start,
+            'end': period_end(period, start),
+            'participants': len(index),
+            'top': top,
+            'own': own,
+        }
+
+
+# =====================
+# 集計値の更新（行動ログの保存時）
+# =====================
+def is_participating(user_id):
+    with shards.for_user(user_id):
+        return UserProfile.objects.filter(user_id=user_id, share_on_leaderboard=True).exists()
+
+
+def _aggregate(user_id, category_id, period, start):
+    """
+    ユーザー・カテゴリ・期間の集計値を行動ログから計算する
+    """
+    end = period_end(period, start)
+    with shards.for_user(user_id):
+        rows = list(ActionLog.objects.filter(
+            user_id=user_id, category_id=category_id, date__gte=start, date__lte=end
+        ).values_list('date', 'duration_minutes', 'completed'))
+
+    completed_days = sorted({day for day, _, completed in rows if completed})
+    streak = longest = 0
+    for i, day in enumerate(completed_days):
+        streak = streak + 1 if i and (day - completed_days[i - 1]).days == 1 else 1
+        longest = max(longest, streak)
+    return {
+        'completed_minutes': sum(minutes for _, minutes, completed in rows if completed),
+        'completed_count': sum(1 for _, _, completed in rows if completed),
+        'total_count': len(rows),
+        'streak': longest,
+    }
+
+
+def _replace(user_id, category_id, period, start, is_public, values):
+    """
+    行を作り直して新しい変更番号を振る
+    """
+    with transaction.atomic(using='default'):
+        LeaderboardScore.objects.using('default').filter(
+            user_id=user_id, category_id=category_id, period=period, period_start=start
+        ).delete()
+        LeaderboardScore.objects.using('default').create(
+            user_id=user_id, category_id=category_id, period=period, period_start=start,
+            is_public=is_public, **values
+        )
+
+
+def refresh(user_id, changes):
+    """
+    行動ログの (カテゴリID, 日付) の並びについて、参加ユーザーなら該当する期間の集計値を計算し直す
+    """
+    changes = [
+        (category_id, timezone.localdate(day) if isinstance(day, datetime) else day)  # 既定値（timezone.now）のまま保存された場合
+        for category_id, day in changes
+    ]
+    targets = {
+        (category_id, period, period_start(period, day))
+        for category_id, day in changes
+        if category_id is not None and is_tracked(day)
+        for period, _ in LeaderboardScore.PERIODS
+    }
+    if not targets or not is_participating(user_id):
+        return
+    for category_id, period, start in sorted(targets):
+        _replace(user_id, category_id, period, start, True, _aggregate(user_id, category_id, period, start))
+
+
+def set_participation(user_id, participating, today=None):
+    """
+    ランキングへの参加・不参加を反映する。
+    参加時は今の期間（と先月）の全カテゴリの集計値を作り、不参加時はすべての行を非公開にする。
+    """
+    if participating:
+        today = today or date.today()
+        first = period_start('month', period_start('month', today) - timedelta(days=1))
+        with shards.for_user(user_id):
+            changes = set(ActionLog.objects.filter(
+                user_id=user_id, date__gte=first
+            ).values_list('category_id', 'date').distinct())
+        refresh(user_id, changes)
+        return
+
+    for row in LeaderboardScore.objects.using('default').filter(user_id=user_id, is_public=True).values(*_FIELDS):
+        _replace(row['user_id'], row['category_id'], row['period'], row['period_start'], False, {
+            field: row[field] for field in ('completed_minutes', 'completed_count', 'total_count', 'streak')
+        })
+
+
+def invalidate_all():
+    """
+    全プロセスにランキングを読み直させる（ユーザーの削除など、行の作り直しで表せない変更のとき）
+    """
+    cache.set(GENERATION_KEY, time.time_ns(), None)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from ... import archive
+
+
+class Command(BaseCommand):
+    """
+    保存期間（ARCHIVE_HORIZON_DAYS）を過ぎた行動ログ・AI提案を
+    圧縮JSONLセグメントへ移し、ホットテーブルを小さく保つ。
+    """
+    help = '古い行動ログ・AI提案をアーカイブへ移動します'
+
+    def handle(self, *args, **options):
+        moved = archive.archive_old_rows()
+        for model_name, count in moved.items():
+            self.stdout.write(f'{model_name}: {count}件')
+        self.stdout.write(self.style.SUCCESS(
+            f'{archive.archive_cutoff()} より前のデータをアーカイブしました。'
+        ))
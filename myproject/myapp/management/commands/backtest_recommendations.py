@@ -0,0 +1,83 @@
+from datetime import date
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from ... import backtest, snapshot
+
+
+class Command(BaseCommand):
+    """
+    ルール表による日次提案を全ユーザーの過去の各日について再現し、その後の気分・行動完了率の変化を
+    ルールごとに集計する（AIRecommendation は保存しない）。
+    --json で結果を保存し、ルールを変更した後に --baseline で比べる。
+    """
+    help = 'AI提案ルールを過去のデータでバックテストします'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='開始日（YYYY-MM-DD、省略時は最も古いデータの翌週）')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='終了日（YYYY-MM-DD、省略時は結果を観測できる最後の日）')
+        parser.add_argument('--horizon', type=int, default=backtest.DEFAULT_HORIZON_DAYS,
+                            help='提案後に気分・完了率を観測する日数')
+        parser.add_argument('--rules', default='',
+                            help='評価するルールのID（カンマ区切り、無効なルールも可。省略時は有効なルール表）')
+        parser.add_argument('--json', default='',
+                            help='結果を保存するJSONファイル')
+        parser.add_argument('--baseline', default='',
+                            help='比較する以前の結果（--json で保存したファイル）')
+
+    def handle(self, *args, **options):
+        if options['horizon'] <= 0:
+            raise CommandError('--horizon は1以上で指定してください。')
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = {(rule['stage'], rule['rule']): rule for rule in json.load(f)['rules']}
+
+        ruleset = None
+        if options['rules']:
+            try:
+                ruleset = backtest.ruleset_for([int(rule_id) for rule_id in options['rules'].split(',')])
+            except ValueError:
+                raise CommandError('--rules はルールIDのカンマ区切りで指定してください。')
+
+        started = time.perf_counter()
+        # 重い読み取りのため、十分新しいスナップショットがあればそちらから読む
+        with snapshot.reading():
+            start, end = backtest.default_period(options['horizon'])
+            start, end = options['start'] or start, options['end'] or end
+            if start > end:
+                raise CommandError('開始日が終了日より後です。')
+            result = backtest.Backtest(start, end, options['horizon'], ruleset).run()
+        result['seconds'] = round(time.perf_counter() - started, 2)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{result['start']}〜{result['end']}：{result['users']}人・{result['user_days']}人日 "
+            f"（観測 {result['horizon_days']}日、{result['seconds']}秒）"
+        ))
+        self.stdout.write('段階  ルール  一致数（割合）  気分の変化（改善した割合）  完了率の変化（改善した割合）')
+        for rule in result['rules']:
+            line = (
+                f"{'基本' if rule['stage'] == 'base' else '追加'}  {rule['rule']}  "
+                f"{rule['fired']}（{rule['share']:.1%}）  "
+                f"{self._delta(rule, 'mood', '+.2f')}  {self._delta(rule, 'completion', '+.1%')}"
+            )
+            previous = baseline.get((rule['stage'], rule['rule']))
+            if previous is not None:
+                line += f"  ｜ 以前: {previous['fired']}件  {self._delta(previous, 'mood', '+.2f')}  " \
+                        f"{self._delta(previous, 'completion', '+.1%')}"
+            elif baseline:
+                line += '  ｜ 以前: なし'
+            self.stdout.write(line)
+
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"結果を {options['json']} に保存しました。"))
+
+    @staticmethod
+    def _delta(rule, key, spec):
+        if rule[f'{key}_delta'] is None:
+            return '-'
+        return f"{format(rule[f'{key}_delta'], spec)}（{rule[f'{key}_improved']:.0%}）"
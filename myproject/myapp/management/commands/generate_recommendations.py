@@ -0,0 +1,18 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from ...rules import generate_daily_recommendations
+
+
+class Command(BaseCommand):
+    """
+    日次提案がまだない全ユーザーの提案を、ルール表の一括評価でまとめて生成する。
+    """
+    help = '全ユーザーの日次AI提案を一括生成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='対象日（YYYY-MM-DD、省略時は今日）')
+
+    def handle(self, *args, **options):
+        recommendations = generate_daily_recommendations(options['date'] or date.today())
+        self.stdout.write(self.style.SUCCESS(f'{len(recommendations)}件の提案を生成しました。'))
@@ -0,0 +1,19 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from ...reports import PeriodReportEngine
+
+
+class Command(BaseCommand):
+    """
+    提案頻度（日次・週次・月次）に従い、対象日にレポート作成日を迎えた
+    全ユーザーの振り返りレポートをまとめて生成する。
+    """
+    help = '対象日に作成予定の振り返りレポートを一括生成します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='対象日（YYYY-MM-DD、省略時は今日）')
+
+    def handle(self, *args, **options):
+        reports = PeriodReportEngine(options['date']).generate_due_reports()
+        self.stdout.write(self.style.SUCCESS(f'{len(reports)}件のレポートを生成しました。'))
@@ -0,0 +1,28 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from ... import shards
+
+
+class Command(BaseCommand):
+    """
+    default と全シャードにマイグレーションを適用し、シャードの採番開始位置を設定する。
+    シャードにはユーザー別データのテーブルだけが作られる（ShardRouter.allow_migrate）。
+    """
+    help = 'default と全シャードにマイグレーションを適用します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?', help='対象のアプリ（省略時はすべて）')
+        parser.add_argument('migration_name', nargs='?', help='適用先のマイグレーション')
+
+    def handle(self, *args, **options):
+        targets = [name for name in (options['app_label'], options['migration_name']) if name]
+        for alias in shards.aliases():
+            self.stdout.write(f'[{alias}]')
+            call_command(
+                'migrate', *targets,
+                database=alias,
+                interactive=False,
+                verbosity=options['verbosity'],
+                stdout=self.stdout,
+            )
+            shards.reserve_id_space(alias)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from ... import shards
+
+
+class Command(BaseCommand):
+    """
+    シャード数を変えた後、別のシャードに属するユーザーのデータを本来のシャードへ移す。
+    ユーザー単位で移動し、途中で止めても再実行すれば続きから処理できる。
+    """
+    help = 'ユーザー別データを現在のシャード数に合わせて再配置します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='移動対象のユーザー数だけを表示')
+
+    def handle(self, *args, **options):
+        total_users = 0
+        for source in shards.aliases():
+            user_ids = shards.misplaced_users(source)
+            self.stdout.write(f'{source}: 移動対象 {len(user_ids)}人')
+            if options['dry_run']:
+                continue
+            for user_id in user_ids:
+                target, copied = shards.move_user(user_id, source)
+                self.stdout.write(f'  ユーザー{user_id}: {source} → {target}（{copied}行）')
+            total_users += len(user_ids)
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total_users}人のデータを再配置しました。'))
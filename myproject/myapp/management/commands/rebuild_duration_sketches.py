@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from ... import durations
+
+
+class Command(BaseCommand):
+    """
+    行動時間の分布（DurationBucket）を、すべての行動ログとアーカイブから作り直す。
+    導入時と、分布が行動ログとずれた場合に使う（通常は保存のたびに更新される）。
+    """
+    help = '行動時間の分布を行動ログから作り直します'
+
+    def handle(self, *args, **options):
+        rows = durations.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{rows}行の分布を作成しました。'))
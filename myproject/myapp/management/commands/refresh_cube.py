@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from ... import cube
+
+
+class Command(BaseCommand):
+    """
+    運営向け集計キューブのうち、変更があった日付だけを再集計する。
+    """
+    help = '再集計待ちの日付について集計キューブを更新します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='データのある全日付を再集計する（初回構築用）')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            cube.mark_all_dirty()
+        days = cube.refresh()
+        self.stdout.write(self.style.SUCCESS(f'{days}日分を再集計しました。'))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from ... import snapshot
+
+
+class Command(BaseCommand):
+    """
+    分析ページ・運営向け集計が読む読み取り専用スナップショットを、SQLite のオンラインバックアップで作り直す
+    （常駐またはcronで1回実行）。ANALYTICS_SNAPSHOT_MAX_AGE より短い間隔で実行する。
+    """
+    help = '分析用の読み取り専用スナップショットを作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='指定した秒数ごとに作り直し続ける（既定は1回だけ実行）')
+
+    def handle(self, *args, **options):
+        while True:
+            timings = snapshot.refresh()
+            self.stdout.write(self.style.SUCCESS(
+                'スナップショットを作成しました: '
+                + ', '.join(f'{alias}={seconds * 1000:.0f}ms' for alias, seconds in timings.items())
+            ))
+            if options['interval'] <= 0:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from ...notifications import ReminderScheduler, run_once
+
+
+class Command(BaseCommand):
+    """
+    通知を有効にしているユーザーへ、リマインド時刻に
+    「今日の行動が未記録」「日記が未記入」の通知を送る（常駐またはcronで1回実行）。
+    """
+    help = 'リマインダー通知のスケジューラを実行します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='前回の実行以降に時刻を迎えたリマインドを1回だけ処理して終了')
+        parser.add_argument('--interval', type=int, default=60,
+                            help='常駐時に設定変更を確認する間隔（秒）')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            sent = run_once()
+            self.stdout.write(self.style.SUCCESS(f'{sent}件の通知を送信しました。'))
+            return
+        scheduler = ReminderScheduler()
+        self.stdout.write('リマインダーのスケジューラを開始します（Ctrl+C で終了）')
+        try:
+            scheduler.run(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,43 @@
+import os
+import socket
+import threading
+from django.core.management.base import BaseCommand
+from ...jobs import Worker
+
+
+class Command(BaseCommand):
+    """
+    データベースのジョブキューからジョブを取り出して実行するワーカーを起動する。
+    --concurrency で同時に実行するワーカー（スレッド）数を指定。
+    """
+    help = 'バックグラウンドジョブのワーカーを起動します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='同時に実行するワーカー数')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='ジョブがないときに待つ秒数')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(
+                target=Worker(f'{prefix}:{i}', options['poll_interval']).run,
+                args=(stop,),
+                daemon=True,
+            )
+            for i in range(max(options['concurrency'], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f'{len(threads)}個のワーカーを起動しました（Ctrl+C で終了）')
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                stop.wait(1)
+        except KeyboardInterrupt:
+            self.stdout.write('実行中のジョブの終了を待っています...')
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from ... import slowlog
+
+
+class Command(BaseCommand):
+    """
+    スロークエリログ（ローテーション済みを含む）をクエリの形ごとにまとめ、合計時間の長い順に表示する。
+    """
+    help = 'スロークエリログをクエリの形ごとに集計します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='表示するクエリの形の数')
+        parser.add_argument('--caller', default='',
+                            help='発行元（ビュー名・AIHabitCoach のメソッド名）に含まれる文字列で絞り込む')
+        parser.add_argument('--plan', action='store_true',
+                            help='最も遅かった実行の EXPLAIN QUERY PLAN と呼び出し履歴も表示')
+
+    def handle(self, *args, **options):
+        entries = slowlog.read_entries()
+        if options['caller']:
+            entries = (entry for entry in entries if options['caller'] in (entry.get('caller') or ''))
+        summary = slowlog.summarize(entries)
+        if not summary:
+            self.stdout.write('記録された遅いクエリはありません。')
+            return
+
+        for rank, group in enumerate(summary[:options['limit']], 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{rank}. 合計 {group['total_ms']:.1f}ms / {group['count']}回 / "
+                f"平均 {group['avg_ms']:.1f}ms / 最大 {group['max_ms']:.1f}ms"
+            ))
+            self.stdout.write(f"   {group['shape']}")
+            callers = sorted(group['callers'].items(), key=lambda item: item[1], reverse=True)
+            self.stdout.write('   発行元: ' + ', '.join(f'{caller} ({count})' for caller, count in callers))
+            if options['plan']:
+                slowest = group['slowest']
+                self.stdout.write(f"   最も遅い実行（{slowest['time']}）の実行計画:")
+                for line in slowest['plan']:
+                    self.stdout.write(f'     {line}')
+                self.stdout.write('   呼び出し履歴:')
+                for frame in slowest['stack']:
+                    self.stdout.write(f'     {frame}')
+        if len(summary) > options['limit']:
+            self.stdout.write(f"ほか {len(summary) - options['limit']} 種類")
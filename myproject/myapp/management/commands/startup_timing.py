@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+from django.core.management.base import BaseCommand, CommandError
+
+# 新しいプロセスで起動の各段階を計測するスクリプト
+# （このコマンド自体は起動済みのため、毎回まっさらなインタプリタで計測する）
+MEASURE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+from django.conf import settings
+settings.INSTALLED_APPS  # 設定モジュールの読み込み
+imported = time.perf_counter()
+django.setup()
+set_up = time.perf_counter()
+from django.test import Client
+from myproject.myapp.warmup import warm_up
+timings = {'import': imported - started, 'setup': set_up - imported}
+if sys.argv[1] == '1':
+    timings.update(('warmup:' + name, seconds) for name, seconds in warm_up().items())
+settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+first = time.perf_counter()
+Client().get(sys.argv[2])
+timings['first_request'] = time.perf_counter() - first
+print(json.dumps(timings))
+"""
+
+
+class Command(BaseCommand):
+    """
+    ワーカーの起動にかかる時間を段階ごと（設定の読み込み、django.setup()、ウォームアップの各手順、
+    最初のリクエスト）に計測する。--no-warmup と比べて、ウォームアップの効果を確認できる。
+    """
+    help = '起動時間（読み込み・django.setup()・ウォームアップ・最初のリクエスト）を計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='計測回数（中央値を表示）')
+        parser.add_argument('--no-warmup', action='store_true',
+                            help='ウォームアップせずに最初のリクエストを計測')
+        parser.add_argument('--path', default='/login/',
+                            help='最初のリクエストで取得するパス')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        warm = '0' if options['no_warmup'] else '1'
+
+        runs = []
+        for _ in range(max(options['repeat'], 1)):
+            result = subprocess.run(
+                [sys.executable, '-c', MEASURE_SCRIPT, warm, options['path']],
+                env=env, capture_output=True, text=True,
+            )
+            if result.returncode != 0:
+                raise CommandError(result.stderr.strip())
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        for name in runs[0]:
+            values = sorted(run[name] for run in runs)
+            median = values[len(values) // 2]
+            self.stdout.write(f'{name:<20} {median * 1000:9.1f} ms')
+        total = sorted(sum(run.values()) for run in runs)[len(runs) // 2]
+        self.stdout.write(f'{"total":<20} {total * 1000:9.1f} ms')
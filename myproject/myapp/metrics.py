@@ -0,0 +1,301 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import atexit
+import json
+import math
+import os
+from pathlib import Path
+import threading
+import time
+from django.conf import settings
+
+# =====================
+# 運用監視用のメトリクス（Prometheus のテキスト形式）
+# =====================
+#
+# 各プロセスは値をメモリ上の辞書に加算するだけで（観測1回は辞書の参照と加算のみ）、
+# バックグラウンドのスレッドが FLUSH_INTERVAL 秒ごとに METRICS_DIR/<pid>-<起動時刻>.json へ書き出す。
+# /metrics は全プロセスのファイルを合算して返すため、gunicorn の複数ワーカーでも正しく集計される。
+# 終了したワーカーのファイルも残し、カウンタが減らないようにする（マスター起動時に clear_dir() で消す）。
+
+# ファイルへ書き出す間隔（秒）。他のプロセスの値はこの秒数だけ遅れて反映される。
+FLUSH_INTERVAL = 1.0
+
+# 「アクティブユーザー」とみなす、最後のリクエストからの秒数
+ACTIVE_USER_WINDOW = 5 * 60
+
+# 応答時間のヒストグラムの境界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_registry = {}
+_seen = {}  # ユーザーID → 最後のリクエスト時刻（UNIX時刻）
+_process = {'file': None, 'flusher': None}
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', settings.BASE_DIR / 'metrics'))
+
+
+class Counter:
+    """
+    増加のみのカウンタ（ラベルの値の組ごと）
+    """
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry[name] = self
+
+    def inc(self, *label_values, amount=1):
+        values = self._values
+        values[label_values] = values.get(label_values, 0) + amount
+
+    def _reset(self):
+        self._values = {}
+
+    def _merge(self, totals, values):
+        for key, value in values.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def _samples(self, key, value):
+        yield self.name, _label_pairs(self.labels, key), value
+
+
+class Histogram:
+    """
+    境界ごとの件数・合計・件数を持つヒストグラム（ラベルの値の組ごと）。
+    値は [境界ごとの件数..., +Inf の件数, 合計] の配列で持つ。
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        _registry[name] = self
+
+    def observe(self, value, *label_values):
+        counts = self._values.get(label_values)
+        if counts is None:
+            counts = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def _reset(self):
+        self._values = {}
+
+    def _merge(self, totals, values):
+        for key, counts in values.items():
+            current = totals.get(key)
+            if current is None:
+                totals[key] = list(counts)
+            else:
+                for i, count in enumerate(counts):
+                    current[i] += count
+
+    def _samples(self, key, counts):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(bound)
+            yield f'{self.name}_bucket', _label_pairs(self.labels + ('le',), key + (le,)), cumulative
+        yield f'{self.name}_sum', _label_pairs(self.labels, key), counts[-1]
+        yield f'{self.name}_count', _label_pairs(self.labels, key), cumulative
+
+
+# =====================
+# メトリクスの定義
+# =====================
+REQUESTS = Counter(
+    'habit_http_requests_total', 'HTTPリクエスト数', ['view', 'method', 'status']
+)
+REQUEST_SECONDS = Histogram(
+    'habit_http_request_duration_seconds', 'HTTPリクエストの処理時間（秒）', ['view']
+)
+DB_QUERIES = Counter(
+    'habit_db_queries_total', 'リクエスト中に実行したDBクエリ数', ['view']
+)
+RECOMMENDATIONS = Counter(
+    'habit_recommendations_generated_total', '生成したAI提案の数', ['type', 'mode']
+)
+RECOMMENDATION_SECONDS = Histogram(
+    'habit_recommendation_generation_seconds',
+    'AI提案の生成時間（秒。mode=batch は一括生成1回分）', ['type', 'mode']
+)
+CACHE_LOOKUPS = Counter(
+    'habit_cache_lookups_total', 'キャッシュの参照数（result=hit/miss）', ['cache', 'result']
+)
+
+
+def seen_user(user_id):
+    """
+    ユーザーのリクエストを記録（アクティブユーザー数の集計用）
+    """
+    _seen[user_id] = time.time()
+
+
+def cache_lookup(name, hit):
+    CACHE_LOOKUPS.inc(name, 'hit' if hit else 'miss')
+
+
+# =====================
+# プロセスごとのファイルへの書き出しと合算
+# =====================
+def _prune_seen(now):
+    """
+    ACTIVE_USER_WINDOW 秒より前に最後のリクエストがあったユーザーを忘れ、残りを返す
+    （これまでの全ユーザーを持ち続けて、書き出す量が増え続けないようにする）
+    """
+    threshold = now - ACTIVE_USER_WINDOW
+    seen = _seen.copy()  # 記録はロックなしで行われるため、コピーしてから調べる
+    for user_id, seen_at in seen.items():
+        if seen_at < threshold and _seen.get(user_id, now) < threshold:
+            _seen.pop(user_id, None)
+    return {user_id: seen_at for user_id, seen_at in seen.items() if seen_at >= threshold}
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'metrics': {
+                name: [[list(key), value] for key, value in metric._values.copy().items()]
+                for name, metric in _registry.items()
+            },
+            'seen': _prune_seen(time.time()),
+        }
+
+
+def flush():
+    """
+    このプロセスの値をファイルへ書き出す（一時ファイルから置き換えるため、読み手は途中の内容を見ない）
+    """
+    path = _process['file']
+    if path is None:
+        return
+    if not path.exists() and not _seen and not any(metric._values for metric in _registry.values()):
+        return  # 何も記録していないプロセス（管理コマンドなど）はファイルを作らない
+    directory = metrics_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.tmp')
+    tmp_path.write_text(json.dumps(_snapshot()), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass  # 書き出せなかった分は次回に書き出す
+
+
+def start():
+    """
+    このプロセスの書き出しを開始する（アプリの読み込み時・フォーク後に呼ばれる）
+    """
+    _process['file'] = metrics_dir() / f'{os.getpid()}-{time.time_ns()}.json'
+    _process['flusher'] = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+    _process['flusher'].start()
+
+
+def _after_fork():
+    # フォーク前（マスター）の値を引き継がず、ワーカーごとに新しいファイルへ書き出す
+    global _lock
+    _lock = threading.Lock()  # フォーク時に他のスレッドが持っていたロックは解放されないため作り直す
+    with _lock:
+        for metric in _registry.values():
+            metric._reset()
+        _seen.clear()
+    start()
+
+
+def clear_dir():
+    """
+    前回起動時のファイルを削除する（gunicorn のマスター起動時に呼ぶ）
+    """
+    directory = metrics_dir()
+    if directory.is_dir():
+        for path in directory.glob('*.json'):
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """
+    全プロセスのファイルとこのプロセスの最新の値を合算し、{メトリクス名: {ラベルの値の組: 値}} と
+    アクティブユーザー数を返す
+    """
+    own = _process['file']
+    states = [_snapshot()]
+    for path in metrics_dir().glob('*.json'):
+        if path == own:
+            continue
+        try:
+            states.append(json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue  # 削除・書き込み中のファイル
+
+    totals = {name: {} for name in _registry}
+    seen = {}
+    for state in states:
+        for name, items in state['metrics'].items():
+            metric = _registry.get(name)
+            if metric is not None:
+                metric._merge(totals[name], {tuple(key): value for key, value in items})
+        for user_id, seen_at in state['seen'].items():
+            seen[str(user_id)] = max(seen.get(str(user_id), 0), seen_at)
+
+    threshold = time.time() - ACTIVE_USER_WINDOW
+    active_users = sum(1 for seen_at in seen.values() if seen_at >= threshold)
+    return totals, active_users
+
+
+def render():
+    """
+    Prometheus のテキスト形式（version 0.0.4）
+    """
+    totals, active_users = collect()
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for key, value in sorted(totals[name].items()):
+            for sample_name, labels, sample in metric._samples(key, value):
+                lines.append(f'{sample_name}{labels} {_format_value(sample)}')
+    lines.append(f'# HELP habit_active_users 直近{ACTIVE_USER_WINDOW // 60}分間にリクエストしたユーザー数')
+    lines.append('# TYPE habit_active_users gauge')
+    lines.append(f'habit_active_users {active_users}')
+    return '\n'.join(lines) + '\n'
+
+
+def _label_pairs(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
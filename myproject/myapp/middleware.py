@@ -0,0 +1,64 @@
+from contextlib import ExitStack
+import time
+from django.db import connections
+from . import metrics, shards
+
+# =====================
+# シャーディング：リクエスト中はログインユーザーのシャードを使う
+# =====================
+class ShardMiddleware:
+    """
+    このアプリのビューの実行中（テンプレートの描画を含む）だけ、ログイン中のユーザーのシャードを有効にする。
+    管理画面などの他のビューではシャードを有効にせず、default を使う。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        previous = shards.current()
+        try:
+            return self.get_response(request)
+        finally:
+            shards.activate(previous)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.user.is_authenticated and view_func.__module__.startswith(__package__):
+            shards.activate(shards.shard_for(request.user.pk))
+
+
+# =====================
+# メトリクス：リクエスト数・処理時間・DBクエリ数
+# =====================
+class MetricsMiddleware:
+    """
+    リクエストごとに URL名別の件数・処理時間・DBクエリ数と、ログイン中のユーザーを記録する
+    （MIDDLEWARE の先頭に置き、他のミドルウェアの処理時間も含める）
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match is not None else '<unmatched>'
+        metrics.REQUESTS.inc(view, request.method, str(response.status_code))
+        metrics.REQUEST_SECONDS.observe(elapsed, view)
+        metrics.DB_QUERIES.inc(view, amount=queries[0])
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            metrics.seen_user(user.pk)
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='ルール名')),
+                ('stage', models.CharField(choices=[('base', '基本提案'), ('addon', '追加提案')], default='base', max_length=20, verbose_name='段階')),
+                ('order', models.IntegerField(default=0, verbose_name='評価順')),
+                ('conditions', models.JSONField(blank=True, default=list, verbose_name='条件')),
+                ('title', models.CharField(max_length=200, verbose_name='提案タイトル')),
+                ('content', models.TextField(verbose_name='提案内容')),
+                ('action_items', models.JSONField(blank=True, default=list, verbose_name='具体的なアクション')),
+                ('priority', models.CharField(choices=[('low', '低'), ('medium', '中'), ('high', '高')], default='medium', max_length=20, verbose_name='優先度')),
+                ('is_active', models.BooleanField(default=True, verbose_name='有効')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'AI提案ルール',
+                'verbose_name_plural': 'AI提案ルール',
+                'ordering': ['stage', 'order', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# これまで AIHabitCoach._create_recommendation にあった分岐をルール表として登録
+INITIAL_RULES = [
+    {
+        'name': '気分・エネルギーともに低い',
+        'stage': 'base',
+        'order': 10,
+        'conditions': [['avg_mood', '<', 5], ['avg_energy', '<', 5]],
+        'title': '心と体を癒す小さな一歩',
+        'content': '今日は無理をせず、心と体を労わる時間を作りましょう。',
+        'action_items': ['10分間の深呼吸や瞑想', 'お気に入りの音楽を聴く', '軽い散歩（15分程度）'],
+    },
+    {
+        'name': '気分は低いがエネルギーはある',
+        'stage': 'base',
+        'order': 20,
+        'conditions': [['avg_mood', '<', 5]],
+        'title': '気分を上げる活動を',
+        'content': 'エネルギーはあるので、楽しいことをして気分を改善しましょう。',
+        'action_items': ['好きな趣味に没頭する', '友達と連絡を取る', '新しいレシピに挑戦'],
+    },
+    {
+        'name': '気分は良いがエネルギーが低い',
+        'stage': 'base',
+        'order': 30,
+        'conditions': [['avg_energy', '<', 5]],
+        'title': 'エネルギーを蓄える日',
+        'content': '気分は良いので、無理せずエネルギーを回復させましょう。',
+        'action_items': ['十分な睡眠を取る', '栄養のある食事を心がける', 'リラックスできる時間を作る'],
+    },
+    {
+        'name': '気分・エネルギーともに良い',
+        'stage': 'base',
+        'order': 40,
+        'conditions': [],
+        'title': '理想的な状態を活かそう',
+        'content': '気分もエネルギーも良い状態です。目標に向かって進みましょう。',
+        'action_items': ['重要なタスクに集中', '新しい習慣を始める', '長期的な目標の計画を立てる'],
+    },
+    {
+        'name': 'よく行っているカテゴリの継続',
+        'stage': 'addon',
+        'order': 10,
+        'conditions': [['top_category_count', '>=', 3]],
+        'title': '{top_category}の継続を',
+        'content': '{top_category}の習慣が定着しつつあります。今日も継続しましょう。',
+        'action_items': ['{top_category}の活動を15分以上行う'],
+    },
+]
+
+
+def create_rules(apps, schema_editor):
+    RecommendationRule = apps.get_model('myapp', 'RecommendationRule')
+    RecommendationRule.objects.bulk_create(
+        [RecommendationRule(priority='medium', **rule) for rule in INITIAL_RULES]
+    )
+
+
+def delete_rules(apps, schema_editor):
+    RecommendationRule = apps.get_model('myapp', 'RecommendationRule')
+    RecommendationRule.objects.filter(name__in=[rule['name'] for rule in INITIAL_RULES]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0002_recommendationrule'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rules, delete_rules),
+    ]
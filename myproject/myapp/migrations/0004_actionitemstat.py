@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0003_seed_recommendation_rules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionItemStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action_item', models.CharField(max_length=200, verbose_name='アクション')),
+                ('trials', models.IntegerField(default=0, verbose_name='評価回数')),
+                ('reward_sum', models.FloatField(default=0, verbose_name='報酬合計')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'アクション評価統計',
+                'verbose_name_plural': 'アクション評価統計',
+                'constraints': [models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'action_item'), name='unique_user_action_item_stat'), models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('action_item',), name='unique_global_action_item_stat')],
+            },
+        ),
+    ]
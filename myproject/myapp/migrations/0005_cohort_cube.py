@@ -0,0 +1,100 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_actionitemstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CubeDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日付')),
+                ('marked_at', models.DateTimeField(auto_now=True, verbose_name='登録日時')),
+            ],
+            options={
+                'verbose_name': '再集計待ち日付',
+                'verbose_name_plural': '再集計待ち日付',
+            },
+        ),
+        migrations.CreateModel(
+            name='PlatformDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='日付')),
+                ('active_users', models.IntegerField(default=0, verbose_name='アクティブユーザー数')),
+                ('action_users', models.IntegerField(default=0, verbose_name='行動記録ユーザー数')),
+                ('diary_users', models.IntegerField(default=0, verbose_name='日記記録ユーザー数')),
+            ],
+            options={
+                'verbose_name': '全体日次集計',
+                'verbose_name_plural': '全体日次集計',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('total_actions', models.IntegerField(default=0, verbose_name='行動数')),
+                ('completed_actions', models.IntegerField(default=0, verbose_name='完了数')),
+                ('total_minutes', models.IntegerField(default=0, verbose_name='合計時間（分）')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.habitcategory', verbose_name='カテゴリ')),
+            ],
+            options={
+                'verbose_name': 'カテゴリ別日次集計',
+                'verbose_name_plural': 'カテゴリ別日次集計',
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CohortAnalytics',
+            fields=[
+            ],
+            options={
+                'verbose_name': '全体分析',
+                'verbose_name_plural': '全体分析',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('myapp.categorydailystat',),
+        ),
+        migrations.CreateModel(
+            name='MoodDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('mood_score', models.IntegerField(verbose_name='気分スコア')),
+                ('diaries', models.IntegerField(default=0, verbose_name='日記数')),
+            ],
+            options={
+                'verbose_name': '気分分布日次集計',
+                'verbose_name_plural': '気分分布日次集計',
+                'unique_together': {('date', 'mood_score')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RecommendationDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('recommendation_type', models.CharField(max_length=50, verbose_name='提案タイプ')),
+                ('recommendations', models.IntegerField(default=0, verbose_name='提案数')),
+                ('rated', models.IntegerField(default=0, verbose_name='評価数')),
+                ('rating_sum', models.IntegerField(default=0, verbose_name='評価合計')),
+                ('implemented', models.IntegerField(default=0, verbose_name='実装数')),
+            ],
+            options={
+                'verbose_name': '提案評価日次集計',
+                'verbose_name_plural': '提案評価日次集計',
+                'unique_together': {('date', 'recommendation_type')},
+            },
+        ),
+    ]
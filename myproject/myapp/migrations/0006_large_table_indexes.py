@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_cohort_cube'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['user', 'date'], name='myapp_actio_user_id_63b025_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['date'], name='myapp_actio_date_629706_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['action_name'], name='myapp_actio_action__c18d7e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airecommendation',
+            index=models.Index(fields=['date'], name='myapp_airec_date_55cb6b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='airecommendation',
+            index=models.Index(fields=['title'], name='myapp_airec_title_78b59a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailydiary',
+            index=models.Index(fields=['date'], name='myapp_daily_date_20be1d_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_large_table_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=50, verbose_name='モデル')),
+                ('month', models.DateField(verbose_name='対象月')),
+                ('path', models.CharField(max_length=255, unique=True, verbose_name='ファイル')),
+                ('min_date', models.DateField(verbose_name='最古日付')),
+                ('max_date', models.DateField(verbose_name='最新日付')),
+                ('row_count', models.IntegerField(default=0, verbose_name='件数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'アーカイブセグメント',
+                'verbose_name_plural': 'アーカイブセグメント',
+                'indexes': [models.Index(fields=['model_name', 'month'], name='myapp_archi_model_n_7cd647_idx')],
+            },
+        ),
+    ]
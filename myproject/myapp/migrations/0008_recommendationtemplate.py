@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_archivesegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='ハッシュ')),
+                ('title', models.CharField(max_length=200, verbose_name='提案タイトル')),
+                ('content', models.TextField(verbose_name='提案内容')),
+                ('reasoning', models.TextField(blank=True, verbose_name='提案理由')),
+                ('action_items', models.JSONField(default=list, verbose_name='具体的なアクション')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'AI提案テンプレート',
+                'verbose_name_plural': 'AI提案テンプレート',
+            },
+        ),
+        migrations.AddField(
+            model_name='airecommendation',
+            name='params',
+            field=models.JSONField(blank=True, default=dict, verbose_name='パラメータ'),
+        ),
+        migrations.AlterField(
+            model_name='airecommendation',
+            name='action_items',
+            field=models.JSONField(blank=True, default=list, verbose_name='具体的なアクション'),
+        ),
+        migrations.AlterField(
+            model_name='airecommendation',
+            name='content',
+            field=models.TextField(blank=True, verbose_name='提案内容'),
+        ),
+        migrations.AlterField(
+            model_name='airecommendation',
+            name='reasoning',
+            field=models.TextField(blank=True, verbose_name='提案理由'),
+        ),
+        migrations.AlterField(
+            model_name='airecommendation',
+            name='title',
+            field=models.CharField(blank=True, max_length=200, verbose_name='提案タイトル'),
+        ),
+        migrations.AddField(
+            model_name='airecommendation',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='myapp.recommendationtemplate', verbose_name='テンプレート'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+from django.db import migrations
+
+# 既存の提案の文面をテンプレートに集約する。
+# 数値（達成率・平均スコアなど）はパラメータ {n0}, {n1}, ... に置き換えて共通化する。
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+BATCH_SIZE = 500
+
+
+class _Params(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def _digest(title, content, reasoning, action_items):
+    payload = json.dumps([title, content, reasoning, action_items], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _parametrize(text, params):
+    def replace(match):
+        key = f'n{len(params)}'
+        params[key] = match.group(0)
+        return '{' + key + '}'
+    return NUMBER.sub(replace, text.replace('{', '{{').replace('}', '}}'))
+
+
+def dedup_text(apps, schema_editor):
+    AIRecommendation = apps.get_model('myapp', 'AIRecommendation')
+    RecommendationTemplate = apps.get_model('myapp', 'RecommendationTemplate')
+
+    templates = dict(RecommendationTemplate.objects.values_list('digest', 'id'))
+    pending = []
+    for recommendation in AIRecommendation.objects.filter(template__isnull=True).iterator():
+        params = {}
+        title = _parametrize(recommendation.title, params)
+        content = _parametrize(recommendation.content, params)
+        reasoning = _parametrize(recommendation.reasoning, params)
+        action_items = [_parametrize(item, params) for item in recommendation.action_items or []]
+
+        digest = _digest(title, content, reasoning, action_items)
+        if digest not in templates:
+            templates[digest] = RecommendationTemplate.objects.create(
+                digest=digest, title=title, content=content,
+                reasoning=reasoning, action_items=action_items
+            ).id
+
+        recommendation.template_id = templates[digest]
+        recommendation.params = params
+        recommendation.title = recommendation.content = recommendation.reasoning = ''
+        recommendation.action_items = []
+        pending.append(recommendation)
+        if len(pending) >= BATCH_SIZE:
+            _flush(AIRecommendation, pending)
+    _flush(AIRecommendation, pending)
+
+
+def restore_text(apps, schema_editor):
+    AIRecommendation = apps.get_model('myapp', 'AIRecommendation')
+    RecommendationTemplate = apps.get_model('myapp', 'RecommendationTemplate')
+
+    templates = {template.id: template for template in RecommendationTemplate.objects.all()}
+    pending = []
+    for recommendation in AIRecommendation.objects.filter(template__isnull=False).iterator():
+        template = templates[recommendation.template_id]
+        params = _Params(recommendation.params or {})
+        action_items = [item.format_map(params) for item in template.action_items]
+        if params.get('_order'):
+            action_items = [action_items[i] for i in params['_order']]
+
+        recommendation.title = template.title.format_map(params)
+        recommendation.content = template.content.format_map(params)
+        recommendation.reasoning = template.reasoning.format_map(params)
+        recommendation.action_items = action_items
+        recommendation.template_id = None
+        recommendation.params = {}
+        pending.append(recommendation)
+        if len(pending) >= BATCH_SIZE:
+            _flush(AIRecommendation, pending)
+    _flush(AIRecommendation, pending)
+
+
+def _flush(model, pending):
+    if pending:
+        model.objects.bulk_update(
+            pending, ['title', 'content', 'reasoning', 'action_items', 'template', 'params']
+        )
+        pending.clear()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_recommendationtemplate'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedup_text, restore_text),
+    ]
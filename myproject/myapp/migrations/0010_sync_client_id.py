@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_dedup_recommendation_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='actionlog',
+            name='client_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='端末側ID'),
+        ),
+        migrations.AddField(
+            model_name='dailydiary',
+            name='client_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='端末側ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='actionlog',
+            constraint=models.UniqueConstraint(fields=('user', 'client_id'), name='unique_actionlog_client_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailydiary',
+            constraint=models.UniqueConstraint(fields=('user', 'client_id'), name='unique_diary_client_id'),
+        ),
+    ]
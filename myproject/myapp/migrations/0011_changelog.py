@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_sync_client_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=50, verbose_name='モデル')),
+                ('object_id', models.BigIntegerField(verbose_name='対象ID')),
+                ('deleted', models.BooleanField(default=False, verbose_name='削除')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='記録日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '変更履歴',
+                'verbose_name_plural': '変更履歴',
+                'indexes': [models.Index(fields=['user', 'id'], name='myapp_chang_user_id_9c636b_idx'), models.Index(fields=['model_name', 'object_id'], name='myapp_chang_model_n_f3a368_idx')],
+            },
+        ),
+    ]
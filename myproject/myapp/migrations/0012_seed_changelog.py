@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# 既存の日記・行動ログ・目標・AI提案を変更履歴に登録する（初回同期で全件を取得できるように）
+SYNCED_MODELS = ['dailydiary', 'actionlog', 'goal', 'airecommendation']
+BATCH_SIZE = 1000
+
+
+def seed_changelog(apps, schema_editor):
+    ChangeLog = apps.get_model('myapp', 'ChangeLog')
+    for model_name in SYNCED_MODELS:
+        model = apps.get_model('myapp', model_name)
+        batch = []
+        for object_id, user_id in model.objects.order_by('id').values_list('id', 'user_id').iterator():
+            batch.append(ChangeLog(user_id=user_id, model_name=model_name, object_id=object_id))
+            if len(batch) >= BATCH_SIZE:
+                ChangeLog.objects.bulk_create(batch)
+                batch = []
+        ChangeLog.objects.bulk_create(batch)
+
+
+def clear_changelog(apps, schema_editor):
+    apps.get_model('myapp', 'ChangeLog').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_changelog'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_changelog, clear_changelog),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:15
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_seed_changelog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='reminder_time',
+            field=models.TimeField(default=datetime.time(20, 0), verbose_name='リマインド時刻'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('action_missing', '行動未記録'), ('diary_missing', '日記未記入')], max_length=30, verbose_name='種類')),
+                ('date', models.DateField(verbose_name='対象日')),
+                ('message', models.TextField(verbose_name='本文')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='既読日時')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '通知',
+                'verbose_name_plural': '通知',
+                'indexes': [models.Index(fields=['date'], name='myapp_notif_date_4701e8_idx')],
+                'unique_together': {('user', 'kind', 'date')},
+            },
+        ),
+    ]
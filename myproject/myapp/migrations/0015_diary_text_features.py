@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailydiary',
+            name='keywords',
+            field=models.JSONField(default=list, editable=False, verbose_name='キーワード'),
+        ),
+        migrations.AddField(
+            model_name='dailydiary',
+            name='negative_hits',
+            field=models.IntegerField(default=0, editable=False, verbose_name='後ろ向き表現数'),
+        ),
+        migrations.AddField(
+            model_name='dailydiary',
+            name='positive_hits',
+            field=models.IntegerField(default=0, editable=False, verbose_name='前向き表現数'),
+        ),
+        migrations.AddField(
+            model_name='dailydiary',
+            name='sentiment',
+            field=models.FloatField(default=0, editable=False, verbose_name='感情スコア'),
+        ),
+        migrations.AddField(
+            model_name='dailydiary',
+            name='text_length',
+            field=models.IntegerField(default=0, editable=False, verbose_name='文字数'),
+        ),
+    ]
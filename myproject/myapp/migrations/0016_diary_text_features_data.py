@@ -0,0 +1,84 @@
+from collections import Counter
+import re
+from django.db import migrations
+
+# 既存の日記の本文・感謝欄から特徴量を計算して保存する
+FEATURE_FIELDS = ['text_length', 'positive_hits', 'negative_hits', 'sentiment', 'keywords']
+BATCH_SIZE = 500
+
+# 以下は作成時点の textfeatures の計算を写したもの（アプリ側を変更・削除しても、このマイグレーションの結果は変わらない）
+
+# 前向き・後ろ向きな表現（部分一致で数える）
+POSITIVE_WORDS = [
+    '嬉しい', 'うれしい', '楽しい', 'たのしい', '楽しかった', '幸せ', 'しあわせ', '感謝', 'ありがと',
+    '良かった', 'よかった', '達成', 'できた', '頑張った', 'がんばった', '元気', '満足', '安心',
+    '充実', '最高', '気持ちいい', 'すっきり', 'スッキリ', '成長', '笑',
+]
+NEGATIVE_WORDS = [
+    '疲れ', 'つかれ', 'つらい', '辛い', '悲しい', 'かなしい', '不安', '心配', '嫌',
+    '最悪', '失敗', 'イライラ', 'いらいら', '落ち込', 'ストレス', '眠い', 'ねむい', '痛い',
+    '怒', '後悔', 'だるい', '憂鬱', 'できなかった', '寂しい',
+]
+
+# キーワードから除く語
+STOPWORDS = {'今日', '明日', '昨日', '自分', '時間', '感じ', '気持', '毎日', '一日', '今回'}
+
+KEYWORD_COUNT = 5
+
+# 漢字・カタカナ・英数字の連続（ひらがなは助詞などが多いため区切りとして扱う）
+_TERM = re.compile(r'[一-鿿々]+|[ァ-ヺー]+|[A-Za-z0-9]+')
+
+
+def _terms(text):
+    """
+    文字種の連続を語の候補とし、長い漢字列は2文字ずつの n-gram に分ける
+    """
+    for match in _TERM.finditer(text):
+        term = match.group(0)
+        if term.isascii():
+            if len(term) >= 3 and not term.isdigit():
+                yield term.lower()
+        elif len(term) <= 3 or not '一' <= term[0] <= '鿿':
+            if len(term) >= 2:
+                yield term
+        else:
+            for i in range(len(term) - 1):
+                yield term[i:i + 2]
+
+
+def _hits(text, words):
+    return sum(text.count(word) for word in words)
+
+
+def extract_features(*texts):
+    text = '\n'.join(t for t in texts if t)
+    positive = _hits(text, POSITIVE_WORDS)
+    negative = _hits(text, NEGATIVE_WORDS)
+    sentiment = (positive - negative) / (positive + negative) if positive + negative else 0.0
+    counts = Counter(term for term in _terms(text) if term not in STOPWORDS)
+    keywords = [term for term, _ in counts.most_common(KEYWORD_COUNT)]
+    return len(text), positive, negative, round(sentiment, 3), keywords
+
+
+def backfill_text_features(apps, schema_editor):
+    DailyDiary = apps.get_model('myapp', 'DailyDiary')
+    batch = []
+    for diary in DailyDiary.objects.only('id', 'content', 'gratitude').order_by('id').iterator():
+        (diary.text_length, diary.positive_hits, diary.negative_hits,
+         diary.sentiment, diary.keywords) = extract_features(diary.content, diary.gratitude)
+        batch.append(diary)
+        if len(batch) >= BATCH_SIZE:
+            DailyDiary.objects.bulk_update(batch, FEATURE_FIELDS)
+            batch = []
+    DailyDiary.objects.bulk_update(batch, FEATURE_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_diary_text_features'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_text_features, migrations.RunPython.noop),
+    ]
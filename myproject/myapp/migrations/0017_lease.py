@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_diary_text_features_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True, verbose_name='キー')),
+                ('owner', models.CharField(max_length=150, verbose_name='保持者')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+            ],
+            options={
+                'verbose_name': 'リース',
+                'verbose_name_plural': 'リース',
+            },
+        ),
+    ]
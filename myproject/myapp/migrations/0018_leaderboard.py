@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='share_on_leaderboard',
+            field=models.BooleanField(default=False, verbose_name='ランキングに参加'),
+        ),
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', '週間'), ('month', '月間')], max_length=10, verbose_name='期間')),
+                ('period_start', models.DateField(verbose_name='期間の開始日')),
+                ('completed_minutes', models.IntegerField(default=0, verbose_name='完了した時間（分）')),
+                ('completed_count', models.IntegerField(default=0, verbose_name='完了数')),
+                ('total_count', models.IntegerField(default=0, verbose_name='行動数')),
+                ('streak', models.IntegerField(default=0, verbose_name='最長連続日数')),
+                ('is_public', models.BooleanField(default=True, verbose_name='公開')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.habitcategory', verbose_name='カテゴリ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'ランキング集計',
+                'verbose_name_plural': 'ランキング集計',
+                'indexes': [models.Index(fields=['period', 'period_start', 'category'], name='myapp_leade_period_3a7a61_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'category', 'period', 'period_start'), name='unique_leaderboard_score')],
+            },
+        ),
+    ]
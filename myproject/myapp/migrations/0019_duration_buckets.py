@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_leaderboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DurationBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(verbose_name='週の開始日')),
+                ('bucket', models.IntegerField(verbose_name='バケット')),
+                ('count', models.IntegerField(default=0, verbose_name='件数')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='myapp.habitcategory', verbose_name='カテゴリ')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '行動時間の分布',
+                'verbose_name_plural': '行動時間の分布',
+                'indexes': [models.Index(fields=['week_start', 'category'], name='myapp_durat_week_st_13b592_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'category', 'week_start', 'bucket'), name='unique_duration_bucket')],
+            },
+        ),
+    ]
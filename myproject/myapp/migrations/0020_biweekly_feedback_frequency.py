@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_duration_buckets'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='ai_feedback_frequency',
+            field=models.CharField(choices=[('daily', '毎日'), ('weekly', '週1回'), ('biweekly', '2週間に1回'), ('monthly', '月1回')], default='daily', max_length=20, verbose_name='AIフィードバック頻度'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_biweekly_feedback_frequency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivesegment',
+            name='user_bucket',
+            field=models.IntegerField(blank=True, null=True, verbose_name='ユーザーの区分'),
+        ),
+        migrations.AddField(
+            model_name='archivesegment',
+            name='user_buckets',
+            field=models.IntegerField(blank=True, null=True, verbose_name='区分数'),
+        ),
+    ]
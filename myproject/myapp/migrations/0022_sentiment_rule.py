@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# 日記の感情スコアを使う追加ルール（以前は 0016 で特徴量の計算と一緒に登録していた。登録済みなら作らない）
+SENTIMENT_RULE = {
+    'name': '日記の言葉が後ろ向き',
+    'stage': 'addon',
+    'order': 20,
+    'conditions': [['avg_sentiment', '<', -0.3]],
+    'title': '気持ちを軽くする時間を',
+    'content': '最近の日記には疲れや不安の言葉が多いようです。できたことにも目を向けてみましょう。',
+    'action_items': ['今日できたことを3つ書き出す'],
+}
+
+
+def create_sentiment_rule(apps, schema_editor):
+    RecommendationRule = apps.get_model('myapp', 'RecommendationRule')
+    if not RecommendationRule.objects.filter(name=SENTIMENT_RULE['name']).exists():
+        RecommendationRule.objects.create(priority='medium', **SENTIMENT_RULE)
+
+
+def delete_sentiment_rule(apps, schema_editor):
+    RecommendationRule = apps.get_model('myapp', 'RecommendationRule')
+    RecommendationRule.objects.filter(name=SENTIMENT_RULE['name']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_archive_user_buckets'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sentiment_rule, delete_sentiment_rule),
+    ]
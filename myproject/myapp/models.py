@@ -1,7 +1,11 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, router, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import time
+import hashlib
 import json
+from .textfeatures import extract_features
 
 # 習慣カテゴリを管理するモデル
 class HabitCategory(models.Model):
@@ -32,6 +36,13 @@ class DailyDiary(models.Model):
     energy_level = models.IntegerField(choices=[(i, str(i)) for i in range(1, 11)], verbose_name="エネルギーレベル")  # 1-10のエネルギー
     content = models.TextField(verbose_name="日記内容")                                # 日記本文
     gratitude = models.TextField(blank=True, verbose_name="感謝の気持ち")              # 感謝欄（任意）
+    client_id = models.UUIDField(null=True, blank=True, editable=False, verbose_name="端末側ID")  # 同期用ID（アプリで生成）
+    # 本文・感謝欄から保存時に計算する特徴量（分析やAI提案で本文を読み直さずに使う）
+    text_length = models.IntegerField(default=0, editable=False, verbose_name="文字数")
+    positive_hits = models.IntegerField(default=0, editable=False, verbose_name="前向き表現数")
+    negative_hits = models.IntegerField(default=0, editable=False, verbose_name="後ろ向き表現数")
+    sentiment = models.FloatField(default=0, editable=False, verbose_name="感情スコア")   # -1〜1
+    keywords = models.JSONField(default=list, editable=False, verbose_name="キーワード")  # 頻出語（最大5件）
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")          # 更新日時
     
@@ -39,9 +50,33 @@ class DailyDiary(models.Model):
         verbose_name = "日記"
         verbose_name_plural = "日記"
         unique_together = ['user', 'date']  # 1ユーザー1日1件
+        indexes = [
+            models.Index(fields=['date']),  # 日付での絞り込み・集計用
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_id'], name='unique_diary_client_id'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.date}"
+    
+    # 特徴量として保存する項目（一括保存時の update_fields にも使う）
+    TEXT_FEATURE_FIELDS = ['text_length', 'positive_hits', 'negative_hits', 'sentiment', 'keywords']
+    
+    def apply_text_features(self):
+        """
+        本文・感謝欄から特徴量を計算して設定
+        """
+        (self.text_length, self.positive_hits, self.negative_hits,
+         self.sentiment, self.keywords) = extract_features(self.content, self.gratitude)
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'gratitude'} & set(update_fields):
+            self.apply_text_features()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.TEXT_FEATURE_FIELDS)
+        super().save(*args, **kwargs)
 
 # 行動ログ（習慣の実行記録）を管理するモデル
 class ActionLog(models.Model):
@@ -55,11 +90,20 @@ class ActionLog(models.Model):
     completed = models.BooleanField(default=True, verbose_name="完了")                  # 完了フラグ
     notes = models.TextField(blank=True, verbose_name="メモ")                          # メモ欄
     date = models.DateField(default=timezone.now, verbose_name="日付")                 # 実施日
+    client_id = models.UUIDField(null=True, blank=True, editable=False, verbose_name="端末側ID")  # 同期用ID（アプリで生成）
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
     
     class Meta:
         verbose_name = "行動ログ"
         verbose_name_plural = "行動ログ"
+        indexes = [
+            models.Index(fields=['user', 'date']),  # ユーザー別の日付範囲検索用
+            models.Index(fields=['date']),          # 日付での絞り込み・集計用
+            models.Index(fields=['action_name']),   # 管理画面の前方一致検索用
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'client_id'], name='unique_actionlog_client_id'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.action_name} ({self.date})"
@@ -105,6 +149,128 @@ class Goal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
+# AI提案の共通文面（テンプレート）を管理するモデル
+class RecommendationTemplate(models.Model):
+    """
+    AI提案テンプレートモデル。提案のタイトル・本文・理由・アクションの共通文面を1回だけ保存し、
+    各提案は参照とパラメータ（カテゴリ名・達成率など）だけを持つ。
+    文面は {category} のようなプレースホルダを含み、内容のハッシュで一意に識別する。
+    """
+    digest = models.CharField(max_length=64, unique=True, verbose_name="ハッシュ")      # 文面のSHA-256
+    title = models.CharField(max_length=200, verbose_name="提案タイトル")               # タイトルの書式
+    content = models.TextField(verbose_name="提案内容")                                # 本文の書式
+    reasoning = models.TextField(blank=True, verbose_name="提案理由")                  # 理由の書式
+    action_items = models.JSONField(default=list, verbose_name="具体的なアクション")    # アクションの書式リスト
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
+
+    # プロセス内キャッシュ（テンプレートは作成後に変更されない）
+    _by_id = {}
+    _by_digest = {}
+
+    class Meta:
+        verbose_name = "AI提案テンプレート"
+        verbose_name_plural = "AI提案テンプレート"
+
+    def __str__(self):
+        return self.title
+
+    @staticmethod
+    def make_digest(title, content, reasoning, action_items):
+        payload = json.dumps([title, content, reasoning, action_items], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def intern(cls, title, content, reasoning, action_items):
+        """
+        同じ文面のテンプレートを返す（なければ作成）
+        """
+        digest = cls.make_digest(title, content, reasoning, action_items)
+        template = cls._by_digest.get(digest)
+        if template is None:
+            template, _ = cls.objects.get_or_create(
+                digest=digest,
+                defaults={
+                    'title': title,
+                    'content': content,
+                    'reasoning': reasoning,
+                    'action_items': action_items,
+                }
+            )
+            cls._remember(template)
+        return template
+
+    @classmethod
+    def cached(cls, template_id):
+        """
+        IDからテンプレートを返す。未知のIDがあれば全件を読み直す（件数はごく少ない）。
+        """
+        template = cls._by_id.get(template_id)
+        if template is None:
+            for template in cls.objects.all():
+                cls._remember(template)
+            template = cls._by_id[template_id]
+        return template
+
+    @classmethod
+    def _remember(cls, template):
+        cls._by_id[template.pk] = template
+        cls._by_digest[template.digest] = template
+
+    def render(self, params):
+        """
+        パラメータを埋め込んだ (タイトル, 本文, 理由, アクション) を返す。
+        params['_order'] があればアクションをその順に並べる。
+        """
+        values = TemplateParams(params or {})
+        action_items = [item.format_map(values) for item in self.action_items]
+        order = values.get('_order')
+        if order:
+            action_items = [action_items[i] for i in order]
+        return (
+            self.title.format_map(values),
+            self.content.format_map(values),
+            self.reasoning.format_map(values),
+            action_items,
+        )
+
+
+class TemplateParams(dict):
+    """
+    未知のプレースホルダはそのまま残す（文面の編集ミスで表示を止めない）
+    """
+
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+class AIRecommendationQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # save() と同じく、テンプレート参照の提案は文面を保存しない
+        objs = list(objs)
+        packed = [obj._pack_text() for obj in objs]
+        try:
+            return super().bulk_create(objs, *args, **kwargs)
+        finally:
+            for obj, text in zip(objs, packed):
+                obj._unpack_text(text)
+
+    def save_or_get(self, recommendation):
+        """
+        提案を保存して返す。同じユーザー・日付・種類の提案が既にあれば（一意制約で判定）、そちらを返す。
+        """
+        alias = router.db_for_write(type(recommendation), instance=recommendation)
+        try:
+            with transaction.atomic(using=alias):
+                recommendation.save(using=alias)
+            return recommendation
+        except IntegrityError:
+            return self.using(alias).get(
+                user_id=recommendation.user_id,
+                date=recommendation.date,
+                recommendation_type=recommendation.recommendation_type
+            )
+
+
 # AIによる提案（目標・振り返り・モチベーション等）を管理するモデル
 class AIRecommendation(models.Model):
     """
@@ -122,10 +288,19 @@ class AIRecommendation(models.Model):
         ],
         verbose_name="提案タイプ"
     )
-    title = models.CharField(max_length=200, verbose_name="提案タイトル")               # 提案タイトル
-    content = models.TextField(verbose_name="提案内容")                                # 提案本文
-    reasoning = models.TextField(verbose_name="提案理由")                              # AIの根拠
-    action_items = models.JSONField(default=list, verbose_name="具体的なアクション")    # アクションリスト
+    # テンプレート参照の提案では、以下の文面は保存せず読み込み時にテンプレートから復元する
+    title = models.CharField(max_length=200, blank=True, verbose_name="提案タイトル")   # 提案タイトル
+    content = models.TextField(blank=True, verbose_name="提案内容")                    # 提案本文
+    reasoning = models.TextField(blank=True, verbose_name="提案理由")                  # AIの根拠
+    action_items = models.JSONField(default=list, blank=True, verbose_name="具体的なアクション")  # アクションリスト
+    template = models.ForeignKey(
+        RecommendationTemplate,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        verbose_name="テンプレート"
+    )                                                                                   # 共通文面
+    params = models.JSONField(default=dict, blank=True, verbose_name="パラメータ")      # 文面に埋め込む値
     priority = models.CharField(
         max_length=20,
         choices=[
@@ -149,9 +324,73 @@ class AIRecommendation(models.Model):
         verbose_name = "AI提案"
         verbose_name_plural = "AI提案"
         unique_together = ['user', 'date', 'recommendation_type']  # 1日1タイプ1件
+        indexes = [
+            models.Index(fields=['date']),   # 日付での絞り込み・集計用
+            models.Index(fields=['title']),  # 管理画面の前方一致検索用
+        ]
+    
+    objects = AIRecommendationQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.user.username} - {self.title} ({self.date})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # テンプレート参照の提案は文面を復元
+        if instance.__dict__.get('template_id') and 'title' in instance.__dict__:
+            instance.title, instance.content, instance.reasoning, instance.action_items = (
+                RecommendationTemplate.cached(instance.template_id).render(instance.params)
+            )
+        return instance
+    
+    def use_template(self, title, content, reasoning, action_items, params):
+        """
+        書式とパラメータから文面を設定（共通文面はテンプレートとして1回だけ保存される）
+        """
+        self.template = RecommendationTemplate.intern(title, content, reasoning, action_items)
+        self.params = dict(params)
+        self.title, self.content, self.reasoning, self.action_items = self.template.render(self.params)
+    
+    def save(self, *args, **kwargs):
+        text = self._pack_text()
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self._unpack_text(text)
+    
+    def _pack_text(self):
+        """
+        保存前に、テンプレートから復元できる文面を空にする。
+        アクションの並べ替えは params['_order'] に記録し、
+        テンプレートと食い違う編集があった場合は文面をそのまま保存してテンプレート参照を外す。
+        """
+        if not self.template_id:
+            return None
+        
+        params = {key: value for key, value in self.params.items() if key != '_order'}
+        title, content, reasoning, action_items = RecommendationTemplate.cached(self.template_id).render(params)
+        if ((title, content, reasoning) != (self.title, self.content, self.reasoning)
+                or sorted(action_items) != sorted(self.action_items)):
+            self.template = None
+            self.params = {}
+            return None
+        
+        positions = {}
+        for i, item in enumerate(action_items):
+            positions.setdefault(item, []).append(i)
+        order = [positions[item].pop(0) for item in self.action_items]
+        if order != sorted(order):
+            params['_order'] = order
+        self.params = params
+        
+        text = (self.title, self.content, self.reasoning, self.action_items)
+        self.title, self.content, self.reasoning, self.action_items = '', '', '', []
+        return text
+    
+    def _unpack_text(self, text):
+        if text is not None:
+            self.title, self.content, self.reasoning, self.action_items = text
 
 # ユーザープロフィール（AI設定・通知・興味カテゴリ等）を管理するモデル
 class UserProfile(models.Model):
@@ -162,16 +401,19 @@ class UserProfile(models.Model):
     bio = models.TextField(blank=True, verbose_name="自己紹介")                          # 自己紹介
     preferred_categories = models.ManyToManyField(HabitCategory, blank=True, verbose_name="興味のあるカテゴリ")  # 興味カテゴリ
     notification_enabled = models.BooleanField(default=True, verbose_name="通知有効")     # 通知ON/OFF
+    reminder_time = models.TimeField(default=time(20, 0), verbose_name="リマインド時刻")   # 未記録のリマインドを送る時刻
     ai_feedback_frequency = models.CharField(
         max_length=20,
         choices=[
             ('daily', '毎日'),
             ('weekly', '週1回'),
+            ('biweekly', '2週間に1回'),
             ('monthly', '月1回')
         ],
         default='daily',
         verbose_name="AIフィードバック頻度"
     )
+    share_on_leaderboard = models.BooleanField(default=False, verbose_name="ランキングに参加")  # ランキングへの参加（オプトイン）
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")          # 更新日時
     
@@ -181,3 +423,412 @@ class UserProfile(models.Model):
     
     def __str__(self):
         return f"{self.user.username}のプロフィール"
+
+# AI提案ルール（特徴量の条件 → 提案内容）を管理するモデル
+class RecommendationRule(models.Model):
+    """
+    AI提案ルールモデル。特徴量に対する条件と、一致したときの提案内容を管理。
+    管理画面から編集でき、デプロイなしで提案ロジックを変更できる。
+    """
+    # 条件に使える特徴量
+    FEATURES = ['avg_mood', 'avg_energy', 'avg_sentiment', 'top_category_count']
+    # 条件に使える比較演算子
+    OPERATORS = ['<', '<=', '>', '>=', '==', '!=']
+
+    name = models.CharField(max_length=100, verbose_name="ルール名")                  # ルール名
+    stage = models.CharField(
+        max_length=20,
+        choices=[
+            ('base', '基本提案'),
+            ('addon', '追加提案')
+        ],
+        default='base',
+        verbose_name="段階"
+    )
+    order = models.IntegerField(default=0, verbose_name="評価順")                      # 小さいほど優先
+    conditions = models.JSONField(default=list, blank=True, verbose_name="条件")      # [["avg_mood", "<", 5], ...]
+    title = models.CharField(max_length=200, verbose_name="提案タイトル")               # {top_category} などを埋め込み可
+    content = models.TextField(verbose_name="提案内容")                                # 提案本文
+    action_items = models.JSONField(default=list, blank=True, verbose_name="具体的なアクション")  # アクションリスト
+    priority = models.CharField(
+        max_length=20,
+        choices=[
+            ('low', '低'),
+            ('medium', '中'),
+            ('high', '高')
+        ],
+        default='medium',
+        verbose_name="優先度"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="有効")                 # 有効フラグ
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")          # 更新日時
+
+    class Meta:
+        verbose_name = "AI提案ルール"
+        verbose_name_plural = "AI提案ルール"
+        ordering = ['stage', 'order', 'id']
+
+    def __str__(self):
+        return f"{self.get_stage_display()} - {self.name}"
+
+    def clean(self):
+        """
+        条件が [特徴量, 演算子, 数値] の形式かを検証
+        """
+        if not isinstance(self.conditions, list):
+            raise ValidationError({'conditions': '条件はリストで指定してください。'})
+        for condition in self.conditions:
+            if (not isinstance(condition, list) or len(condition) != 3
+                    or condition[0] not in self.FEATURES
+                    or condition[1] not in self.OPERATORS
+                    or not isinstance(condition[2], (int, float))):
+                raise ValidationError({
+                    'conditions': f"条件 {condition!r} が不正です。[特徴量, 演算子, 数値] の形式で指定してください。"
+                })
+        if not isinstance(self.action_items, list):
+            raise ValidationError({'action_items': 'アクションはリストで指定してください。'})
+
+# アクション項目ごとのフィードバック統計（ユーザー別・全体）を管理するモデル
+class ActionItemStat(models.Model):
+    """
+    アクション項目フィードバック統計モデル。
+    提案への評価・実装状況を報酬として、評価回数と報酬合計を逐次加算する。
+    user が空の行は全ユーザー合計（全体統計）。
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, verbose_name="ユーザー")  # 空なら全体
+    action_item = models.CharField(max_length=200, verbose_name="アクション")           # アクション項目の文面
+    trials = models.IntegerField(default=0, verbose_name="評価回数")                    # 報酬を観測した回数
+    reward_sum = models.FloatField(default=0, verbose_name="報酬合計")                  # 報酬（0〜1）の合計
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")          # 更新日時
+
+    class Meta:
+        verbose_name = "アクション評価統計"
+        verbose_name_plural = "アクション評価統計"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'action_item'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_action_item_stat'
+            ),
+            models.UniqueConstraint(
+                fields=['action_item'],
+                condition=models.Q(user__isnull=True),
+                name='unique_global_action_item_stat'
+            ),
+        ]
+
+    def __str__(self):
+        scope = self.user.username if self.user_id else "全体"
+        return f"{scope} - {self.action_item} ({self.trials}件)"
+
+# =====================
+# 運営向け集計キューブ（全ユーザー横断の日次集計）
+# =====================
+
+# 再集計が必要な日付を管理するモデル
+class CubeDirtyDay(models.Model):
+    """
+    集計キューブの再集計待ち日付。行動ログ・日記・AI提案の保存/削除時に登録される。
+    """
+    date = models.DateField(unique=True, verbose_name="日付")                         # 再集計対象日
+    marked_at = models.DateTimeField(auto_now=True, verbose_name="登録日時")            # 最後に変更された日時
+
+    class Meta:
+        verbose_name = "再集計待ち日付"
+        verbose_name_plural = "再集計待ち日付"
+
+    def __str__(self):
+        return str(self.date)
+
+# カテゴリ×日付の行動集計
+class CategoryDailyStat(models.Model):
+    """
+    カテゴリ別・日別の行動数・完了数・合計時間（全ユーザー合計）
+    """
+    date = models.DateField(verbose_name="日付")
+    category = models.ForeignKey(HabitCategory, on_delete=models.CASCADE, verbose_name="カテゴリ")
+    total_actions = models.IntegerField(default=0, verbose_name="行動数")
+    completed_actions = models.IntegerField(default=0, verbose_name="完了数")
+    total_minutes = models.IntegerField(default=0, verbose_name="合計時間（分）")
+
+    class Meta:
+        verbose_name = "カテゴリ別日次集計"
+        verbose_name_plural = "カテゴリ別日次集計"
+        unique_together = ['date', 'category']
+
+    def __str__(self):
+        return f"{self.date} - {self.category_id}"
+
+# 気分スコア×日付の分布
+class MoodDailyStat(models.Model):
+    """
+    日別の気分スコア分布（スコアごとの日記件数）
+    """
+    date = models.DateField(verbose_name="日付")
+    mood_score = models.IntegerField(verbose_name="気分スコア")
+    diaries = models.IntegerField(default=0, verbose_name="日記数")
+
+    class Meta:
+        verbose_name = "気分分布日次集計"
+        verbose_name_plural = "気分分布日次集計"
+        unique_together = ['date', 'mood_score']
+
+    def __str__(self):
+        return f"{self.date} - {self.mood_score}"
+
+# 日別のアクティブユーザー数
+class PlatformDailyStat(models.Model):
+    """
+    日別のアクティブユーザー数（行動ログまたは日記を記録したユーザー）
+    """
+    date = models.DateField(unique=True, verbose_name="日付")
+    active_users = models.IntegerField(default=0, verbose_name="アクティブユーザー数")
+    action_users = models.IntegerField(default=0, verbose_name="行動記録ユーザー数")
+    diary_users = models.IntegerField(default=0, verbose_name="日記記録ユーザー数")
+
+    class Meta:
+        verbose_name = "全体日次集計"
+        verbose_name_plural = "全体日次集計"
+
+    def __str__(self):
+        return str(self.date)
+
+# 提案タイプ×日付の評価集計
+class RecommendationDailyStat(models.Model):
+    """
+    提案タイプ別・日別の提案数・評価数・評価合計・実装数
+    """
+    date = models.DateField(verbose_name="日付")
+    recommendation_type = models.CharField(max_length=50, verbose_name="提案タイプ")
+    recommendations = models.IntegerField(default=0, verbose_name="提案数")
+    rated = models.IntegerField(default=0, verbose_name="評価数")
+    rating_sum = models.IntegerField(default=0, verbose_name="評価合計")
+    implemented = models.IntegerField(default=0, verbose_name="実装数")
+
+    class Meta:
+        verbose_name = "提案評価日次集計"
+        verbose_name_plural = "提案評価日次集計"
+        unique_together = ['date', 'recommendation_type']
+
+    def __str__(self):
+        return f"{self.date} - {self.recommendation_type}"
+
+# 管理画面の「全体分析」ページ用（テーブルを持たないプロキシ）
+class CohortAnalytics(CategoryDailyStat):
+    class Meta:
+        proxy = True
+        verbose_name = "全体分析"
+        verbose_name_plural = "全体分析"
+
+# アーカイブ済みデータ（圧縮JSONLセグメント）の索引を管理するモデル
+class ArchiveSegment(models.Model):
+    """
+    アーカイブセグメントモデル。保存期間を過ぎた行動ログ・AI提案を
+    月・ユーザーの区分ごとの圧縮JSONLファイルへ移した記録（ファイルの場所・日付範囲・件数）。
+    """
+    model_name = models.CharField(max_length=50, verbose_name="モデル")               # actionlog / airecommendation
+    month = models.DateField(verbose_name="対象月")                                    # 月初日
+    path = models.CharField(max_length=255, unique=True, verbose_name="ファイル")      # ARCHIVE_DIR からの相対パス
+    min_date = models.DateField(verbose_name="最古日付")                               # セグメント内の最古日付
+    max_date = models.DateField(verbose_name="最新日付")                               # セグメント内の最新日付
+    row_count = models.IntegerField(default=0, verbose_name="件数")                    # 行数
+    user_bucket = models.IntegerField(null=True, blank=True, verbose_name="ユーザーの区分")  # ユーザーID % user_buckets（None は全ユーザー）
+    user_buckets = models.IntegerField(null=True, blank=True, verbose_name="区分数")        # 書き出した時点の ARCHIVE_USER_BUCKETS
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
+
+    class Meta:
+        verbose_name = "アーカイブセグメント"
+        verbose_name_plural = "アーカイブセグメント"
+        indexes = [
+            models.Index(fields=['model_name', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} - {self.month:%Y-%m} ({self.row_count}件)"
+
+# 端末との差分同期用の変更履歴を管理するモデル
+class ChangeLog(models.Model):
+    """
+    変更履歴モデル。日記・行動ログ・目標・AI提案の作成・更新・削除を記録する。
+    ID が単調増加する変更番号を兼ね、1つの対象につき最新の変更だけを残す。
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ユーザー")  # 対象ユーザー
+    model_name = models.CharField(max_length=50, verbose_name="モデル")               # dailydiary / actionlog / goal / airecommendation
+    object_id = models.BigIntegerField(verbose_name="対象ID")                          # 変更された行のID
+    deleted = models.BooleanField(default=False, verbose_name="削除")                  # 削除の記録（トゥームストーン）
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="記録日時")      # 記録日時
+
+    class Meta:
+        verbose_name = "変更履歴"
+        verbose_name_plural = "変更履歴"
+        indexes = [
+            models.Index(fields=['user', 'id']),                # ユーザー別に変更番号順で取得
+            models.Index(fields=['model_name', 'object_id']),   # 古い変更の置き換え用
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.model_name}:{self.object_id} (#{self.pk})"
+
+# ユーザーへの通知（リマインダー）を管理するモデル
+class Notification(models.Model):
+    """
+    通知モデル。「今日の行動が未記録」「日記が未記入」などのリマインダーを記録する。
+    1ユーザー・1種類・1日につき1件。
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ユーザー")  # 通知先ユーザー
+    kind = models.CharField(
+        max_length=30,
+        choices=[
+            ('action_missing', '行動未記録'),
+            ('diary_missing', '日記未記入'),
+        ],
+        verbose_name="種類"
+    )
+    date = models.DateField(verbose_name="対象日")                                     # リマインドの対象日
+    message = models.TextField(verbose_name="本文")                                    # 通知本文
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name="既読日時")      # 既読日時
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
+
+    class Meta:
+        verbose_name = "通知"
+        verbose_name_plural = "通知"
+        unique_together = ['user', 'kind', 'date']  # 同じリマインドは1日1回
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.get_kind_display()} ({self.date})"
+
+# バックグラウンドジョブ（重い処理をリクエスト外で実行）を管理するモデル
+class Job(models.Model):
+    """
+    ジョブモデル。ワーカー（run_workers）が取り出して実行する処理のキュー。
+    同じ key の実行待ち・実行中のジョブは1件のみ。失敗時は間隔を空けて再試行する。
+    """
+    ACTIVE_STATUSES = ['queued', 'running']
+
+    name = models.CharField(max_length=100, verbose_name="ジョブ名")                  # 登録済みの処理名
+    key = models.CharField(max_length=200, null=True, blank=True, verbose_name="重複防止キー")  # 同じ処理の二重登録防止
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, verbose_name="ユーザー")  # 依頼したユーザー
+    args = models.JSONField(default=dict, blank=True, verbose_name="引数")             # 処理に渡す引数
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', '実行待ち'),
+            ('running', '実行中'),
+            ('succeeded', '完了'),
+            ('failed', '失敗')
+        ],
+        default='queued',
+        verbose_name="状態"
+    )
+    attempts = models.IntegerField(default=0, verbose_name="試行回数")                 # 実行した回数
+    max_attempts = models.IntegerField(default=3, verbose_name="最大試行回数")         # これを超えたら失敗
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="実行予定日時")   # この日時以降に実行
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="実行ワーカー")  # 実行中のワーカー名
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name="実行開始日時")  # 取り出した日時
+    result = models.JSONField(null=True, blank=True, verbose_name="結果")              # 処理の戻り値
+    last_error = models.TextField(blank=True, verbose_name="エラー")                   # 直近のエラー
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")      # 作成日時
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")          # 更新日時
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="終了日時")  # 完了・失敗した日時
+
+    class Meta:
+        verbose_name = "ジョブ"
+        verbose_name_plural = "ジョブ"
+        indexes = [
+            models.Index(fields=['status', 'run_at']),  # 実行待ちジョブの取り出し用
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_job_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
+
+# 複数のプロセスで同じ処理を1回だけ行うための実行権（リース）を管理するモデル
+class Lease(models.Model):
+    """
+    リースモデル。キーごとに1行だけ作成でき、作成できたプロセスが処理を行う。
+    処理が終われば削除し、プロセスが落ちた場合は有効期限を過ぎると他のプロセスが取り直せる。
+    """
+    key = models.CharField(max_length=200, unique=True, verbose_name="キー")          # 処理の対象（例: recommendation:1:2025-01-01:daily_goal）
+    owner = models.CharField(max_length=150, verbose_name="保持者")                   # ホスト名:プロセスID:スレッドID
+    expires_at = models.DateTimeField(verbose_name="有効期限")                         # この日時を過ぎたら取り直せる
+
+    class Meta:
+        verbose_name = "リース"
+        verbose_name_plural = "リース"
+
+    def __str__(self):
+        return f"{self.key} ({self.owner})"
+
+# 習慣ランキング（カテゴリ・期間ごと）の集計値を管理するモデル
+class LeaderboardScore(models.Model):
+    """
+    ランキング集計モデル。参加ユーザーのカテゴリ・期間ごとの完了時間・連続日数・完了率の元になる値。
+    更新のたびに行を作り直し、ID を単調増加する変更番号として各プロセスのランキングへ差分を反映する。
+    ランキングから外れたユーザーは is_public=False の行として残す。
+    """
+    PERIODS = [
+        ('week', '週間'),
+        ('month', '月間'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ユーザー")       # 対象ユーザー
+    category = models.ForeignKey(HabitCategory, on_delete=models.CASCADE, verbose_name="カテゴリ")  # 習慣カテゴリ
+    period = models.CharField(max_length=10, choices=PERIODS, verbose_name="期間")          # 週間 / 月間
+    period_start = models.DateField(verbose_name="期間の開始日")                            # 週は月曜日、月は1日
+    completed_minutes = models.IntegerField(default=0, verbose_name="完了した時間（分）")     # 完了した行動の時間の合計
+    completed_count = models.IntegerField(default=0, verbose_name="完了数")                  # 完了した行動の数
+    total_count = models.IntegerField(default=0, verbose_name="行動数")                      # 記録した行動の数
+    streak = models.IntegerField(default=0, verbose_name="最長連続日数")                     # 期間中に完了した日が続いた最長日数
+    is_public = models.BooleanField(default=True, verbose_name="公開")                      # ランキングに表示するか
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")               # 更新日時
+
+    class Meta:
+        verbose_name = "ランキング集計"
+        verbose_name_plural = "ランキング集計"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category', 'period', 'period_start'], name='unique_leaderboard_score'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'period_start', 'category']),  # ランキングの初回読み込み用
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id} {self.period}:{self.period_start}"
+
+# 行動時間の分布（ユーザー・カテゴリ・週ごとのスケッチ）
+class DurationBucket(models.Model):
+    """
+    行動時間の分布を対数幅のバケットごとの件数で持つスケッチ（durations.py）。
+    ユーザー・カテゴリ・週ごとに持ち、複数ユーザー・複数週の分布はバケットごとの件数を足し合わせて作る。
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="ユーザー")       # 対象ユーザー
+    category = models.ForeignKey(HabitCategory, on_delete=models.CASCADE, verbose_name="カテゴリ")  # 習慣カテゴリ
+    week_start = models.DateField(verbose_name="週の開始日")                                # 月曜日
+    bucket = models.IntegerField(verbose_name="バケット")                                   # 0 は0分、それ以外は対数幅の区間
+    count = models.IntegerField(default=0, verbose_name="件数")                             # バケットに入る行動の数
+
+    class Meta:
+        verbose_name = "行動時間の分布"
+        verbose_name_plural = "行動時間の分布"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'category', 'week_start', 'bucket'], name='unique_duration_bucket'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['week_start', 'category']),  # 全ユーザーの分布の集計用
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.category_id} {self.week_start}:{self.bucket}"
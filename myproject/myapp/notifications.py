@@ -0,0 +1,242 @@
+from datetime import datetime, timedelta
+import heapq
+import json
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mass_mail
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import shards
+from .models import DailyDiary, ActionLog, UserProfile, Notification
+from .versioncache import cache
+
+# =====================
+# リマインダー通知のスケジューラ
+# =====================
+
+# 未記録のときに送るリマインドの本文
+REMINDER_MESSAGES = {
+    'action_missing': '今日の行動がまだ記録されていません。小さな一歩でも記録してみましょう。',
+    'diary_missing': '今日の日記がまだありません。1日の振り返りを書いてみましょう。',
+}
+
+# 1回のクエリで条件を確認するユーザー数（SQLite のパラメータ上限 999 以内）
+REMINDER_BATCH_SIZE = 900
+
+# 1回だけ実行する場合（cron）に、前回の実行時刻を覚えておくキー
+LAST_TICK_KEY = 'reminder-last-tick'
+
+# 1回だけ実行する場合に、さかのぼって送るリマインドの範囲（cron が止まっていた間の分をまとめて送らない）
+MAX_CATCH_UP = timedelta(days=1)
+
+
+# =====================
+# 送信先（アウトボックス）
+# =====================
+class DatabaseOutbox:
+    """
+    通知テーブルに保存（同じユーザー・種類・日付の通知は1件のみ）
+    """
+
+    def deliver(self, notifications):
+        Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+
+
+class FileOutbox:
+    """
+    NOTIFICATION_FILE に1行1件のJSONで追記
+    """
+
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'NOTIFICATION_FILE', settings.BASE_DIR / 'notifications.jsonl')
+
+    def deliver(self, notifications):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for notification in notifications:
+                f.write(json.dumps({
+                    'user_id': notification.user_id,
+                    'kind': notification.kind,
+                    'date': notification.date.isoformat(),
+                    'message': notification.message,
+                }, ensure_ascii=False))
+                f.write('\n')
+
+
+class EmailOutbox:
+    """
+    EMAIL_BACKEND（開発時は locmem / console など）でメール送信。メールアドレスのないユーザーは送らない。
+    """
+
+    def deliver(self, notifications):
+        emails = dict(
+            User.objects.filter(
+                id__in={notification.user_id for notification in notifications}
+            ).exclude(email='').values_list('id', 'email')
+        )
+        send_mass_mail([
+            ('AI習慣コーチからのリマインド', notification.message, None, [emails[notification.user_id]])
+            for notification in notifications
+            if notification.user_id in emails
+        ])
+
+
+def get_outbox():
+    return import_string(
+        getattr(settings, 'NOTIFICATION_OUTBOX', 'myproject.myapp.notifications.DatabaseOutbox')
+    )()
+
+
+# =====================
+# スケジューラ
+# =====================
+class ReminderScheduler:
+    """
+    ユーザーごとの次回リマインド時刻を優先度付きキュー（ヒープ）で管理するスケジューラ。
+    時刻を迎えたユーザーをまとめて取り出し、未記録かどうかをバッチ単位のクエリで確認して送信する。
+    プロフィールの変更は更新日時で差分だけ読み込み、古いキュー要素は取り出し時に読み捨てる。
+    """
+
+    def __init__(self, outbox=None, since=None):
+        self.outbox = outbox or get_outbox()
+        self._heap = []
+        self._scheduled = {}
+        self._synced_at = None
+        # 初回に、この時刻より後のリマインドから処理する（省略時は起動した時刻）
+        self._since = since
+
+    def sync_profiles(self, now):
+        """
+        通知設定・リマインド時刻が変わったプロフィールを読み込み、キューに反映する
+        """
+        # 前回の処理以降の時刻から次回を求める（起動時は since を指定しなければ過ぎた分を送らない）
+        since = self._synced_at or self._since or now
+        synced_at, self._synced_at = self._synced_at, now
+
+        for alias in shards.aliases():
+            profiles = UserProfile.objects.using(alias)
+            if synced_at is not None:
+                profiles = profiles.filter(updated_at__gt=synced_at)
+            for user_id, enabled, reminder_time in profiles.values_list(
+                'user_id', 'notification_enabled', 'reminder_time'
+            ).iterator():
+                if enabled:
+                    self._schedule(user_id, self._next_due(reminder_time, since))
+                else:
+                    self._scheduled.pop(user_id, None)
+
+    @staticmethod
+    def _next_due(reminder_time, since):
+        """
+        since より後で最初のリマインド時刻
+        """
+        local_since = timezone.localtime(since)
+        due = timezone.make_aware(datetime.combine(local_since.date(), reminder_time))
+        if due <= local_since:
+            due = timezone.make_aware(datetime.combine(local_since.date() + timedelta(days=1), reminder_time))
+        return due
+
+    def _schedule(self, user_id, due):
+        if self._scheduled.get(user_id) == due:
+            return
+        self._scheduled[user_id] = due
+        heapq.heappush(self._heap, (due, user_id))
+
+    def next_due(self):
+        """
+        キュー内で最も早いリマインド時刻（なければ None）
+        """
+        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def tick(self, now=None):
+        """
+        時刻を迎えたリマインドを処理し、送信した通知の件数を返す
+        """
+        now = now or timezone.now()
+        self.sync_profiles(now)
+
+        due_users = {}
+        while self._heap and self._heap[0][0] <= now:
+            due, user_id = heapq.heappop(self._heap)
+            if self._scheduled.get(user_id) != due:
+                continue  # 設定変更で置き換えられた古い要素
+            due_users.setdefault(timezone.localtime(due).date(), []).append(user_id)
+            # 翌日の同じ時刻に再登録
+            local_due = timezone.localtime(due)
+            self._schedule(user_id, timezone.make_aware(
+                datetime.combine(local_due.date() + timedelta(days=1), local_due.time())
+            ))
+
+        sent = 0
+        for day, user_ids in due_users.items():
+            for i in range(0, len(user_ids), REMINDER_BATCH_SIZE):
+                notifications = self._check(day, user_ids[i:i + REMINDER_BATCH_SIZE])
+                if notifications:
+                    self.outbox.deliver(notifications)
+                    sent += len(notifications)
+        return sent
+
+    def _check(self, day, user_ids):
+        """
+        対象ユーザーの当日の記録状況をシャードごとに1回のクエリで確認し、送る通知を作る
+        """
+        by_shard = {}
+        for user_id in user_ids:
+            by_shard.setdefault(shards.shard_for(user_id), []).append(user_id)
+        rows = []
+        for alias, shard_user_ids in by_shard.items():
+            rows += UserProfile.objects.using(alias).filter(
+                user_id__in=shard_user_ids,
+                notification_enabled=True,
+            ).annotate(
+                has_action=Exists(ActionLog.objects.filter(user_id=OuterRef('user_id'), date=day)),
+                has_diary=Exists(DailyDiary.objects.filter(user_id=OuterRef('user_id'), date=day)),
+            ).values_list('user_id', 'has_action', 'has_diary')
+
+        # 同じ日に送った通知は送り直さない（さかのぼって処理する場合）
+        notified = set(Notification.objects.filter(user_id__in=user_ids, date=day).values_list('user_id', 'kind'))
+
+        notifications = []
+        for user_id, has_action, has_diary in rows:
+            if not has_action and (user_id, 'action_missing') not in notified:
+                notifications.append(Notification(
+                    user_id=user_id, kind='action_missing', date=day,
+                    message=REMINDER_MESSAGES['action_missing']
+                ))
+            if not has_diary and (user_id, 'diary_missing') not in notified:
+                notifications.append(Notification(
+                    user_id=user_id, kind='diary_missing', date=day,
+                    message=REMINDER_MESSAGES['diary_missing']
+                ))
+        return notifications
+
+    def run(self, interval=60, stop=None):
+        """
+        stop（threading.Event など）が立つまで、次のリマインド時刻か interval 秒ごとに処理を続ける
+        """
+        while stop is None or not stop.is_set():
+            self.tick()
+            next_due = self.next_due()
+            wait = interval
+            if next_due is not None:
+                wait = min(interval, max((next_due - timezone.now()).total_seconds(), 0))
+            if stop is not None:
+                stop.wait(wait)
+            else:
+                time.sleep(wait)
+
+
+def run_once(now=None, outbox=None):
+    """
+    前回の実行以降（初回は今日の0時以降、最大 MAX_CATCH_UP）に時刻を迎えたリマインドを処理する（cron 用）。
+    送信した通知の件数を返す。
+    """
+    now = now or timezone.now()
+    start_of_today = timezone.make_aware(datetime.combine(timezone.localdate(now), datetime.min.time()))
+    since = max(cache.get(LAST_TICK_KEY) or start_of_today, now - MAX_CATCH_UP)
+    sent = ReminderScheduler(outbox, since=since).tick(now)
+    cache.set(LAST_TICK_KEY, now, None)
+    return sent
@@ -0,0 +1,249 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.utils import timezone
+from . import changes, cube, metrics, shards
+from .feedback import rank_recommendations
+from .models import DailyDiary, ActionLog, AIRecommendation
+from .singleflight import single_flight
+
+# =====================
+# 期間レポート（日次・週次・月次の振り返り）
+# =====================
+
+# 頻度ごとの表示ラベル
+PERIOD_LABELS = {
+    'daily': {'period': '1日', 'next': '明日', 'kind': '日次'},
+    'weekly': {'period': '1週間', 'next': '来週', 'kind': '週次'},
+    'biweekly': {'period': '2週間', 'next': '次の2週間', 'kind': '隔週'},
+    'monthly': {'period': '1ヶ月', 'next': '来月', 'kind': '月次'},
+}
+
+# 隔週レポートを作成する日曜日の基準（ここから2週間ごと）
+BIWEEKLY_ANCHOR = date(2024, 1, 7)
+
+
+def period_range(frequency, target_date):
+    """
+    対象日に作成するレポートの集計期間 [start, end) を返す。
+    日次は前日、週次は過去7日間、隔週は過去14日間、月次は前月1ヶ月分。
+    """
+    if frequency == 'daily':
+        return target_date - timedelta(days=1), target_date
+    if frequency == 'weekly':
+        return target_date - timedelta(days=7), target_date
+    if frequency == 'biweekly':
+        return target_date - timedelta(days=14), target_date
+    if frequency == 'monthly':
+        end = target_date.replace(day=1)
+        start = (end - timedelta(days=1)).replace(day=1)
+        return start, end
+    raise ValueError(f'unknown report frequency: {frequency}')
+
+
+def is_due(frequency, target_date):
+    """
+    対象日がレポート作成日かどうか。
+    日次は毎日、週次は日曜、隔週は BIWEEKLY_ANCHOR から2週間ごとの日曜、月次は毎月1日。
+    未知の頻度では作成しない。
+    """
+    if frequency == 'daily':
+        return True
+    if frequency == 'weekly':
+        return target_date.weekday() == 6
+    if frequency == 'biweekly':
+        return (target_date - BIWEEKLY_ANCHOR).days % 14 == 0
+    if frequency == 'monthly':
+        return target_date.day == 1
+    return False
+
+
+class PeriodReportEngine:
+    """
+    期間レポート生成エンジン。
+    1期間につき行動ログの集計クエリ1回＋日記の走査1回でレポートを作成し、
+    UserProfile.ai_feedback_frequency に従って対象ユーザーをまとめて処理する。
+    """
+
+    def __init__(self, target_date=None):
+        self.target_date = target_date or date.today()
+
+    def build_report(self, user, frequency):
+        """
+        1ユーザー分のレポートを生成（既存があれば再利用）。
+        """
+        def load():
+            return AIRecommendation.objects.filter(
+                user=user,
+                date=self.target_date,
+                recommendation_type='reflection'
+            ).first()
+
+        def compute():
+            with metrics.RECOMMENDATION_SECONDS.time('reflection', 'single'):
+                stats = self._collect_stats(frequency, User.objects.filter(pk=user.pk))
+                recommendation = self._build(user.pk, frequency, stats.get(user.pk, _empty_stats()))
+                rank_recommendations([recommendation])
+                metrics.RECOMMENDATIONS.inc('reflection', 'single')
+                return AIRecommendation.objects.save_or_get(recommendation)
+
+        # 同時に呼ばれても、生成は1回だけ行う
+        return single_flight(f'recommendation:{user.pk}:{self.target_date}:reflection', load, compute)
+
+    def generate_due_reports(self):
+        """
+        対象日にレポート作成日を迎えた全ユーザーのレポートをまとめて生成。
+        既にレポートがあるユーザーはスキップし、作成したレポートを返す。
+        """
+        created = []
+        with metrics.RECOMMENDATION_SECONDS.time('reflection', 'batch'):
+            for alias in shards.aliases():
+                with shards.use(alias):
+                    created.extend(self._generate_shard(alias))
+        metrics.RECOMMENDATIONS.inc('reflection', 'batch', amount=len(created))
+        return created
+
+    def _generate_shard(self, alias):
+        """
+        alias のシャードに属するユーザー分のレポートを生成（有効なシャードは呼び出し側で設定）
+        """
+        created = []
+        started = timezone.now()
+        for frequency in PERIOD_LABELS:
+            if not is_due(frequency, self.target_date):
+                continue
+
+            users = shards.shard_users(self.due_users(frequency), alias).exclude(
+                id__in=AIRecommendation.objects.filter(
+                    date=self.target_date,
+                    recommendation_type='reflection'
+                ).values('user_id')
+            )
+            stats = self._collect_stats(frequency, users)
+            reports = [
+                self._build(user_id, frequency, stats.get(user_id, _empty_stats()))
+                for user_id in users.values_list('id', flat=True)
+            ]
+            rank_recommendations(reports, users.values('id'))
+            AIRecommendation.objects.bulk_create(reports, ignore_conflicts=True)
+            created.extend(reports)
+
+        # bulk_create はシグナルを発行しないため、集計キューブ・変更履歴への登録を明示的に行う
+        if created:
+            cube.mark_dirty(self.target_date)
+            changes.record(AIRecommendation, AIRecommendation.objects.filter(
+                date=self.target_date, recommendation_type='reflection', created_at__gte=started
+            ).values_list('id', 'user_id'))
+        return created
+
+    def due_users(self, frequency):
+        """
+        指定頻度を設定しているユーザー（プロフィール未作成は日次扱い）
+        """
+        condition = Q(userprofile__ai_feedback_frequency=frequency)
+        if frequency == 'daily':
+            condition |= Q(userprofile__isnull=True)
+        return User.objects.filter(condition, is_active=True)
+
+    def _collect_stats(self, frequency, users):
+        """
+        期間内の行動数・完了数（集計クエリ1回）と、
+        最初と最後の気分スコア（日記の走査1回）をユーザーごとに集める。
+        """
+        start, end = period_range(frequency, self.target_date)
+        user_ids = users.values('id')
+        stats = {}
+
+        action_totals = ActionLog.objects.filter(
+            user_id__in=user_ids,
+            date__gte=start,
+            date__lt=end
+        ).values('user_id').annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(completed=True))
+        ).order_by()
+        for row in action_totals:
+            entry = stats.setdefault(row['user_id'], _empty_stats())
+            entry['total'] = row['total']
+            entry['completed'] = row['completed']
+
+        moods = DailyDiary.objects.filter(
+            user_id__in=user_ids,
+            date__gte=start,
+            date__lt=end
+        ).order_by('user_id', 'date').values_list('user_id', 'mood_score')
+        for user_id, mood_score in moods.iterator():
+            entry = stats.setdefault(user_id, _empty_stats())
+            if entry['diaries'] == 0:
+                entry['first_mood'] = mood_score
+            entry['last_mood'] = mood_score
+            entry['diaries'] += 1
+
+        return stats
+
+    def _build(self, user_id, frequency, stats):
+        """
+        集計結果から振り返りレポート（未保存）を作成
+        """
+        labels = PERIOD_LABELS[frequency]
+        total_actions = stats['total']
+        completion_rate = (stats['completed'] / total_actions * 100) if total_actions > 0 else 0
+
+        # 気分の変化傾向を分析
+        mood_trend = "安定" if stats['diaries'] >= 2 else "データ不足"
+        if stats['diaries'] >= 2:
+            if stats['last_mood'] > stats['first_mood'] + 1:
+                mood_trend = "改善"
+            elif stats['last_mood'] < stats['first_mood'] - 1:
+                mood_trend = "低下"
+
+        # 振り返り内容を生成（{completion_rate} などは提案ごとのパラメータ）
+        if completion_rate >= 80:
+            title = f"素晴らしい{labels['period']}でした！"
+            content = "目標達成率{completion_rate}%と高い成果を上げています。"
+            action_items = [
+                f"{labels['next']}も同じペースを維持",
+                "さらに高い目標に挑戦",
+                "成功の要因を分析して記録"
+            ]
+        elif completion_rate >= 50:
+            title = "良いペースで進んでいます"
+            content = "目標達成率{completion_rate}%と着実に進歩しています。"
+            action_items = [
+                "達成できなかった理由を分析",
+                f"{labels['next']}の目標を少し調整",
+                "成功した習慣を強化"
+            ]
+        else:
+            title = f"{labels['next']}に向けて調整しましょう"
+            content = "目標達成率{completion_rate}%と課題がありますが、改善の余地があります。"
+            action_items = [
+                "目標を現実的なレベルに調整",
+                "習慣化のルーティンを改善",
+                "小さな成功から始める"
+            ]
+
+        content += "\n\n気分の傾向: {mood_trend}\n総行動数: {total_actions}件\n完了率: {completion_rate}%"
+
+        recommendation = AIRecommendation(
+            user_id=user_id,
+            date=self.target_date,
+            recommendation_type='reflection',
+            priority='high'
+        )
+        recommendation.use_template(
+            title,
+            content,
+            f"{labels['kind']}データ分析: 完了率{{completion_rate}}%, 気分傾向{{mood_trend}}",
+            action_items,
+            {
+                'completion_rate': f"{completion_rate:.1f}",
+                'mood_trend': mood_trend,
+                'total_actions': total_actions,
+            }
+        )
+        return recommendation
+
+
+def _empty_stats():
+    return {'total': 0, 'completed': 0, 'diaries': 0, 'first_mood': None, 'last_mood': None}
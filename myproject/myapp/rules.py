@@ -0,0 +1,230 @@
+from datetime import timedelta
+import threading
+import numpy as np
+from django.contrib.auth.models import User
+from django.db.models import Avg, Count, Max
+from django.utils import timezone
+from . import changes, cube, metrics, shards
+from .feedback import rank_recommendations
+from .models import DailyDiary, ActionLog, AIRecommendation, RecommendationRule
+
+# =====================
+# 宣言的なAI提案ルールエンジン
+# =====================
+
+# 比較演算子 → NumPy の要素ごとの比較関数
+OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+# 日記がない場合の気分・エネルギーの既定値
+DEFAULT_SCORE = 5.0
+
+
+class RuleSet:
+    """
+    コンパイル済みのルール表。
+    特徴量の配列（ユーザー数分）に対して、全ルールを一度に評価する。
+    """
+
+    def __init__(self, rules):
+        self.base = [rule for rule in rules if rule.stage == 'base']
+        self.addons = [rule for rule in rules if rule.stage == 'addon']
+        self._base_conditions = [self._compile(rule) for rule in self.base]
+        self._addon_conditions = [self._compile(rule) for rule in self.addons]
+
+    @staticmethod
+    def _compile(rule):
+        return [(feature, OPERATORS[op], float(value)) for feature, op, value in rule.conditions]
+
+    @staticmethod
+    def _mask(conditions, features, size):
+        mask = np.ones(size, dtype=bool)
+        for feature, compare, value in conditions:
+            mask &= compare(features[feature], value)
+        return mask
+
+    def evaluate(self, features):
+        """
+        特徴量の配列を評価し、(基本ルールの番号, 追加ルールの一致行列) を返す。
+        基本ルールは評価順で最初に一致したもの（一致なしは -1）、
+        追加ルールは一致したものをすべて採用する。
+        """
+        size = len(next(iter(features.values())))
+
+        if self.base:
+            base_masks = np.stack([self._mask(c, features, size) for c in self._base_conditions])
+            base_index = np.where(base_masks.any(axis=0), base_masks.argmax(axis=0), -1)
+        else:
+            base_index = np.full(size, -1)
+
+        if self.addons:
+            addon_masks = np.stack([self._mask(c, features, size) for c in self._addon_conditions])
+        else:
+            addon_masks = np.zeros((0, size), dtype=bool)
+
+        return base_index, addon_masks
+
+
+# プロセス内のコンパイル済みルール（バージョンが変わったときだけ再読み込み）
+_ruleset_lock = threading.Lock()
+_ruleset_cache = {'version': None, 'ruleset': None}
+
+
+def get_ruleset():
+    """
+    有効なルールをコンパイルして返す。
+    ルール表の件数と最終更新日時をバージョンとして、変更があったときだけ再コンパイル。
+    """
+    version = RecommendationRule.objects.aggregate(
+        count=Count('id'), updated=Max('updated_at')
+    )
+    version = (version['count'], version['updated'])
+
+    with _ruleset_lock:
+        if _ruleset_cache['version'] != version:
+            rules = list(RecommendationRule.objects.filter(is_active=True))
+            _ruleset_cache['ruleset'] = RuleSet(rules)
+            _ruleset_cache['version'] = version
+        return _ruleset_cache['ruleset']
+
+
+def build_daily_features(users, target_date):
+    """
+    対象ユーザー全員分の特徴量を、過去1週間の集計クエリ2回で作成。
+    ユーザーIDの配列、特徴量の配列（dict）、文面に埋め込む値（list）を返す。
+    """
+    past_week = target_date - timedelta(days=7)
+    user_ids = list(users.values_list('id', flat=True))
+    position = {user_id: i for i, user_id in enumerate(user_ids)}
+    size = len(user_ids)
+
+    avg_mood = np.full(size, DEFAULT_SCORE)
+    avg_energy = np.full(size, DEFAULT_SCORE)
+    avg_sentiment = np.zeros(size)
+    top_category_count = np.zeros(size)
+    top_category = [''] * size
+
+    # 気分・エネルギー・日記の感情スコアの平均値（感情スコアは保存時に計算済みの列を読む）
+    diary_stats = DailyDiary.objects.filter(
+        user_id__in=users.values('id'),
+        date__gte=past_week,
+        date__lt=target_date
+    ).values('user_id').annotate(
+        avg_mood=Avg('mood_score'),
+        avg_energy=Avg('energy_level'),
+        avg_sentiment=Avg('sentiment')
+    ).order_by()
+    for row in diary_stats:
+        i = position.get(row['user_id'])
+        if i is not None:
+            avg_mood[i] = row['avg_mood']
+            avg_energy[i] = row['avg_energy']
+            avg_sentiment[i] = row['avg_sentiment']
+
+    # よく行っている行動カテゴリ
+    category_counts = ActionLog.objects.filter(
+        user_id__in=users.values('id'),
+        date__gte=past_week,
+        date__lt=target_date
+    ).values('user_id', 'category__name').annotate(count=Count('id')).order_by()
+    for row in category_counts:
+        i = position.get(row['user_id'])
+        if i is not None and row['count'] > top_category_count[i]:
+            top_category_count[i] = row['count']
+            top_category[i] = row['category__name']
+
+    features = {
+        'avg_mood': avg_mood,
+        'avg_energy': avg_energy,
+        'avg_sentiment': avg_sentiment,
+        'top_category_count': top_category_count,
+    }
+    params = [
+        {'top_category': top_category[i], 'avg_mood': avg_mood[i], 'avg_energy': avg_energy[i]}
+        for i in range(size)
+    ]
+    return user_ids, features, params
+
+
+def build_daily_recommendations(users, target_date):
+    """
+    対象ユーザー全員の日次提案（未保存）を、ルール表の一括評価で作成。
+    """
+    user_ids, features, params = build_daily_features(users, target_date)
+    if not user_ids:
+        return []
+
+    ruleset = get_ruleset()
+    base_index, addon_masks = ruleset.evaluate(features)
+
+    recommendations = []
+    for i, user_id in enumerate(user_ids):
+        if base_index[i] < 0:
+            continue
+        matched = [ruleset.base[base_index[i]]]
+        matched += [rule for j, rule in enumerate(ruleset.addons) if addon_masks[j, i]]
+        recommendations.append(_render(user_id, target_date, matched, params[i]))
+
+    # フィードバック統計でアクション項目を並べ替え
+    return rank_recommendations(recommendations, users.values('id'))
+
+
+def _render(user_id, target_date, rules, params):
+    """
+    一致したルールの文面を連結して提案を作成（基本提案＋追加提案）。
+    文面は共通テンプレートとして保存し、提案ごとにはパラメータだけを持つ。
+    """
+    base = rules[0]
+    recommendation = AIRecommendation(
+        user_id=user_id,
+        date=target_date,
+        recommendation_type='daily_goal',
+        priority=base.priority
+    )
+    recommendation.use_template(
+        " - ".join(rule.title for rule in rules),
+        "\n\n".join(rule.content for rule in rules),
+        "過去1週間の気分スコア平均: {avg_mood}, エネルギーレベル平均: {avg_energy}",
+        [item for rule in rules for item in rule.action_items],
+        {
+            'top_category': params['top_category'],
+            'avg_mood': f"{params['avg_mood']:.1f}",
+            'avg_energy': f"{params['avg_energy']:.1f}",
+        }
+    )
+    return recommendation
+
+
+def generate_daily_recommendations(target_date, users=None):
+    """
+    日次提案がまだないユーザー全員分を、シャードごとにまとめて生成・保存。
+    """
+    if users is None:
+        users = User.objects.filter(is_active=True)
+    created = []
+    with metrics.RECOMMENDATION_SECONDS.time('daily_goal', 'batch'):
+        for alias in shards.aliases():
+            with shards.use(alias):
+                shard_users = shards.shard_users(users, alias).exclude(
+                    id__in=AIRecommendation.objects.filter(
+                        date=target_date,
+                        recommendation_type='daily_goal'
+                    ).values('user_id')
+                )
+                recommendations = build_daily_recommendations(shard_users, target_date)
+                started = timezone.now()
+                AIRecommendation.objects.bulk_create(recommendations, ignore_conflicts=True)
+                # bulk_create はシグナルを発行しないため、集計キューブ・変更履歴への登録を明示的に行う
+                cube.mark_dirty(target_date)
+                changes.record(AIRecommendation, AIRecommendation.objects.filter(
+                    date=target_date, recommendation_type='daily_goal', created_at__gte=started
+                ).values_list('id', 'user_id'))
+                created.extend(recommendations)
+    metrics.RECOMMENDATIONS.inc('daily_goal', 'batch', amount=len(created))
+    return created
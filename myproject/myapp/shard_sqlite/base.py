@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+# =====================
+# シャード用の SQLite バックエンド
+# =====================
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    ユーザー別データを保存するシャードの接続。
+    共有テーブル（ユーザー・カテゴリなど）は default（設定の SHARED で変更可）のファイルを shared として
+    ATTACH し、シャードのテーブルとの結合・サブクエリをそのまま実行できるようにする。
+    共有テーブルへの外部キーはシャード内では検査できないため、外部キー制約は使わない。
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        conn.execute('PRAGMA foreign_keys = OFF')
+        shared = settings.DATABASES[self.settings_dict.get('SHARED', 'default')]['NAME']
+        conn.execute('ATTACH DATABASE ? AS shared', [str(shared)])
+        return conn
+
+    def enable_constraint_checking(self):
+        pass
+
+    def check_constraints(self, table_names=None):
+        pass
@@ -0,0 +1,238 @@
+from contextlib import contextmanager
+import threading
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.functions import Mod
+
+# =====================
+# ユーザー別データのシャーディング
+# =====================
+#
+# 日記・行動ログ・目標・AI提案・プロフィールを、ユーザーIDで SHARD_COUNT 個の
+# SQLite ファイルに分けて保存する（ユーザーID % シャード数 番目のファイル）。
+# ユーザー・カテゴリ・セッションなどの共有テーブルは default だけに置き、
+# シャードの接続からは ATTACH した default を通して結合・サブクエリで参照する。
+#
+# 振り分け先は次の順で決める。
+#   1. 保存・関連の取得で対象のインスタンスが分かる場合は、そのユーザーのシャード
+#   2. リクエスト中（ShardMiddleware）やバッチの use() ブロック内では、有効なシャード
+#   3. それ以外は default
+
+# シャードに分けるモデル（プロフィールの多対多の中間テーブルを含む）
+SHARDED_MODELS = {
+    'dailydiary', 'actionlog', 'goal', 'airecommendation', 'userprofile',
+    'userprofile_preferred_categories',
+}
+
+# シャードごとのID空間（シャード i のIDは i * SHARD_ID_SPACE から採番し、全シャードで一意にする）
+SHARD_ID_SPACE = 1 << 40
+
+_state = threading.local()
+
+
+def aliases():
+    """
+    シャードのDB名のリスト（先頭は default）
+    """
+    return list(getattr(settings, 'SHARD_DATABASES', None) or ['default'])
+
+
+def shard_for(user_id):
+    shard_aliases = aliases()
+    return shard_aliases[int(user_id) % len(shard_aliases)]
+
+
+def current():
+    """
+    このスレッドで有効なシャード（なければ None）
+    """
+    return getattr(_state, 'alias', None)
+
+
+def activate(alias):
+    """
+    このスレッドで有効なシャードを設定する（None で解除）
+    """
+    _state.alias = alias
+
+
+@contextmanager
+def use(alias):
+    """
+    このブロック内（同一スレッド）の、対象が決まらないクエリを alias のシャードで実行する
+    """
+    previous = current()
+    activate(alias)
+    try:
+        yield alias
+    finally:
+        activate(previous)
+
+
+def for_user(user_id):
+    return use(shard_for(user_id))
+
+
+def shard_users(users, alias):
+    """
+    ユーザーのクエリセットを、alias のシャードに属するユーザーに絞り込む
+    """
+    shard_aliases = aliases()
+    if len(shard_aliases) == 1:
+        return users
+    return users.alias(shard_index=Mod('id', len(shard_aliases))).filter(
+        shard_index=shard_aliases.index(alias)
+    )
+
+
+def is_sharded(model):
+    opts = model._meta
+    if opts.auto_created:
+        opts = opts.auto_created._meta
+    return opts.app_label == 'myapp' and opts.model_name in SHARDED_MODELS
+
+
+def sharded_models():
+    """
+    シャードに分けるモデル（中間テーブルを含む、親→子の順）
+    """
+    # ルーターはアプリの読み込み前に import されることがあるため、モデルは使うときに読み込む
+    from .models import UserProfile, Goal, DailyDiary, ActionLog, AIRecommendation
+    return [
+        UserProfile, UserProfile.preferred_categories.through,
+        Goal, DailyDiary, ActionLog, AIRecommendation,
+    ]
+
+
+class ShardRouter:
+    """
+    シャーディング用のDBルーター（settings.DATABASE_ROUTERS に登録）
+    """
+
+    def _shard(self, hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._meta.label == settings.AUTH_USER_MODEL:
+            return shard_for(instance.pk)
+        if instance is not None and is_sharded(type(instance)):
+            if instance._state.db is not None:
+                return instance._state.db
+            if getattr(instance, 'user_id', None) is not None:
+                return shard_for(instance.user_id)
+        return current()
+
+    def db_for_read(self, model, **hints):
+        if is_sharded(model):
+            return self._shard(hints)
+        # 共有テーブルは、有効なシャードの接続から ATTACH 経由で読む（シャードのテーブルと結合できる）
+        return current()
+
+    def db_for_write(self, model, **hints):
+        if is_sharded(model):
+            return self._shard(hints)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 共有テーブルとシャードのテーブルの間の参照を許可する
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default':
+            return None
+        # シャードにはシャードに分けるモデルのテーブルだけを作る（データ移行は default だけで行う）
+        return app_label == 'myapp' and model_name in SHARDED_MODELS
+
+
+def reserve_id_space(alias):
+    """
+    シャードの各テーブルの採番開始位置を、シャード固有のID空間の先頭に合わせる
+    """
+    start = aliases().index(alias) * SHARD_ID_SPACE
+    if not start:
+        return
+    with connections[alias].cursor() as cursor:
+        for model in sharded_models():
+            table = model._meta.db_table
+            cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, start])
+            elif row[0] < start:
+                cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [start, table])
+
+
+def delete_user_rows(user_id):
+    """
+    default 以外のシャードにあるユーザーのデータを削除する（ユーザー削除時。default は CASCADE で消える）
+    """
+    from . import changes
+    alias = shard_for(user_id)
+    if alias == 'default':
+        return
+    with transaction.atomic(using=alias), changes.paused():
+        for model in reversed(sharded_models()):
+            if not model._meta.auto_created:  # 中間テーブルはプロフィールの削除で消える
+                model.objects.using(alias).filter(user_id=user_id).delete()
+
+
+# =====================
+# シャード数を変えたときの再配置
+# =====================
+def _user_filter(model, schema='main'):
+    """
+    ユーザーの行を選ぶ WHERE 句（中間テーブルはプロフィール経由）
+    """
+    if model._meta.auto_created:
+        from .models import UserProfile
+        return f'userprofile_id IN (SELECT id FROM {schema}.{UserProfile._meta.db_table} WHERE user_id = %s)'
+    return 'user_id = %s'
+
+
+def misplaced_users(alias):
+    """
+    alias のシャードに行があるが、現在のシャード数では別のシャードに属するユーザーID
+    """
+    user_ids = set()
+    with connections[alias].cursor() as cursor:
+        for model in sharded_models():
+            if not model._meta.auto_created:
+                cursor.execute(f'SELECT DISTINCT user_id FROM {model._meta.db_table}')
+                user_ids.update(row[0] for row in cursor.fetchall())
+    return sorted(user_id for user_id in user_ids if shard_for(user_id) != alias)
+
+
+def move_user(user_id, source):
+    """
+    ユーザーの全データを source から本来のシャードへ移す。
+    移動先の接続に source のファイルを ATTACH し、行をIDを含めてそのまま写す（再実行しても重複しない）。
+    移動先で確定してから移動元を削除する。
+    """
+    target = shard_for(user_id)
+    copied = 0
+    with connections[target].cursor() as cursor:
+        # ATTACH はトランザクションの外でしか行えない
+        cursor.execute('ATTACH DATABASE %s AS source', [str(settings.DATABASES[source]['NAME'])])
+        try:
+            with transaction.atomic(using=target):
+                # 写した行のIDで移動先の採番が進まないよう、採番位置を元に戻す
+                cursor.execute('SELECT name, seq FROM main.sqlite_sequence')
+                sequences = dict(cursor.fetchall())
+                for model in sharded_models():
+                    table = model._meta.db_table
+                    columns = ', '.join(field.column for field in model._meta.local_concrete_fields)
+                    cursor.execute(
+                        f'INSERT OR IGNORE INTO main.{table} ({columns}) '
+                        f'SELECT {columns} FROM source.{table} WHERE {_user_filter(model, "source")}',
+                        [user_id]
+                    )
+                    copied += cursor.rowcount
+                    cursor.execute(
+                        'UPDATE main.sqlite_sequence SET seq = %s WHERE name = %s',
+                        [sequences.get(table, aliases().index(target) * SHARD_ID_SPACE), table]
+                    )
+        finally:
+            cursor.execute('DETACH DATABASE source')
+
+    with transaction.atomic(using=source), connections[source].cursor() as cursor:
+        for model in reversed(sharded_models()):
+            cursor.execute(f'DELETE FROM {model._meta.db_table} WHERE {_user_filter(model)}', [user_id])
+    return target, copied
@@ -0,0 +1,143 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from . import autocomplete, categories, changes, cube, durations, heatmap, leaderboard, shards
+from .models import DailyDiary, ActionLog, Goal, AIRecommendation, HabitCategory
+
+# =====================
+# 集計キューブ：変更された日付を再集計待ちに登録
+# =====================
+@receiver(post_init, sender=DailyDiary)
+@receiver(post_init, sender=ActionLog)
+@receiver(post_init, sender=AIRecommendation)
+def remember_loaded_date(sender, instance, **kwargs):
+    """
+    読み込み時の日付を覚えておき、日付が変更された場合は元の日も再集計する
+    """
+    instance._loaded_date = instance.__dict__.get('date')
+
+@receiver(post_save, sender=DailyDiary)
+@receiver(post_save, sender=ActionLog)
+@receiver(post_save, sender=AIRecommendation)
+@receiver(post_delete, sender=DailyDiary)
+@receiver(post_delete, sender=ActionLog)
+@receiver(post_delete, sender=AIRecommendation)
+def mark_cube_dirty(sender, instance, **kwargs):
+    # 集計キューブは default にあるため、シャードのトランザクションがコミットされてから登録する
+    cube.mark_dirty_on_commit(instance._state.db, instance.date, getattr(instance, '_loaded_date', None))
+    instance._loaded_date = instance.date
+
+# =====================
+# 活動カレンダー：ユーザーのキャッシュを無効化
+# =====================
+@receiver(post_save, sender=DailyDiary)
+@receiver(post_save, sender=ActionLog)
+@receiver(post_delete, sender=DailyDiary)
+@receiver(post_delete, sender=ActionLog)
+def invalidate_heatmap(sender, instance, **kwargs):
+    heatmap.invalidate(instance.user_id)
+
+# =====================
+# 行動名の入力補完：インデックスの更新
+# =====================
+@receiver(post_save, sender=ActionLog)
+def update_action_name_index(sender, instance, created, **kwargs):
+    # 作成はインデックスへ差分で追加し、編集（行動名・カテゴリ・日付が変わりうる）は作り直させる
+    if created:
+        transaction.on_commit(lambda: autocomplete.record(instance), using=instance._state.db)
+    else:
+        transaction.on_commit(lambda: autocomplete.invalidate(instance.user_id), using=instance._state.db)
+
+@receiver(post_delete, sender=ActionLog)
+def invalidate_action_name_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: autocomplete.invalidate(instance.user_id), using=instance._state.db)
+
+# =====================
+# 習慣ランキング：参加ユーザーの集計値を更新
+# =====================
+@receiver(post_init, sender=ActionLog)
+def remember_loaded_board(sender, instance, **kwargs):
+    # カテゴリ・日付が変更された場合は、元のランキングも集計し直す
+    instance._loaded_board = (instance.__dict__.get('category_id'), instance.__dict__.get('date'))
+
+@receiver(post_save, sender=ActionLog)
+@receiver(post_delete, sender=ActionLog)
+def refresh_leaderboard(sender, instance, **kwargs):
+    changes = [(instance.category_id, instance.date)]
+    if getattr(instance, '_loaded_board', (None, None))[1] is not None:
+        changes.append(instance._loaded_board)
+    instance._loaded_board = (instance.category_id, instance.date)
+    transaction.on_commit(lambda: leaderboard.refresh(instance.user_id, changes), using=instance._state.db)
+
+# =====================
+# 行動時間の分布：バケットの件数を増減
+# =====================
+@receiver(post_init, sender=ActionLog)
+def remember_loaded_duration(sender, instance, **kwargs):
+    # 編集された場合は、元のカテゴリ・週・時間のバケットから差し引く
+    instance._loaded_duration = (
+        instance.__dict__.get('category_id'), instance.__dict__.get('date'), instance.__dict__.get('duration_minutes')
+    )
+
+@receiver(post_save, sender=ActionLog)
+def update_duration_sketch(sender, instance, created, **kwargs):
+    # 分布は default にあるため、シャードのトランザクションがコミットされてから反映する
+    current = (instance.category_id, instance.date, instance.duration_minutes)
+    durations.record_on_commit(
+        instance._state.db, instance.user_id, [current], [] if created else [instance._loaded_duration]
+    )
+    instance._loaded_duration = current
+
+@receiver(post_delete, sender=ActionLog)
+def remove_from_duration_sketch(sender, instance, origin=None, **kwargs):
+    # ユーザーごと削除される場合は、分布もまとめて削除される
+    if isinstance(origin, User):
+        return
+    durations.record_on_commit(instance._state.db, instance.user_id, removed=[instance._loaded_duration])
+
+# =====================
+# 差分同期：変更履歴に記録
+# =====================
+@receiver(post_save, sender=DailyDiary)
+@receiver(post_save, sender=ActionLog)
+@receiver(post_save, sender=Goal)
+@receiver(post_save, sender=AIRecommendation)
+def record_change(sender, instance, **kwargs):
+    # 変更履歴は default にあるため、シャードのトランザクションがコミットされてから記録する
+    changes.record_on_commit(sender, [(instance.pk, instance.user_id)], instance._state.db)
+
+@receiver(post_delete, sender=DailyDiary)
+@receiver(post_delete, sender=ActionLog)
+@receiver(post_delete, sender=Goal)
+@receiver(post_delete, sender=AIRecommendation)
+def record_deletion(sender, instance, origin=None, **kwargs):
+    # ユーザーごと削除される場合は、変更履歴もまとめて削除される
+    if isinstance(origin, User):
+        return
+    changes.record_on_commit(sender, [(instance.pk, instance.user_id)], instance._state.db, deleted=True)
+
+# =====================
+# 習慣カテゴリ：プロセス内レジストリの無効化
+# =====================
+@receiver(post_save, sender=HabitCategory)
+@receiver(post_delete, sender=HabitCategory)
+def invalidate_categories(sender, instance, **kwargs):
+    # コミット前に他のプロセスが古い内容を読み直さないよう、コミット後に無効化
+    transaction.on_commit(categories.invalidate)
+
+@receiver(post_delete, sender=HabitCategory)
+@receiver(post_delete, sender=User)
+def invalidate_leaderboards(sender, instance, **kwargs):
+    # CASCADE で消えたランキングの行は変更として読めないため、全プロセスで読み直す
+    transaction.on_commit(leaderboard.invalidate_all)
+
+# =====================
+# シャーディング：ユーザー削除時にシャードのデータも削除
+# =====================
+@receiver(pre_delete, sender=User)
+def delete_sharded_rows(sender, instance, **kwargs):
+    """
+    default 以外のシャードにあるユーザーのデータは CASCADE の対象外のため、ユーザー削除時にまとめて削除
+    """
+    shards.delete_user_rows(instance.pk)
@@ -0,0 +1,128 @@
+from datetime import timedelta
+import os
+import socket
+import threading
+import time
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import Lease
+
+# =====================
+# 同じ処理の同時実行を1回にまとめる（シングルフライト）
+# =====================
+
+# 実行中のままこの秒数を過ぎたリースは、プロセスが落ちたものとして取り直す
+LEASE_TIMEOUT = 60
+
+# 他の実行者の結果を待つ秒数（過ぎたら自分で実行する）
+WAIT_TIMEOUT = 30
+
+# 他のプロセスの結果を確認する間隔（秒）
+POLL_INTERVAL = 0.1
+
+# 実行した結果が「なし」（None）だったことを、待っている他の実行者へ知らせる秒数。
+# その間はリースの保持者を NO_RESULT_OWNER にして残し、待っている実行者は期限まで待たずに None を返す。
+NO_RESULT_TTL = 5
+NO_RESULT_OWNER = '(no result)'
+
+# このプロセス内で実行中のキー → 完了を知らせるイベント
+_lock = threading.Lock()
+_inflight = {}
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def acquire(key, owner, timeout=LEASE_TIMEOUT):
+    """
+    キーのリースを取得できれば True。期限切れのリースは取り直す。
+    """
+    now = timezone.now()
+    Lease.objects.filter(key=key, expires_at__lt=now).delete()
+    try:
+        with transaction.atomic():
+            Lease.objects.create(key=key, owner=owner, expires_at=now + timedelta(seconds=timeout))
+        return True
+    except IntegrityError:
+        return False
+
+
+def release(key, owner):
+    Lease.objects.filter(key=key, owner=owner).delete()
+
+
+def mark_no_result(key, owner, ttl=NO_RESULT_TTL):
+    """
+    保持しているリースを、結果なしの印として ttl 秒だけ残す（release では削除されない）
+    """
+    Lease.objects.filter(key=key, owner=owner).update(
+        owner=NO_RESULT_OWNER, expires_at=timezone.now() + timedelta(seconds=ttl)
+    )
+
+
+def has_no_result(key):
+    return Lease.objects.filter(key=key, owner=NO_RESULT_OWNER, expires_at__gte=timezone.now()).exists()
+
+
+def single_flight(key, load, compute, timeout=WAIT_TIMEOUT):
+    """
+    キーごとに1つの実行者だけが compute() を呼び、他は結果を待って load() で取得する。
+    load() は結果がまだなければ None を返す。
+    compute() は結果を保存して返す（既に保存済みなら既存を返す insert-or-get にする）。結果がなければ None を返し、
+    その間に待っていた実行者も NO_RESULT_TTL 秒以内に呼んだ実行者も、compute() を繰り返さずに None を返す。
+    スレッド間はイベントで、プロセス間は Lease テーブルで実行者を1つに決める。
+    """
+    result = load()
+    if result is not None:
+        return result
+
+    with _lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+
+    if not leader:
+        # 同じプロセス内の先行スレッドの完了を待つ
+        event.wait(timeout)
+        result = load()
+        if result is not None:
+            return result
+        return _run_exclusive(key, load, compute, timeout)
+
+    try:
+        return _run_exclusive(key, load, compute, timeout)
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def _run_exclusive(key, load, compute, timeout):
+    """
+    リースを取得して compute() する。他のプロセスが実行中なら、その結果（結果なしの印を含む）か期限切れを待つ。
+    """
+    owner = _owner()
+    deadline = time.monotonic() + timeout
+    while True:
+        if acquire(key, owner):
+            try:
+                result = load()
+                if result is None:
+                    result = compute()
+                if result is None:
+                    mark_no_result(key, owner)
+                return result
+            finally:
+                release(key, owner)
+
+        if has_no_result(key):
+            return None
+        time.sleep(POLL_INTERVAL)
+        result = load()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            # 待ちきれない場合も、保存は insert-or-get のため重複しない
+            return compute()
@@ -0,0 +1,239 @@
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+from pathlib import Path
+import re
+import sys
+import threading
+import time
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+# =====================
+# 遅いクエリのログ（スロークエリログ）
+# =====================
+#
+# 全DB接続に execute_wrapper を登録し、SLOW_QUERY_MS 以上かかったSQLを
+# パラメータ・EXPLAIN QUERY PLAN・発行元（ビュー / AIHabitCoach のメソッド）・呼び出し履歴とともに
+# JSON 1行で記録する。出力先はプロセスごとのローテーションするファイル（settings.LOGGING の slow_queries）。
+# DEBUG を有効にせずに、データ量の増加で遅くなる ORM 呼び出しを見つけるためのもの。
+
+# ログに残す呼び出し履歴の段数（このプロジェクト内のフレームのみ）
+STACK_DEPTH = 8
+
+# パラメータ1つあたりの最大文字数
+PARAM_MAX_LENGTH = 200
+
+# 発行元として扱わないモジュール（計測・振り分けの仕組み自体）
+SKIPPED_FILES = {'slowlog.py', 'middleware.py', 'metrics.py', 'singleflight.py'}
+
+_state = threading.local()
+_project_dir = str(Path(settings.BASE_DIR).resolve())
+
+
+def process_log_path(path, pid):
+    """
+    プロセスごとのログファイル（slow_queries.log → slow_queries.<pid>.log）
+    """
+    path = Path(path)
+    return path.with_name(f'{path.stem}.{pid}{path.suffix}')
+
+
+class ProcessRotatingFileHandler(RotatingFileHandler):
+    """
+    プロセスごとのファイル（process_log_path）に書き、それぞれをローテーションする RotatingFileHandler。
+    1つのファイルを複数プロセスでローテーションすると、他のプロセスが古いファイルに書き続けたり
+    ローテーション済みのファイルを上書きしたりするため、gunicorn のワーカーや run_workers で分ける。
+    preload_app でマスターが設定を読み込んでからフォークするため、ファイル名は書き込み時のプロセスIDで決める。
+    """
+
+    def __init__(self, filename, *args, **kwargs):
+        self.base_path = Path(filename)
+        self.pid = os.getpid()
+        super().__init__(process_log_path(filename, self.pid), *args, **kwargs)
+
+    def emit(self, record):
+        if self.pid != os.getpid():  # フォーク後の最初の書き込み
+            self.pid = os.getpid()
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(process_log_path(self.base_path, self.pid))
+        super().emit(record)
+
+
+def threshold():
+    """
+    記録する実行時間の下限（秒）。0 以下なら記録しない。
+    """
+    return getattr(settings, 'SLOW_QUERY_MS', 0) / 1000
+
+
+def install():
+    """
+    以降に作られるDB接続すべてに、遅いクエリを記録する execute_wrapper を登録する
+    """
+    connection_created.connect(_add_wrapper, dispatch_uid='slowlog')
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if threshold() > 0 and _log_slow_query not in connection.execute_wrappers:
+        # 先頭に置き、他の execute_wrapper の処理時間も含めて計測する
+        connection.execute_wrappers.insert(0, _log_slow_query)
+
+
+def _log_slow_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = time.perf_counter() - started
+    if elapsed >= threshold() and not getattr(_state, 'explaining', False):
+        _record(context['connection'], sql, params, many, elapsed)
+    return result
+
+
+def _record(connection, sql, params, many, elapsed):
+    if many:
+        params = next(iter(params), None)
+    stack = _project_stack()
+    entry = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'ms': round(elapsed * 1000, 2),
+        'db': connection.alias,
+        'sql': sql,
+        'params': [_trim(param) for param in params or ()],
+        'many': many,
+        'plan': _explain(connection, sql, params),
+        'caller': _caller(stack),
+        'stack': [f'{path}:{lineno} in {name}' for path, lineno, name, _ in stack[:STACK_DEPTH]],
+    }
+    logger.warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def _explain(connection, sql, params):
+    """
+    EXPLAIN QUERY PLAN の各行を、親子関係に応じて字下げした文字列のリストで返す
+    """
+    _state.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            rows = cursor.fetchall()
+    except Exception as exc:  # 実行時にしか作れないSQL（DDLなど）は計画を取れない
+        return [f'(EXPLAIN できませんでした: {exc})']
+    finally:
+        _state.explaining = False
+
+    depth = {0: -1}
+    plan = []
+    for node_id, parent_id, _, detail in rows:
+        depth[node_id] = depth.get(parent_id, -1) + 1
+        plan.append('  ' * depth[node_id] + detail)
+    return plan
+
+
+def _project_stack():
+    """
+    このプロジェクト内のフレームを内側から順に (相対パス, 行番号, 関数名, フレーム) で返す
+    """
+    stack = []
+    frame = sys._getframe()
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_project_dir) and Path(filename).name not in SKIPPED_FILES:
+            path = Path(filename).relative_to(_project_dir).as_posix()
+            stack.append((path, frame.f_lineno, frame.f_code.co_name, frame))
+        frame = frame.f_back
+    return stack
+
+
+def _caller(stack):
+    """
+    クエリを発行したビュー、または AIHabitCoach のメソッド（なければ最も内側のプロジェクト内の関数）
+    """
+    from .services import AIHabitCoach
+    for path, _, name, frame in stack:
+        instance = frame.f_locals.get('self')
+        if isinstance(instance, AIHabitCoach):
+            # メソッド内の関数（load / compute など）は、定義元のメソッドの名前で表す
+            qualname = getattr(frame.f_code, 'co_qualname', f'AIHabitCoach.{name}')
+            return qualname.split('.<locals>', 1)[0]
+        if path.endswith('/views.py') and 'request' in frame.f_locals:
+            return f'{Path(path).parent.name}.views.{name}'
+    if stack:
+        path, lineno, name, _ = stack[0]
+        return f'{path}:{lineno} in {name}'
+    return None
+
+
+def _trim(value):
+    if isinstance(value, (bytes, str)) and len(value) > PARAM_MAX_LENGTH:
+        return f'{value[:PARAM_MAX_LENGTH]}…（{len(value)}文字）'
+    return value
+
+
+# =====================
+# ログの集計（クエリの形ごと）
+# =====================
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    """
+    パラメータの個数やリテラルの違いをならしたクエリの形
+    """
+    shape = _IN_LIST.sub('(%s, ...)', sql)
+    shape = _LITERAL.sub('?', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def log_files():
+    """
+    スロークエリログのファイル（全プロセス分、ローテーション済みのものを含む、更新の古い順）
+    """
+    path = Path(getattr(settings, 'SLOW_QUERY_LOG', settings.BASE_DIR / 'slow_queries.log'))
+    paths = {
+        *path.parent.glob(f'{path.stem}.*{path.suffix}'),    # slow_queries.<pid>.log
+        *path.parent.glob(f'{path.stem}.*{path.suffix}.*'),  # slow_queries.<pid>.log.<n>
+        *path.parent.glob(f'{path.name}*'),                  # プロセスごとに分ける前のファイル
+    }
+    return sorted((p for p in paths if p.is_file()), key=lambda p: (p.stat().st_mtime, p.name))
+
+
+def read_entries(paths=None):
+    for path in paths or log_files():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # 書き込み途中の行
+
+
+def summarize(entries):
+    """
+    クエリの形ごとに件数・合計/平均/最大時間・発行元をまとめ、合計時間の長い順に返す
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(query_shape(entry['sql']), {
+            'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'callers': {}, 'slowest': entry,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        if entry['ms'] >= group['max_ms']:
+            group['max_ms'] = entry['ms']
+            group['slowest'] = entry
+        caller = entry.get('caller') or '?'
+        group['callers'][caller] = group['callers'].get(caller, 0) + 1
+
+    summary = [
+        {'shape': shape, **group, 'avg_ms': group['total_ms'] / group['count']}
+        for shape, group in groups.items()
+    ]
+    summary.sort(key=lambda group: group['total_ms'], reverse=True)
+    return summary
@@ -0,0 +1,205 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from django.db import connections, router
+from . import shards
+
+# =====================
+# 分析用の読み取り専用スナップショット
+# =====================
+#
+# 分析ページ・運営向け集計などの重い読み取りを、SQLite のオンラインバックアップで
+# 定期的に複製したスナップショットのファイルから行い、書き込み側のロックと競合させない。
+#
+# スナップショットは各DB（シャードを含む）ごとに settings.ANALYTICS_SNAPSHOT_DIR に作り、
+# settings.DATABASES の '<元のDB名>_snapshot' から mode=ro で開く。
+# reading() のブロック内（同一スレッド）の読み取りは、作成から
+# ANALYTICS_SNAPSHOT_MAX_AGE 秒以内のスナップショットがあればそちらへ振り分ける。
+# 古い・未作成の場合は元のDBを読む。
+
+# 1回のバックアップ手順で複製するページ数（手順の合間は元のDBへの書き込みを待たせない）
+BACKUP_PAGES = 1024
+
+_state = threading.local()
+
+
+def snapshot_alias(alias):
+    return f'{alias}_snapshot'
+
+
+def source_alias(alias):
+    """
+    スナップショットのDB名なら元のDB名、それ以外は None
+    """
+    return settings.DATABASES.get(alias, {}).get('SNAPSHOT_OF')
+
+
+def snapshot_path(alias):
+    return Path(settings.ANALYTICS_SNAPSHOT_DIR) / f'{alias}.sqlite3'
+
+
+def max_age():
+    """
+    許容する古さ（秒）。0 ならスナップショットを使わない。
+    """
+    return getattr(settings, 'ANALYTICS_SNAPSHOT_MAX_AGE', 0)
+
+
+def taken_at(alias='default'):
+    """
+    スナップショットの作成開始時刻（なければ None）
+    """
+    try:
+        return datetime.fromtimestamp(snapshot_path(alias).stat().st_mtime, dt_timezone.utc)
+    except FileNotFoundError:
+        return None
+
+
+def refresh():
+    """
+    全DB（default → シャードの順）のスナップショットを作り直す。{DB名: 所要秒数} を返す。
+    一時ファイルへバックアップしてから置き換えるため、読み取り中の接続は古いファイルを読み続けられる。
+    """
+    directory = Path(settings.ANALYTICS_SNAPSHOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    timings = {}
+    for alias in shards.aliases():
+        started = time.time()
+        path = snapshot_path(alias)
+        tmp_path = path.with_name(f'{path.name}.tmp')
+        tmp_path.unlink(missing_ok=True)
+
+        source = connections[alias]
+        source.ensure_connection()
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.connection.backup(target, pages=BACKUP_PAGES)
+            # 読み取り専用で開けるよう、WAL モードの複製も通常のジャーナルモードに戻す
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+
+        # ファイルの更新時刻を作成開始時刻にして、古さの判定に使う
+        os.utime(tmp_path, (started, started))
+        os.replace(tmp_path, path)
+        timings[alias] = time.time() - started
+    return timings
+
+
+def status():
+    """
+    画面表示用のスナップショットの状態
+    """
+    if not getattr(_state, 'aliases', None):
+        return {'in_use': False, 'max_age_minutes': max_age() // 60}
+    return {
+        'in_use': True,
+        'taken_at': min(_state.taken_at.values()),
+        'max_age_minutes': max_age() // 60,
+    }
+
+
+@contextmanager
+def reading():
+    """
+    このブロック内（同一スレッド）の読み取りを、十分新しいスナップショットから行う
+    """
+    previous = getattr(_state, 'aliases', None), getattr(_state, 'taken_at', None)
+    fresh = {}
+    taken = {}
+    if max_age() > 0:
+        now = time.time()
+        opened = _opened()
+        for alias in shards.aliases():
+            moment = taken_at(alias)
+            if moment is None or now - moment.timestamp() > max_age():
+                continue
+            fresh[alias] = snapshot_alias(alias)
+            taken[alias] = moment
+            if opened.get(alias) != moment:
+                # スナップショットが作り直されていれば、古いファイルの接続を閉じる
+                connections[fresh[alias]].close()
+                opened[alias] = moment
+        if len(fresh) < len(shards.aliases()):
+            # シャードは default を ATTACH して読むため、一部だけ古い場合は使わない
+            fresh, taken = {}, {}
+
+    _state.aliases, _state.taken_at = fresh, taken
+    try:
+        yield
+    finally:
+        _state.aliases, _state.taken_at = previous
+
+
+@contextmanager
+def live():
+    """
+    reading() のブロック内でも、このブロックでは元のDBを読む（キャッシュに載せる値の計算など）
+    """
+    previous = getattr(_state, 'aliases', None)
+    _state.aliases = None
+    try:
+        yield
+    finally:
+        _state.aliases = previous
+
+
+def reads_from_snapshot(view_func):
+    """
+    ビューの読み取りをスナップショットから行うデコレーター
+    """
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+def _opened():
+    if not hasattr(_state, 'opened'):
+        _state.opened = {}
+    return _state.opened
+
+
+class SnapshotRouter:
+    """
+    reading() の間の読み取りをスナップショットへ振り分けるDBルーター（他のルーターより前に登録）
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = getattr(_state, 'aliases', None)
+        if not aliases:
+            return None
+        alias = self._next_router_db(model, hints) or 'default'
+        if source_alias(alias):
+            return alias
+        return aliases.get(alias)
+
+    def _next_router_db(self, model, hints):
+        for other in router.routers:
+            if other is self or not hasattr(other, 'db_for_read'):
+                continue
+            alias = other.db_for_read(model, **hints)
+            if alias:
+                return alias
+        instance = hints.get('instance')
+        return instance._state.db if instance is not None else None
+
+    def db_for_write(self, model, **hints):
+        # スナップショットから読んだインスタンスの保存は、元のDBに書き込む
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db is not None:
+            return source_alias(instance._state.db)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if source_alias(db):
+            return False
+        return None
@@ -0,0 +1,218 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from . import archive, autocomplete, categories, changes, cube, durations, heatmap, leaderboard, shards
+from .models import DailyDiary, ActionLog
+
+# =====================
+# オフライン端末からの一括同期
+# =====================
+
+# 1回の同期で受け付ける件数（種類ごと）
+SYNC_MAX_ENTRIES = 500
+
+# 端末から受け付ける項目。作成時に省略した項目はモデルの既定値、更新（同じ client_id の再送・編集）時に
+# 省略した項目は保存済みの値のままにする（送られた項目だけを上書き）。
+ACTION_LOG_FIELDS = ['category', 'action_name', 'duration_minutes', 'completed', 'notes', 'date']
+DIARY_FIELDS = ['date', 'mood_score', 'energy_level', 'content', 'gratitude']
+
+
+def sync_batch(user, payload):
+    """
+    {'action_logs': [...], 'diaries': [...]} を一括で検証し、1トランザクションで作成・更新する。
+    各項目は端末で生成した client_id（UUID）を持ち、同じ内容の再送は同じ結果になる。
+    (結果, エラー) を返し、エラーが1件でもあれば何も保存しない。
+    """
+    errors = {}
+    action_entries = _entries(payload, 'action_logs', errors)
+    diary_entries = _entries(payload, 'diaries', errors)
+    if errors:
+        return None, errors
+
+    action_logs = _validate_action_logs(user, action_entries, errors)
+    diaries, adopted = _validate_diaries(user, diary_entries, errors)
+    if errors:
+        return None, errors
+
+    # 既存の行（再送・編集）の日付は集計キューブの再集計対象に含める
+    old_actions = {
+        client_id: (category_id, day, minutes)
+        for client_id, category_id, day, minutes in ActionLog.objects.filter(
+            user=user, client_id__in=[log.client_id for log in action_logs]
+        ).values_list('client_id', 'category_id', 'date', 'duration_minutes')
+    }
+    old_action_dates = {client_id: day for client_id, (_, day, _) in old_actions.items()}
+    old_diary_dates = dict(
+        DailyDiary.objects.filter(
+            user=user, client_id__in=[diary.client_id for diary in diaries]
+        ).values_list('client_id', 'date')
+    )
+    old_diary_dates.update((diary.client_id, diary.date) for diary in adopted)
+
+    try:
+        with transaction.atomic(using=shards.shard_for(user.pk)):
+            # 同じ日付の既存の日記（Web から作成したものなど）は、この端末の日記として引き継ぐ
+            if adopted:
+                DailyDiary.objects.bulk_update(adopted, ['client_id'])
+            ActionLog.objects.bulk_create(
+                action_logs,
+                update_conflicts=True,
+                unique_fields=['user', 'client_id'],
+                update_fields=ACTION_LOG_FIELDS,
+            )
+            DailyDiary.objects.bulk_create(
+                diaries,
+                update_conflicts=True,
+                unique_fields=['user', 'client_id'],
+                update_fields=DIARY_FIELDS + DailyDiary.TEXT_FEATURE_FIELDS + ['updated_at'],
+            )
+    except IntegrityError:
+        # 同じバッチ内で日記の日付を入れ替えた場合など
+        return None, {'batch': ['日記の日付が重複しています。']}
+
+    # bulk_create はシグナルを発行しないため、集計キューブ・活動カレンダー・入力補完・ランキング・行動時間の分布・
+    # 変更履歴への反映を明示的に行う
+    cube.mark_dirty(
+        *[log.date for log in action_logs], *old_action_dates.values(),
+        *[diary.date for diary in diaries], *old_diary_dates.values(),
+    )
+    heatmap.invalidate(user.pk)
+    if action_logs:
+        autocomplete.invalidate(user.pk)
+        leaderboard.refresh(user.pk, [
+            (log.category_id, log.date) for log in action_logs
+        ] + [(category_id, day) for category_id, day, _ in old_actions.values()])
+        durations.record(
+            user.pk,
+            added=[(log.category_id, log.date, log.duration_minutes) for log in action_logs],
+            removed=old_actions.values(),
+        )
+    changes.record(ActionLog, [(log.pk, user.pk) for log in action_logs])
+    changes.record(DailyDiary, [(diary.pk, user.pk) for diary in diaries])
+
+    return {
+        'action_logs': _results(action_logs, old_action_dates),
+        'diaries': _results(diaries, old_diary_dates),
+    }, {}
+
+
+def _entries(payload, key, errors):
+    entries = payload.get(key, [])
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        errors[key] = ['オブジェクトのリストを指定してください。']
+        return []
+    if len(entries) > SYNC_MAX_ENTRIES:
+        errors[key] = [f'1回の同期は{SYNC_MAX_ENTRIES}件までです。']
+        return []
+    return entries
+
+
+def _saved_values(model, user, entries, fields):
+    """
+    同じ client_id で保存済みの行の、受け付ける項目の値（client_id → {属性名: 値}）
+    """
+    client_id_field = model._meta.get_field('client_id')
+    client_ids = []
+    for entry in entries:
+        try:
+            client_ids.append(client_id_field.to_python(entry.get('client_id')))
+        except ValidationError:
+            continue  # 項目ごとの入力チェックでエラーにする
+    attnames = [model._meta.get_field(field).attname for field in fields]
+    return {
+        row.pop('client_id'): row
+        for row in model.objects.filter(
+            user=user, client_id__in=[client_id for client_id in client_ids if client_id is not None]
+        ).values('client_id', *attnames)
+    }
+
+
+def _build(model, user, entries, fields, key, errors):
+    """
+    各項目からモデルを作り、項目ごとの入力チェックを行う（外部キー・一意性はまとめて確認）。
+    保存済みの client_id の項目は、保存済みの値に送られた項目だけを重ねる。
+    (元の項目番号, モデル) のリストを返す。
+    """
+    saved = _saved_values(model, user, entries, fields)
+    client_id_field = model._meta.get_field('client_id')
+    objects = []
+    seen = set()
+    for i, entry in enumerate(entries):
+        try:
+            values = saved.get(client_id_field.to_python(entry.get('client_id')), {})
+        except ValidationError:
+            values = {}
+        obj = model(user=user, client_id=entry.get('client_id'), **values)
+        for field in fields:
+            if field in entry:
+                setattr(obj, f'{field}_id' if field == 'category' else field, entry[field])
+        try:
+            obj.full_clean(exclude=['user', 'category'], validate_unique=False, validate_constraints=False)
+            if obj.client_id is None:
+                raise ValidationError({'client_id': ['端末側IDを指定してください。']})
+            if obj.client_id in seen:
+                raise ValidationError({'client_id': ['同じ端末側IDが重複しています。']})
+        except ValidationError as e:
+            errors[f'{key}[{i}]'] = e.message_dict
+            continue
+        seen.add(obj.client_id)
+        objects.append((i, obj))
+    return objects
+
+
+def _validate_action_logs(user, entries, errors):
+    action_logs = _build(ActionLog, user, entries, ACTION_LOG_FIELDS, 'action_logs', errors)
+
+    # アーカイブ済みの期間の行は更新できない（ホットテーブルにない）
+    last_archived = archive.archived_until('actionlog')
+    for i, log in action_logs:
+        category = categories.get(log.category_id) if str(log.category_id).isdigit() else None
+        if category is None:
+            errors[f'action_logs[{i}]'] = {'category': ['存在しないカテゴリです。']}
+        elif last_archived and log.date <= last_archived:
+            errors[f'action_logs[{i}]'] = {'date': ['アーカイブ済みの期間の記録は同期できません。']}
+        else:
+            log.category_id = category.pk
+    return [log for _, log in action_logs]
+
+
+def _validate_diaries(user, entries, errors):
+    """
+    日記は1ユーザー1日1件のため、端末側IDと日付の両方で既存の日記を確認する。
+    (日記のリスト, 端末側IDを引き継ぐ既存の日記のリスト) を返す。
+    """
+    diaries = _build(DailyDiary, user, entries, DIARY_FIELDS, 'diaries', errors)
+    # bulk_create は save() を通らないため、本文の特徴量をここで計算する
+    for _, diary in diaries:
+        diary.apply_text_features()
+
+    existing = DailyDiary.objects.filter(user=user).filter(
+        Q(client_id__in=[diary.client_id for _, diary in diaries])
+        | Q(date__in=[diary.date for _, diary in diaries])
+    ).only('id', 'client_id', 'date')
+    by_client_id = {diary.client_id: diary for diary in existing if diary.client_id}
+    by_date = {diary.date: diary for diary in existing}
+
+    adopted = []
+    dates = set()
+    for i, diary in diaries:
+        current = by_client_id.get(diary.client_id)
+        other = by_date.get(diary.date)
+        if diary.date in dates or (other is not None and current is not None and other.pk != current.pk):
+            errors[f'diaries[{i}]'] = {'date': ['この日付の日記は既に存在します。']}
+        elif other is not None and current is None:
+            other.client_id = diary.client_id
+            adopted.append(other)
+        dates.add(diary.date)
+    return [diary for _, diary in diaries], adopted
+
+
+def _results(objects, old_dates):
+    return [
+        {
+            'client_id': str(obj.client_id),
+            'id': obj.pk,
+            'status': 'updated' if obj.client_id in old_dates else 'created',
+        }
+        for obj in objects
+    ]
@@ -0,0 +1,73 @@
+from datetime import date
+from django.contrib.auth.models import User
+from . import archive, cube, rules, shards, snapshot
+from .jobs import task
+from .reports import PeriodReportEngine
+from .services import AIHabitCoach
+
+# =====================
+# バックグラウンドで実行できる処理（ジョブ）
+# =====================
+
+@task('daily_recommendation')
+def daily_recommendation(user_id, date_iso):
+    """
+    ユーザー1人分の今日のAI提案を生成
+    """
+    with shards.for_user(user_id):
+        recommendation = AIHabitCoach(User.objects.get(pk=user_id)).generate_daily_recommendation(
+            date.fromisoformat(date_iso)
+        )
+    return {'recommendation_id': recommendation.pk if recommendation else None}
+
+
+@task('period_report')
+def period_report(user_id, date_iso):
+    """
+    ユーザー1人分の振り返りレポートを生成（作成日でなければ何もしない）
+    """
+    with shards.for_user(user_id):
+        report = AIHabitCoach(User.objects.get(pk=user_id)).generate_period_report(
+            date.fromisoformat(date_iso)
+        )
+    return {'recommendation_id': report.pk if report else None}
+
+
+@task('generate_recommendations')
+def generate_recommendations(date_iso):
+    """
+    全ユーザーの日次提案を一括生成
+    """
+    return {'created': len(rules.generate_daily_recommendations(date.fromisoformat(date_iso)))}
+
+
+@task('generate_reports')
+def generate_reports(date_iso):
+    """
+    対象日に作成予定の振り返りレポートを一括生成
+    """
+    return {'created': len(PeriodReportEngine(date.fromisoformat(date_iso)).generate_due_reports())}
+
+
+@task('refresh_cube')
+def refresh_cube():
+    """
+    集計キューブの再集計
+    """
+    return {'days': cube.refresh()}
+
+
+@task('archive_old_data')
+def archive_old_data():
+    """
+    保存期間を過ぎた行動ログ・AI提案のアーカイブ
+    """
+    return archive.archive_old_rows()
+
+
+@task('refresh_snapshot')
+def refresh_snapshot():
+    """
+    分析用の読み取り専用スナップショットの作り直し
+    """
+    return {'seconds': snapshot.refresh()}
@@ -1,3 +1,669 @@
-from django.test import TestCase
+from datetime import date, timedelta
+import tempfile
+import time
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from . import archive, autocomplete, cube, jobs, reports, shards, singleflight, sync
+from .versioncache import cache
+from .models import (
+    DailyDiary, ActionLog, Goal, AIRecommendation, UserProfile, HabitCategory,
+    ArchiveSegment, ChangeLog, CubeDirtyDay, DurationBucket, Job, Lease,
+    CategoryDailyStat, PlatformDailyStat, RecommendationDailyStat
+)
 
-# Create your tests here.
+
+# キャッシュ（活動カレンダー・入力補完のバージョンなど）は、開発環境のファイルではなくメモリに置く
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ('default', 'versions')
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AllShardsTestCase(TransactionTestCase):
+    """
+    全シャード（SHARD_COUNT=2 以上で実行した場合）を読み書きするテスト。
+    シャードの接続は default を ATTACH して読むため、各操作を実際にコミットする。
+    """
+    databases = '__all__'
+
+
+# =====================
+# アーカイブと集計キューブ
+# =====================
+class ArchiveCubeTests(AllShardsTestCase):
+    """
+    アーカイブした日付が再集計されても、アーカイブへ移した行の分が集計から消えないこと
+    """
+
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings_override = override_settings(ARCHIVE_DIR=archive_dir.name, ARCHIVE_HORIZON_DAYS=90)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('archived', password='pass')
+        self.category = HabitCategory.objects.create(name='運動')
+        self.day = date.today() - timedelta(days=120)
+        with shards.for_user(self.user.pk):
+            for minutes in (5, 10, 15):
+                ActionLog.objects.create(
+                    user=self.user, category=self.category, action_name='散歩',
+                    duration_minutes=minutes, date=self.day,
+                )
+            AIRecommendation.objects.create(
+                user=self.user, date=self.day, recommendation_type='daily',
+                title='提案', content='内容', feedback_rating=4,
+            )
+
+    def assertCube(self, actions, minutes, recommendations):
+        stat = CategoryDailyStat.objects.get(date=self.day, category=self.category)
+        self.assertEqual((stat.total_actions, stat.total_minutes), (actions, minutes))
+        self.assertEqual(PlatformDailyStat.objects.get(date=self.day).action_users, 1)
+        rating = RecommendationDailyStat.objects.get(date=self.day, recommendation_type='daily')
+        self.assertEqual((rating.recommendations, rating.rated, rating.rating_sum), (recommendations, 1, 4))
+
+    def test_new_log_on_archived_day_keeps_archived_totals(self):
+        cube.refresh()
+        self.assertCube(3, 30, 1)
+
+        moved = archive.archive_old_rows()
+        self.assertEqual(moved, {'actionlog': 3, 'airecommendation': 1})
+        with shards.for_user(self.user.pk):
+            self.assertFalse(ActionLog.objects.filter(date=self.day).exists())
+        self.assertCube(3, 30, 1)
+
+        with shards.for_user(self.user.pk):
+            ActionLog.objects.create(
+                user=self.user, category=self.category, action_name='散歩',
+                duration_minutes=5, date=self.day,
+            )
+        cube.refresh()
+        self.assertCube(4, 35, 1)
+
+    def test_mark_all_dirty_includes_archived_days(self):
+        archive.archive_old_rows()
+        cube.mark_all_dirty()
+        self.assertEqual(cube.refresh(), 1)
+        self.assertCube(3, 30, 1)
+
+
+# =====================
+# シャーディング
+# =====================
+@override_settings(SHARD_DATABASES=['default', 'shard1'])
+class ShardRouterTests(SimpleTestCase):
+    """
+    ShardRouter がユーザー別データをユーザーのシャードへ、共有テーブルを default へ振り分けること
+    （DBに接続しない判定だけを見る）
+    """
+
+    def setUp(self):
+        self.router = shards.ShardRouter()
+
+    def test_sharded_models_follow_user_id(self):
+        for model in shards.sharded_models():
+            if model._meta.auto_created:
+                continue
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.router.db_for_write(model, instance=model(user_id=3)), 'shard1')
+                self.assertEqual(self.router.db_for_write(model, instance=model(user_id=4)), 'default')
+                self.assertEqual(self.router.db_for_read(model, instance=model(user_id=3)), 'shard1')
+
+    def test_user_instance_selects_its_shard(self):
+        self.assertEqual(self.router.db_for_read(ActionLog, instance=User(pk=5)), 'shard1')
+
+    def test_loaded_instance_stays_on_its_database(self):
+        log = ActionLog(user_id=4)
+        log._state.db = 'shard1'
+        self.assertEqual(self.router.db_for_write(ActionLog, instance=log), 'shard1')
+
+    def test_through_table_is_sharded(self):
+        through = UserProfile.preferred_categories.through
+        self.assertTrue(shards.is_sharded(through))
+        with shards.use('shard1'):
+            self.assertEqual(self.router.db_for_write(through), 'shard1')
+
+    def test_shared_tables_are_written_to_default(self):
+        with shards.use('shard1'):
+            for model in (User, HabitCategory, ChangeLog, CubeDirtyDay, DurationBucket):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(self.router.db_for_write(model), 'default')
+            # 読み込みは有効なシャードの接続から ATTACH 経由で行う
+            self.assertEqual(self.router.db_for_read(HabitCategory), 'shard1')
+        self.assertIsNone(self.router.db_for_read(ActionLog))
+
+    def test_only_sharded_tables_are_migrated_to_shards(self):
+        self.assertIsNone(self.router.allow_migrate('default', 'myapp', 'actionlog'))
+        self.assertTrue(self.router.allow_migrate('shard1', 'myapp', 'actionlog'))
+        self.assertTrue(self.router.allow_migrate('shard1', 'myapp', 'userprofile_preferred_categories'))
+        self.assertFalse(self.router.allow_migrate('shard1', 'myapp', 'changelog'))
+        self.assertFalse(self.router.allow_migrate('shard1', 'auth', 'user'))
+
+
+@skipUnless(len(shards.aliases()) > 1, 'シャードが1つの設定では実行しない（SHARD_COUNT=2 で実行）')
+class ShardTests(AllShardsTestCase):
+    """
+    シャードへの保存・採番・バッチでの切り替え・default への副作用の書き込み時機
+    """
+
+    def setUp(self):
+        for alias in shards.aliases():
+            shards.reserve_id_space(alias)
+        self.category = HabitCategory.objects.create(name='運動')
+        self.users = {}
+        while set(self.users) != set(shards.aliases()):
+            user = User.objects.create_user(f'user{User.objects.count()}', password='pass')
+            self.users.setdefault(shards.shard_for(user.pk), user)
+        self.alias = shards.aliases()[1]
+        self.user = self.users[self.alias]
+
+    def create_log(self, user, minutes=10, day=None):
+        # リクエスト中（ShardMiddleware）と同じく、ユーザーのシャードを有効にして保存する
+        with shards.for_user(user.pk):
+            return ActionLog.objects.create(
+                user=user, category=self.category, action_name='散歩',
+                duration_minutes=minutes, date=day or date.today(),
+            )
+
+    def test_each_sharded_model_is_saved_on_users_shard(self):
+        with shards.for_user(self.user.pk):
+            profile = UserProfile.objects.create(user=self.user)
+            profile.preferred_categories.add(self.category)
+            instances = [
+                profile,
+                Goal.objects.create(user=self.user, title='目標', description='詳細', category=self.category,
+                                    target_date=date.today()),
+                DailyDiary.objects.create(user=self.user, mood_score=5, energy_level=5, content='日記'),
+                self.create_log(self.user),
+                AIRecommendation.objects.create(user=self.user, recommendation_type='daily', title='提案'),
+            ]
+        for instance in instances:
+            model = type(instance)
+            with self.subTest(model=model.__name__):
+                self.assertEqual(instance._state.db, self.alias)
+                self.assertTrue(model.objects.using(self.alias).filter(pk=instance.pk).exists())
+                self.assertFalse(model.objects.using('default').filter(user=self.user).exists())
+        through = UserProfile.preferred_categories.through
+        self.assertEqual(through.objects.using(self.alias).filter(userprofile=profile).count(), 1)
+        self.assertFalse(through.objects.using('default').exists())
+        # 保存済みのインスタンスの更新は、シャードが有効でなくても読み込んだDBへ書く
+        instances[3].duration_minutes = 20
+        instances[3].save()
+        self.assertEqual(ActionLog.objects.using(self.alias).get(pk=instances[3].pk).duration_minutes, 20)
+        # ユーザーからの関連の取得もユーザーのシャードを読む
+        self.assertEqual(list(self.user.actionlog_set.values_list('pk', flat=True)), [instances[3].pk])
+
+    def test_ids_are_allocated_from_each_shards_id_space(self):
+        first = {}
+        for index, alias in enumerate(shards.aliases()):
+            first[alias] = self.create_log(self.users[alias])
+            with self.subTest(alias=alias):
+                self.assertGreaterEqual(first[alias].pk, index * shards.SHARD_ID_SPACE)
+                self.assertLess(first[alias].pk, (index + 1) * shards.SHARD_ID_SPACE)
+        # 採番位置を設定し直しても、既に進んだ位置は戻さない
+        shards.reserve_id_space(self.alias)
+        self.assertGreater(self.create_log(self.user).pk, first[self.alias].pk)
+
+    def test_use_switches_unscoped_queries_per_shard(self):
+        for index, (alias, user) in enumerate(self.users.items()):
+            self.create_log(user, day=date.today() - timedelta(days=index))
+        user_ids = {}
+        for alias in shards.aliases():
+            with shards.use(alias):
+                user_ids[alias] = list(ActionLog.objects.values_list('user_id', flat=True))
+        self.assertEqual(user_ids, {alias: [user.pk] for alias, user in self.users.items()})
+        self.assertIsNone(shards.current())
+
+        # シャードをまたぐバッチ（全シャードの日付を集めて再集計）
+        CubeDirtyDay.objects.all().delete()
+        cube.mark_all_dirty()
+        self.assertEqual(cube.refresh(), len(self.users))
+        self.assertEqual(PlatformDailyStat.objects.count(), len(self.users))
+
+    def test_side_effects_are_written_after_the_shard_commits(self):
+        with transaction.atomic(using=self.alias):
+            log = self.create_log(self.user)
+            # default の変更履歴・集計キューブ・分布は、シャードのコミットまで書かない
+            self.assertFalse(ChangeLog.objects.exists())
+            self.assertFalse(CubeDirtyDay.objects.exists())
+            self.assertFalse(DurationBucket.objects.exists())
+        self.assertEqual(ChangeLog.objects.get().object_id, log.pk)
+        self.assertEqual(list(CubeDirtyDay.objects.values_list('date', flat=True)), [log.date])
+        self.assertEqual(DurationBucket.objects.get().count, 1)
+
+    def test_side_effects_are_dropped_when_the_shard_rolls_back(self):
+        with self.assertRaises(RuntimeError), transaction.atomic(using=self.alias):
+            self.create_log(self.user)
+            raise RuntimeError
+        self.assertFalse(ActionLog.objects.using(self.alias).exists())
+        self.assertFalse(ChangeLog.objects.exists())
+        self.assertFalse(CubeDirtyDay.objects.exists())
+        self.assertFalse(DurationBucket.objects.exists())
+
+
+# =====================
+# オフライン端末からの一括同期
+# =====================
+class SyncBatchTests(AllShardsTestCase):
+    """
+    同じバッチの再送で行が増えず、副作用（変更履歴・集計キューブ・行動時間の分布）も1回分だけ反映されること
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('syncer', password='pass')
+        self.category = HabitCategory.objects.create(name='学習')
+        self.day = date.today() - timedelta(days=1)
+        self.log_id = '6f1c2d0e-8a43-4b0e-9d55-0c2a5b7e3f10'
+        self.diary_id = '0b9f4e7a-1c2d-4e3f-8a5b-6c7d8e9f0a1b'
+        self.batch = {
+            'action_logs': [{
+                'client_id': self.log_id, 'category': self.category.pk, 'action_name': '読書',
+                'duration_minutes': 30, 'completed': True, 'notes': 'メモ', 'date': self.day.isoformat(),
+            }],
+            'diaries': [{
+                'client_id': self.diary_id, 'date': self.day.isoformat(), 'mood_score': 7,
+                'energy_level': 6, 'content': '今日は良い日だった', 'gratitude': '',
+            }],
+        }
+
+    def sync(self, payload):
+        # リクエスト中（ShardMiddleware）と同じく、ユーザーのシャードを有効にして同期する
+        with shards.for_user(self.user.pk):
+            return sync.sync_batch(self.user, payload)
+
+    def rows(self, model):
+        with shards.for_user(self.user.pk):
+            return list(model.objects.filter(user=self.user))
+
+    def test_replayed_batch_does_not_duplicate_rows_or_side_effects(self):
+        first, errors = self.sync(self.batch)
+        self.assertEqual(errors, {})
+        self.assertEqual([result['status'] for result in first['action_logs'] + first['diaries']], ['created'] * 2)
+
+        second, errors = self.sync(self.batch)
+        self.assertEqual(errors, {})
+        self.assertEqual([result['status'] for result in second['action_logs'] + second['diaries']], ['updated'] * 2)
+        self.assertEqual(second['action_logs'][0]['id'], first['action_logs'][0]['id'])
+
+        self.assertEqual(len(self.rows(ActionLog)), 1)
+        self.assertEqual(len(self.rows(DailyDiary)), 1)
+        self.assertEqual(
+            sorted(ChangeLog.objects.values_list('model_name', 'object_id')),
+            sorted([('actionlog', first['action_logs'][0]['id']), ('dailydiary', first['diaries'][0]['id'])]),
+        )
+        self.assertEqual(list(CubeDirtyDay.objects.values_list('date', flat=True)), [self.day])
+        self.assertEqual(
+            list(DurationBucket.objects.filter(user=self.user).values_list('category_id', 'count')),
+            [(self.category.pk, 1)],
+        )
+
+    def test_omitted_fields_keep_their_saved_values_on_update(self):
+        self.sync(self.batch)
+        results, errors = self.sync({
+            'action_logs': [{'client_id': self.log_id, 'completed': False}],
+            'diaries': [{'client_id': self.diary_id, 'mood_score': 3}],
+        })
+        self.assertEqual(errors, {})
+        log, = self.rows(ActionLog)
+        self.assertEqual(
+            (log.action_name, log.duration_minutes, log.completed, log.notes, log.date),
+            ('読書', 30, False, 'メモ', self.day),
+        )
+        diary, = self.rows(DailyDiary)
+        self.assertEqual((diary.mood_score, diary.content, diary.date), (3, '今日は良い日だった', self.day))
+        self.assertEqual(DurationBucket.objects.get(user=self.user).count, 1)
+
+    def test_logs_on_or_before_the_archive_cutoff_are_rejected(self):
+        ArchiveSegment.objects.create(
+            model_name='actionlog', month=self.day.replace(day=1), path='actionlog/test.jsonl.gz',
+            min_date=self.day - timedelta(days=1), max_date=self.day, row_count=1,
+        )
+        results, errors = self.sync(self.batch)
+        self.assertIsNone(results)
+        self.assertEqual(errors, {'action_logs[0]': {'date': ['アーカイブ済みの期間の記録は同期できません。']}})
+        # エラーが1件でもあれば、日記も含めて何も保存しない
+        self.assertEqual(self.rows(ActionLog), [])
+        self.assertEqual(self.rows(DailyDiary), [])
+        self.assertFalse(ChangeLog.objects.exists())
+        self.assertFalse(DurationBucket.objects.exists())
+
+        self.batch['action_logs'][0]['date'] = (self.day + timedelta(days=1)).isoformat()
+        results, errors = self.sync(self.batch)
+        self.assertEqual(errors, {})
+        self.assertEqual(len(self.rows(ActionLog)), 1)
+
+
+# =====================
+# バックグラウンドジョブ
+# =====================
+def register_task(test, name, func):
+    jobs.task(name)(func)
+    test.addCleanup(jobs.TASKS.pop, name)
+
+
+class JobQueueTests(TestCase):
+    """
+    取り出しの排他・再試行の待ち時間・落ちたワーカーのジョブの取り直し
+    """
+
+    def setUp(self):
+        self.calls = []
+
+        def flaky():
+            self.calls.append(len(self.calls) + 1)
+            raise RuntimeError('失敗')
+
+        register_task(self, 'test_flaky', flaky)
+        register_task(self, 'test_echo', lambda value: value)
+
+    def test_job_is_claimed_by_one_worker(self):
+        job = jobs.enqueue('test_echo', value=1)
+        now = timezone.now()
+        self.assertEqual(jobs.claim('w1', now).pk, job.pk)
+        self.assertIsNone(jobs.claim('w2', now))
+
+    def test_claim_lost_to_another_worker_is_skipped(self):
+        job = jobs.enqueue('test_echo', value=1)
+        now = timezone.now()
+        update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **kwargs):
+            # w1 が候補を選んでから UPDATE するまでの間に、w2 が同じジョブを取り出す
+            if queryset.model is Job and not raced:
+                raced.append(True)
+                raced.append(jobs.claim('w2', now))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', racing_update):
+            self.assertIsNone(jobs.claim('w1', now))
+        self.assertEqual(raced[1].pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), ('running', 'w2', 1))
+
+    def test_failed_job_is_retried_with_backoff_then_fails(self):
+        job = jobs.enqueue('test_flaky', max_attempts=3)
+        now = timezone.now()
+        for attempt, delay in ((1, jobs.JOB_RETRY_DELAY), (2, jobs.JOB_RETRY_DELAY * 2)):
+            claimed = jobs.claim('w1', now)
+            self.assertEqual((claimed.pk, claimed.attempts), (job.pk, attempt))
+            jobs.execute(claimed)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'queued')
+            self.assertEqual(job.run_at - job.updated_at, timedelta(seconds=delay))
+            self.assertIn('RuntimeError', job.last_error)
+            # 待ち時間が過ぎるまでは取り出さない
+            self.assertIsNone(jobs.claim('w1', job.run_at - timedelta(seconds=1)))
+            now = job.run_at
+
+        jobs.execute(jobs.claim('w1', now))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, self.calls), ('failed', 3, [1, 2, 3]))
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(jobs.claim('w1', now + timedelta(days=1)))
+
+    def test_job_of_a_dead_worker_is_reclaimed_after_the_lock_timeout(self):
+        job = jobs.enqueue('test_echo', value=2, max_attempts=2)
+        now = timezone.now()
+        jobs.claim('w1', now)
+        self.assertIsNone(jobs.claim('w2', now + timedelta(seconds=jobs.JOB_LOCK_TIMEOUT - 1)))
+        reclaimed = jobs.claim('w2', now + timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 1))
+        self.assertEqual((reclaimed.pk, reclaimed.locked_by, reclaimed.attempts), (job.pk, 'w2', 2))
+        jobs.execute(reclaimed)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('succeeded', 2))
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    """
+    実行中のジョブの locked_at が別スレッドで更新され、JOB_LOCK_TIMEOUT を過ぎても取り直されないこと
+    （別スレッドの接続から書き込むため、各操作を実際にコミットする）
+    """
+
+    def test_running_job_keeps_its_lock(self):
+        other_claims = []
+
+        def long_running():
+            # 最後の更新から JOB_LOCK_TIMEOUT より長く経ったことにして、ハートビートを待つ
+            Job.objects.filter(name='test_long').update(
+                locked_at=timezone.now() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT * 2)
+            )
+            time.sleep(jobs.JOB_HEARTBEAT_INTERVAL * 6)
+            other_claims.append(jobs.claim('w2'))
+            return 'done'
+
+        register_task(self, 'test_long', long_running)
+        job = jobs.enqueue('test_long')
+        with mock.patch.object(jobs, 'JOB_HEARTBEAT_INTERVAL', 0.05):
+            self.assertTrue(jobs.Worker('w1').run_once())
+
+        self.assertEqual(other_claims, [None])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts, job.result), ('succeeded', 'w1', 1, 'done'))
+
+
+# =====================
+# シングルフライト
+# =====================
+class SingleFlightTests(TestCase):
+    """
+    実行した結果が「なし」のとき、待っている実行者が期限まで待たずに None を返すこと
+    """
+    key = 'recommendation:1:2025-01-01:daily_goal'
+
+    def setUp(self):
+        self.computed = []
+
+    def compute_nothing(self):
+        self.computed.append(True)
+        return None
+
+    def test_no_result_is_shared_with_later_callers(self):
+        self.assertIsNone(singleflight.single_flight(self.key, lambda: None, self.compute_nothing))
+        self.assertIsNone(singleflight.single_flight(self.key, lambda: None, self.compute_nothing))
+        self.assertEqual(len(self.computed), 1)
+
+        # 印の期限が過ぎたら、もう一度実行する
+        Lease.objects.filter(key=self.key).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(singleflight.single_flight(self.key, lambda: None, self.compute_nothing))
+        self.assertEqual(len(self.computed), 2)
+
+    def test_waiter_returns_as_soon_as_the_leader_finds_no_result(self):
+        # 他のプロセスが実行中で、待っている間にその実行が結果なしで終わる
+        Lease.objects.create(key=self.key, owner='other', expires_at=timezone.now() + timedelta(seconds=60))
+
+        def leader_finishes(seconds):
+            singleflight.mark_no_result(self.key, 'other')
+
+        started = time.monotonic()
+        with mock.patch.object(singleflight.time, 'sleep', side_effect=leader_finishes) as sleep:
+            self.assertIsNone(singleflight.single_flight(self.key, lambda: None, self.compute_nothing, timeout=30))
+        self.assertEqual(sleep.call_count, 1)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.computed, [])
+
+    def test_result_is_computed_once_and_lease_released(self):
+        saved = []
+
+        def compute():
+            saved.append('提案')
+            return '提案'
+
+        self.assertEqual(singleflight.single_flight(self.key, lambda: saved[0] if saved else None, compute), '提案')
+        self.assertEqual(singleflight.single_flight(self.key, lambda: saved[0] if saved else None, compute), '提案')
+        self.assertEqual(saved, ['提案'])
+        self.assertFalse(Lease.objects.exists())
+
+
+# =====================
+# 行動名の入力補完
+# =====================
+class ActionNameSuggestionTests(AllShardsTestCase):
+    """
+    行動ログの作成はインデックスへ差分で追加し、編集・削除・他のプロセスでの変更では作り直すこと
+    """
+
+    def setUp(self):
+        autocomplete._indexes.clear()
+        self.addCleanup(autocomplete._indexes.clear)
+        self.user = User.objects.create_user('typist', password='pass')
+        self.walk = HabitCategory.objects.create(name='運動')
+        self.study = HabitCategory.objects.create(name='学習')
+        self.create_log('散歩', self.walk)
+        self.create_log('散歩', self.walk)
+        self.create_log('数学', self.study)
+
+    def create_log(self, action_name, category, day=None):
+        with shards.for_user(self.user.pk):
+            return ActionLog.objects.create(
+                user=self.user, category=category, action_name=action_name,
+                duration_minutes=10, date=day or date.today(),
+            )
+
+    def names(self, prefix='', category_id=None):
+        return [
+            (item['action_name'], item['count'])
+            for item in autocomplete.suggest(self.user.pk, prefix, category_id)
+        ]
+
+    def test_suggestions_are_prefix_matches_in_rank_order(self):
+        self.assertEqual(self.names(), [('散歩', 2), ('数学', 1)])
+        self.assertEqual(self.names('散'), [('散歩', 2)])
+        self.assertEqual(self.names('', self.study.pk), [('数学', 1)])
+
+    def test_record_adds_to_the_index_without_rebuilding(self):
+        self.names()
+        index = autocomplete._indexes[self.user.pk]
+        self.create_log('ストレッチ', self.walk)
+        self.assertIs(autocomplete._indexes[self.user.pk], index)
+        self.assertEqual(index.version, cache.get(autocomplete._version_key(self.user.pk)))
+        self.assertEqual(self.names('ス'), [('ストレッチ', 1)])
+
+    def test_record_drops_an_index_that_missed_another_process_change(self):
+        self.names()
+        # 他のプロセスで変更があった（バージョンが進んだ）が、まだ確認していない
+        cache.set(autocomplete._version_key(self.user.pk), 1, None)
+        self.create_log('ストレッチ', self.walk)
+        self.assertNotIn(self.user.pk, autocomplete._indexes)
+        self.assertEqual(self.names('ス'), [('ストレッチ', 1)])
+
+    def test_invalidate_rebuilds_after_edit_and_delete(self):
+        self.names()
+        with shards.for_user(self.user.pk):
+            log = ActionLog.objects.get(action_name='数学')
+            log.action_name = '英語'
+            log.save()
+        self.assertNotIn(self.user.pk, autocomplete._indexes)
+        self.assertEqual(self.names(), [('散歩', 2), ('英語', 1)])
+
+        with shards.for_user(self.user.pk):
+            ActionLog.objects.filter(action_name='英語').first().delete()
+        self.assertEqual(self.names(), [('散歩', 2)])
+
+    def test_other_process_changes_are_picked_up_after_check_interval(self):
+        self.names()
+        # 他のプロセスで削除された（シグナルはこのプロセスに届かない）
+        with shards.for_user(self.user.pk), mock.patch.object(autocomplete, 'invalidate'):
+            ActionLog.objects.filter(action_name='数学').delete()
+        cache.set(autocomplete._version_key(self.user.pk), 1, None)
+        self.assertEqual(self.names(), [('散歩', 2), ('数学', 1)])  # 確認間隔内は手元のインデックス
+        autocomplete._indexes[self.user.pk].checked_at -= autocomplete.CHECK_INTERVAL
+        self.assertEqual(self.names(), [('散歩', 2)])
+
+    def test_api_reports_errors_under_the_bad_parameter(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/action-names/', {'q': '散', 'category': 'x', 'limit': '0'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'category', 'limit'})
+        response = self.client.get('/api/action-names/', {'q': '散', 'limit': 'abc'})
+        self.assertEqual(set(response.json()['errors']), {'limit'})
+        response = self.client.get('/api/action-names/', {'q': '散', 'category': str(self.walk.pk)})
+        self.assertEqual([item['action_name'] for item in response.json()['suggestions']], ['散歩'])
+
+
+# =====================
+# 期間レポート
+# =====================
+class ReportPeriodTests(SimpleTestCase):
+    """
+    ai_feedback_frequency の各選択肢が、正しい集計期間・作成日に対応すること
+    """
+    sunday = date(2025, 10, 12)  # BIWEEKLY_ANCHOR から2週間ごとの日曜
+
+    def test_every_frequency_choice_has_a_report_period(self):
+        frequencies = [value for value, _ in UserProfile._meta.get_field('ai_feedback_frequency').choices]
+        self.assertEqual(sorted(frequencies), sorted(reports.PERIOD_LABELS))
+        for frequency in frequencies:
+            with self.subTest(frequency=frequency):
+                reports.period_range(frequency, self.sunday)
+
+    def test_period_ranges(self):
+        expected = {
+            'daily': (date(2025, 10, 11), date(2025, 10, 12)),
+            'weekly': (date(2025, 10, 5), date(2025, 10, 12)),
+            'biweekly': (date(2025, 9, 28), date(2025, 10, 12)),
+            'monthly': (date(2025, 9, 1), date(2025, 10, 1)),
+        }
+        for frequency, period in expected.items():
+            with self.subTest(frequency=frequency):
+                self.assertEqual(reports.period_range(frequency, self.sunday), period)
+
+    def test_due_dates(self):
+        days = [self.sunday + timedelta(days=i) for i in range(-14, 29)]
+        due = {
+            frequency: [day for day in days if reports.is_due(frequency, day)]
+            for frequency in reports.PERIOD_LABELS
+        }
+        self.assertEqual(due['daily'], days)
+        self.assertEqual(due['weekly'], [self.sunday + timedelta(weeks=i) for i in range(-2, 5)])
+        self.assertEqual(due['biweekly'], [self.sunday + timedelta(weeks=i) for i in (-2, 0, 2, 4)])
+        self.assertEqual(due['monthly'], [date(2025, 10, 1), date(2025, 11, 1)])
+
+    def test_unknown_frequency_is_never_treated_as_daily(self):
+        self.assertFalse(reports.is_due('hourly', self.sunday))
+        with self.assertRaises(ValueError):
+            reports.period_range('hourly', self.sunday)
+
+
+class DueReportTests(AllShardsTestCase):
+    """
+    作成日を迎えたユーザーにだけ、その頻度の期間の行動を集計したレポートを作ること
+    """
+    log_dates = [date(2025, 10, 14), date(2025, 10, 11), date(2025, 10, 7), date(2025, 10, 2), date(2025, 9, 22)]
+
+    def setUp(self):
+        category = HabitCategory.objects.create(name='運動')
+        self.users = {}
+        for frequency in reports.PERIOD_LABELS:
+            user = User.objects.create_user(f'{frequency}-user', password='pass')
+            with shards.for_user(user.pk):
+                UserProfile.objects.create(user=user, ai_feedback_frequency=frequency)
+                for day in self.log_dates:
+                    ActionLog.objects.create(
+                        user=user, category=category, action_name='散歩', duration_minutes=10, date=day,
+                    )
+            self.users[frequency] = user
+
+    def generate(self, target_date):
+        reports.PeriodReportEngine(target_date).generate_due_reports()
+        totals = {}
+        for frequency, user in self.users.items():
+            with shards.for_user(user.pk):
+                report = AIRecommendation.objects.filter(
+                    user=user, date=target_date, recommendation_type='reflection'
+                ).first()
+            if report is not None:
+                self.assertTrue(report.reasoning.startswith(f"{reports.PERIOD_LABELS[frequency]['kind']}データ分析"))
+                totals[frequency] = report.params['total_actions']
+        return totals
+
+    def test_reports_cover_each_frequencys_period(self):
+        self.assertEqual(self.generate(date(2025, 10, 12)), {'daily': 1, 'weekly': 2, 'biweekly': 3})
+        self.assertEqual(self.generate(date(2025, 10, 19)), {'daily': 0, 'weekly': 1})
+        self.assertEqual(self.generate(date(2025, 11, 1)), {'daily': 0, 'monthly': 4})
@@ -10,6 +10,7 @@ app_name = 'myapp'
 urlpatterns = [
     # ダッシュボード（トップページ）
     path('', views.dashboard, name='dashboard'),
+    path('dashboard/fragments/<str:name>/', views.dashboard_fragment, name='dashboard_fragment'),  # セクションの部分更新
     
     # 日記関連
     path('diary/', views.diary_list, name='diary_list'),  # 日記一覧
@@ -33,6 +34,25 @@ urlpatterns = [
     # 分析・統計
     path('analytics/', views.analytics, name='analytics'),  # 分析・統計ページ
     
+    # 習慣ランキング
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    
+    # 運営向け全体分析（JSON）
+    path('api/cohort-analytics/', views.cohort_analytics_api, name='cohort_analytics_api'),
+    
+    # オフライン端末からの一括同期（JSON）
+    path('api/sync/', views.sync_api, name='sync_api'),
+    path('api/changes/', views.changes_api, name='changes_api'),  # 前回以降の変更の取得
+    
+    # 行動名の入力補完（JSON）
+    path('api/action-names/', views.action_name_suggestions_api, name='action_name_suggestions_api'),
+    
+    # バックグラウンドジョブの状態（JSON）
+    path('api/jobs/<int:job_id>/', views.job_status_api, name='job_status_api'),
+    
+    # 運用監視用のメトリクス（Prometheus 形式）
+    path('metrics', views.metrics_view, name='metrics'),
+    
     # プロフィール
     path('profile/', views.profile, name='profile'),  # プロフィール設定
 ]
@@ -0,0 +1,11 @@
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+# =====================
+# 期限なしで共有するキーのキャッシュ
+# =====================
+#
+# プロセス内のインデックス・レジストリを作り直す合図のバージョン（入力補完・活動カレンダー・カテゴリ・ランキング）と、
+# リマインダーの前回の実行時刻を置く。件数が上限を超えると無作為に間引かれる default に置くと、
+# 消えたバージョンのために全プロセスが作り直すことになるため、間引かない CACHES['versions'] に分ける。
+cache = ConnectionProxy(caches, 'versions')
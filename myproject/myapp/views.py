@@ -1,15 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.db.models import Q, Count, Sum, Avg, IntegerField
-from datetime import date, timedelta
+from collections import Counter
+from datetime import date, time, timedelta
+import hmac
+import json
 from .models import (
     DailyDiary, ActionLog, Goal, AIRecommendation, 
-    HabitCategory, UserProfile
+    UserProfile, Notification, Job, LeaderboardScore
 )
 from .services import AIHabitCoach
+from .reports import is_due
+from .feedback import record_feedback
+from . import archive, autocomplete, categories, changes, cube, durations, fragments, heatmap, jobs, leaderboard, metrics, snapshot, sync
 from .forms import DailyDiaryForm, ActionLogForm, GoalForm
 from django.db.models.functions import Cast
 # =====================
@@ -23,26 +33,17 @@ def dashboard(request):
     """
     today = date.today()
     
-    # 今日の日記を取得
-    today_diary = DailyDiary.objects.filter(
-        user=request.user, 
-        date=today
-    ).first()
-    
-    # 今日の行動ログを取得
-    today_actions = ActionLog.objects.filter(
-        user=request.user, 
-        date=today
-    ).order_by('-created_at')
-    
-    # 今日のAI提案（なければ生成）
     ai_coach = AIHabitCoach(request.user)
-    today_recommendation = ai_coach.generate_daily_recommendation(today)
-    
-    # 週次振り返り（日曜のみ）
-    weekly_reflection = None
-    if today.weekday() == 6:  # 日曜
-        weekly_reflection = ai_coach.generate_weekly_reflection(today)
+    pending_jobs = []
+    if jobs.is_async():
+        # 提案・レポートがまだなければワーカーに生成を依頼し、画面では準備中と表示
+        today_recommendation, period_report, pending_jobs = _request_coach_jobs(request.user, ai_coach, today)
+    else:
+        # 今日のAI提案（なければ生成）
+        today_recommendation = ai_coach.generate_daily_recommendation(today)
+        
+        # 振り返りレポート（プロフィールの提案頻度に従う）
+        period_report = ai_coach.generate_period_report(today)
     
     # 最近1週間分の日記（気分・エネルギー推移）
     past_week = today - timedelta(days=7)
@@ -52,32 +53,66 @@ def dashboard(request):
         date__lte=today
     ).order_by('date')
     
-    # 習慣カテゴリ別の行動統計
-    category_stats = ActionLog.objects.filter(
-        user=request.user,
-        date__gte=past_week,
-        date__lte=today
-    ).values('category__name').annotate(
-        total_actions=Count('id'),
-        completed_actions=Count('id', filter=Q(completed=True))
-    )
-    
     # モチベーションメッセージ（AIから）
     motivational_message = ai_coach.get_motivational_message()
     
+    # 未読のリマインダー（表示したら既読にする）
+    notifications = list(Notification.objects.filter(
+        user=request.user, date=today, read_at__isnull=True
+    ))
+    if notifications:
+        Notification.objects.filter(id__in=[n.id for n in notifications]).update(read_at=timezone.now())
+    
     context = {
-        'today_diary': today_diary,
-        'today_actions': today_actions,
+        # 部分更新できるセクション（今日の気分・行動ログ・カテゴリ別の行動統計）
+        **fragments.mood_context(request.user, today),
+        **fragments.actions_context(request.user, today),
+        **fragments.category_stats_context(request.user, today),
         'today_recommendation': today_recommendation,
-        'weekly_reflection': weekly_reflection,
+        'period_report': period_report,
         'recent_diaries': recent_diaries,
-        'category_stats': category_stats,
         'motivational_message': motivational_message,
+        'notifications': notifications,
+        'pending_jobs': pending_jobs,
+        'activity_heatmap': heatmap.activity_heatmap(request.user, today),
         'today': today,
     }
     
     return render(request, 'myapp/dashboard.html', context)
 
+@login_required
+def dashboard_fragment(request, name):
+    """
+    ダッシュボードの1セクションだけを描画して返す（部分更新用）
+    """
+    if name not in fragments.SECTIONS:
+        raise Http404
+    return HttpResponse(fragments.render_section(request, name))
+
+def _request_coach_jobs(user, ai_coach, today):
+    """
+    既存の今日の提案・振り返りレポートを返し、ないものは生成ジョブを登録する。
+    (今日の提案, 振り返りレポート, 登録したジョブのリスト) を返す。
+    """
+    existing = {
+        recommendation.recommendation_type: recommendation
+        for recommendation in AIRecommendation.objects.filter(
+            user=user, date=today, recommendation_type__in=['daily_goal', 'reflection']
+        )
+    }
+    pending_jobs = []
+    if 'daily_goal' not in existing:
+        pending_jobs.append(jobs.enqueue(
+            'daily_recommendation', key=f'daily_recommendation:{user.pk}:{today}',
+            user=user, user_id=user.pk, date_iso=today.isoformat()
+        ))
+    if 'reflection' not in existing and is_due(ai_coach.report_frequency(), today):
+        pending_jobs.append(jobs.enqueue(
+            'period_report', key=f'period_report:{user.pk}:{today}',
+            user=user, user_id=user.pk, date_iso=today.isoformat()
+        ))
+    return existing.get('daily_goal'), existing.get('reflection'), pending_jobs
+
 # =====================
 # 日記関連
 # =====================
@@ -122,8 +157,12 @@ def diary_create(request):
         form = DailyDiaryForm(request.POST, instance=diary)
         if form.is_valid():
             form.save()
+            if fragments.wants_fragments(request):
+                return fragments.fragments_response(request, ['mood'], today)
             messages.success(request, '日記を保存しました。')
             return redirect('myapp:dashboard')
+        if fragments.wants_fragments(request):
+            return JsonResponse({'errors': form.errors}, status=400)
     else:
         form = DailyDiaryForm(instance=diary)
     
@@ -149,7 +188,8 @@ def action_log_list(request):
     # カテゴリでフィルタ
     category_filter = request.GET.get('category')
     if category_filter:
-        actions = actions.filter(category__name=category_filter)
+        category = categories.get_by_name(category_filter)
+        actions = actions.filter(category_id=category.pk if category else None)
     
     # 日付でフィルタ
     date_filter = request.GET.get('date')
@@ -166,12 +206,10 @@ def action_log_list(request):
     )
 
     total_duration = qs.aggregate(total=Sum('duration_int'))['total'] or 0
-   
-    categories = HabitCategory.objects.all()
     
     return render(request, 'myapp/action_log_list.html', {
-        'actions': actions,
-        'categories': categories,
+        'actions': categories.attach(list(actions)),
+        'categories': categories.all_categories(),
         'total_duration': total_duration,
     })
 
@@ -186,8 +224,12 @@ def action_log_create(request):
             action = form.save(commit=False)
             action.user = request.user
             action.save()
+            if fragments.wants_fragments(request):
+                return fragments.fragments_response(request, ['actions', 'category_stats'])
             messages.success(request, '行動ログを記録しました。')
             return redirect('myapp:action_log_list')
+        if fragments.wants_fragments(request):
+            return JsonResponse({'errors': form.errors}, status=400)
     else:
         form = ActionLogForm(initial={'date': date.today()})
     
@@ -204,8 +246,12 @@ def action_log_edit(request, action_id):
         form = ActionLogForm(request.POST, instance=action)
         if form.is_valid():
             form.save()
+            if fragments.wants_fragments(request):
+                return fragments.fragments_response(request, ['actions', 'category_stats'])
             messages.success(request, '行動ログを更新しました。')
             return redirect('myapp:action_log_list')
+        if fragments.wants_fragments(request):
+            return JsonResponse({'errors': form.errors}, status=400)
     else:
         form = ActionLogForm(instance=action)
     
@@ -223,9 +269,9 @@ def goal_list(request):
     """
     目標一覧ページ。ユーザーの目標を新しい順で表示。
     """
-    goals = Goal.objects.filter(
+    goals = categories.attach(list(Goal.objects.filter(
         user=request.user
-    ).order_by('-created_at')
+    ).order_by('-created_at')))
     
     return render(request, 'myapp/goal_list.html', {'goals': goals})
 
@@ -294,6 +340,7 @@ def ai_recommendations(request):
 def ai_recommendation_detail(request, recommendation_id):
     """
     AI提案詳細ページ。評価・実装状況の更新も可能。
+    更新内容はアクション項目のランキングに使うフィードバック統計へ反映。
     """
     recommendation = get_object_or_404(
         AIRecommendation, 
@@ -302,12 +349,30 @@ def ai_recommendation_detail(request, recommendation_id):
     )
     
     if request.method == 'POST':
+        previous_rating = recommendation.feedback_rating
+        previous_implemented = recommendation.is_implemented
+        message = None
+        
         rating = request.POST.get('rating')
-        if rating and rating.isdigit():
+        if rating and rating.isdigit() and 1 <= int(rating) <= 5:
             recommendation.feedback_rating = int(rating)
+            message = 'フィードバックを送信しました。'
+        elif 'update_implementation' in request.POST:
+            recommendation.is_implemented = request.POST.get('is_implemented') == 'on'
+            message = '実装状況を更新しました。'
+        
+        if message:
             recommendation.save()
-            messages.success(request, 'フィードバックを送信しました。')
+            # 評価・実装状況を提案ランキングの統計に反映
+            record_feedback(recommendation, previous_rating, previous_implemented)
+            if fragments.wants_fragments(request):
+                # ダッシュボードに表示されるのは今日の日次提案だけ
+                is_today = recommendation.date == date.today() and recommendation.recommendation_type == 'daily_goal'
+                return fragments.fragments_response(request, ['recommendation'] if is_today else [])
+            messages.success(request, message)
             return redirect('myapp:ai_recommendation_detail', recommendation_id)
+        if fragments.wants_fragments(request):
+            return JsonResponse({'errors': {'rating': ['評価は1〜5で指定してください。']}}, status=400)
     
     return render(request, 'myapp/ai_recommendation_detail.html', {
         'recommendation': recommendation
@@ -316,15 +381,23 @@ def ai_recommendation_detail(request, recommendation_id):
 # =====================
 # 分析・統計ページ
 # =====================
+# 分析ページで選択できる集計期間（日数）
+ANALYTICS_PERIODS = [30, 90, 180, 365]
+
 @login_required
+@snapshot.reads_from_snapshot
 def analytics(request):
     """
     分析・統計ページ。気分・エネルギー・行動の推移やカテゴリ別統計を表示。
+    ?days= で集計期間を選択でき、アーカイブ済みの期間にかかる場合はアーカイブも含めて集計。
+    集計は分析用スナップショット（数分前までのデータ）から読む。
     """
     today = date.today()
-    past_month = today - timedelta(days=30)
+    days = request.GET.get('days', '30')
+    days = int(days) if days.isdigit() and int(days) in ANALYTICS_PERIODS else 30
+    past_month = today - timedelta(days=days)
     
-    # 直近30日分の日記・行動ログ
+    # 期間内の日記・行動ログ
     monthly_diaries = DailyDiary.objects.filter(
         user=request.user,
         date__gte=past_month,
@@ -343,43 +416,296 @@ def analytics(request):
         avg_energy=Avg('energy_level')
     ).order_by('date')
     
-    # カテゴリ別の行動統計
-    category_analytics = monthly_actions.values('category__name').annotate(
-        total_actions=Count('id'),
-        total_duration=Avg('duration_minutes'),
-        completion_rate=Count('id', filter=Q(completed=True)) * 100.0 / Count('id')
-    )
-    
-    # 週間ごとの習慣継続率
-    weekly_completion = []
-    for i in range(4):
-        week_start = today - timedelta(days=7 * (i + 1))
-        week_end = week_start + timedelta(days=6)
-        week_actions = monthly_actions.filter(
-            date__gte=week_start,
-            date__lte=week_end
+    includes_archive = archive.covers('actionlog', past_month)
+    if includes_archive:
+        # アーカイブ済みの行動ログも含めて集計
+        action_rows = archive.tiered_rows(
+            'actionlog', past_month, today, request.user,
+            fields=['category_id', 'duration_minutes', 'completed', 'date']
         )
-        total = week_actions.count()
-        completed = week_actions.filter(completed=True).count()
-        rate = (completed / total * 100) if total > 0 else 0
-        weekly_completion.append({
-            'week': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}",
-            'rate': rate,
-            'total': total
-        })
+        category_analytics, weekly_completion = _summarize_action_rows(action_rows, today)
+        total_actions = len(action_rows)
+    else:
+        # カテゴリ別の行動統計
+        category_analytics = list(monthly_actions.values('category__name').annotate(
+            total_actions=Count('id'),
+            avg_duration=Avg('duration_minutes'),
+            completion_rate=Count('id', filter=Q(completed=True)) * 100.0 / Count('id')
+        ))
+        
+        # 週間ごとの習慣継続率
+        weekly_completion = []
+        for i in range(4):
+            week_start = today - timedelta(days=7 * (i + 1))
+            week_end = week_start + timedelta(days=6)
+            week_actions = monthly_actions.filter(
+                date__gte=week_start,
+                date__lte=week_end
+            )
+            total = week_actions.count()
+            completed = week_actions.filter(completed=True).count()
+            rate = (completed / total * 100) if total > 0 else 0
+            weekly_completion.append({
+                'week': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}",
+                'rate': rate,
+                'total': total
+            })
+        total_actions = monthly_actions.count()
+    
+    # 日記のことば（保存時に計算済みの特徴量を集計するだけで、本文は読まない）
+    diary_words = monthly_diaries.aggregate(
+        positive=Sum('positive_hits'),
+        negative=Sum('negative_hits'),
+        sentiment=Avg('sentiment')
+    )
+    keyword_counts = Counter()
+    for keywords in monthly_diaries.values_list('keywords', flat=True):
+        keyword_counts.update(keywords)
+    diary_words['keywords'] = [keyword for keyword, _ in keyword_counts.most_common(10)]
     
     context = {
         'mood_trend': list(mood_trend),
-        'category_analytics': list(category_analytics),
+        'category_analytics': category_analytics,
         'weekly_completion': weekly_completion,
         'total_diaries': monthly_diaries.count(),
-        'total_actions': monthly_actions.count(),
+        'total_actions': total_actions,
         'avg_mood': monthly_diaries.aggregate(avg=Avg('mood_score'))['avg'] or 0,
         'avg_energy': monthly_diaries.aggregate(avg=Avg('energy_level'))['avg'] or 0,
+        'days': days,
+        'periods': ANALYTICS_PERIODS,
+        'includes_archive': includes_archive,
+        'activity_heatmap': heatmap.activity_heatmap(request.user, today),
+        'diary_words': diary_words,
+        # 行動時間の分布（週単位のスケッチを合わせるため、期間の始まりの週の初めから）
+        'duration_distribution': durations.summary(past_month, today, request.user),
+        'duration_since': durations.week_start(past_month),
+        'snapshot': snapshot.status(),
     }
     
     return render(request, 'myapp/analytics.html', context)
 
+def _summarize_action_rows(rows, today):
+    """
+    行動ログの行（dict）からカテゴリ別統計と週ごとの継続率を計算（アーカイブを含む場合用）
+    """
+    names = categories.names()
+    by_category = {}
+    for row in rows:
+        stats = by_category.setdefault(row['category_id'], {'total': 0, 'completed': 0, 'minutes': 0})
+        stats['total'] += 1
+        stats['completed'] += bool(row['completed'])
+        stats['minutes'] += row['duration_minutes']
+    category_analytics = [
+        {
+            'category__name': names.get(category_id, ''),
+            'total_actions': stats['total'],
+            'avg_duration': stats['minutes'] / stats['total'],
+            'completion_rate': stats['completed'] * 100.0 / stats['total'],
+        }
+        for category_id, stats in by_category.items()
+    ]
+    
+    weekly_completion = []
+    for i in range(4):
+        week_start = today - timedelta(days=7 * (i + 1))
+        week_end = week_start + timedelta(days=6)
+        week_rows = [row for row in rows if week_start <= row['date'] <= week_end]
+        total = len(week_rows)
+        completed = sum(1 for row in week_rows if row['completed'])
+        weekly_completion.append({
+            'week': f"{week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')}",
+            'rate': (completed / total * 100) if total > 0 else 0,
+            'total': total
+        })
+    return category_analytics, weekly_completion
+
+# =====================
+# 習慣ランキング（参加ユーザーのみ）
+# =====================
+@login_required
+def leaderboard_view(request):
+    """
+    カテゴリ・期間（今週・今月）ごとのランキング。完了した時間・最長連続日数・完了率で並べる。
+    上位と自分の順位は、各プロセスが持つ順位表から求める（表示のたびに並べ替えない）。
+    """
+    all_categories = categories.all_categories()
+    category = categories.get(request.GET.get('category')) or (all_categories[0] if all_categories else None)
+    period = request.GET.get('period', 'week')
+    if period not in dict(LeaderboardScore.PERIODS):
+        period = 'week'
+    metric = request.GET.get('metric', 'minutes')
+    if metric not in leaderboard.METRICS:
+        metric = 'minutes'
+    
+    participating = UserProfile.objects.filter(user=request.user, share_on_leaderboard=True).exists()
+    standings = None
+    if category is not None:
+        standings = leaderboard.standings(category.pk, period, metric, request.user.pk)
+        # 表示名は上位のユーザーの分だけ取得
+        names = dict(User.objects.filter(
+            id__in=[user_id for _, user_id, _ in standings['top']]
+        ).values_list('id', 'username'))
+        standings['top'] = [
+            {'rank': rank, 'username': names.get(user_id, ''), 'score': _leaderboard_score(metric, score),
+             'is_self': user_id == request.user.pk}
+            for rank, user_id, score in standings['top']
+        ]
+        if standings['own'] is not None:
+            standings['own']['score'] = _leaderboard_score(metric, standings['own']['score'])
+    
+    return render(request, 'myapp/leaderboard.html', {
+        'categories': all_categories,
+        'category': category,
+        'periods': LeaderboardScore.PERIODS,
+        'period': period,
+        'metrics': [(name, label) for name, (label, _) in leaderboard.METRICS.items()],
+        'metric': metric,
+        'metric_label': leaderboard.METRICS[metric][0],
+        'unit': leaderboard.METRICS[metric][1],
+        'min_actions_for_rate': leaderboard.MIN_ACTIONS_FOR_RATE,
+        'standings': standings,
+        'participating': participating,
+    })
+
+def _leaderboard_score(metric, score):
+    # 完了率は 0.1% 単位で持っている
+    return f'{score / 10:.1f}' if metric == 'rate' else score
+
+# =====================
+# 運営向け全体分析（JSON）
+# =====================
+@staff_member_required
+@snapshot.reads_from_snapshot
+def cohort_analytics_api(request):
+    """
+    集計キューブから全ユーザー横断の指標をJSONで返す（スタッフのみ）。
+    ?weeks= で集計期間（週数、最大104）を指定可能。
+    duration_distribution はカテゴリごとの行動時間の中央値・90パーセンタイル・ヒストグラム（全ユーザーの分布を合わせたもの）。
+    snapshot_taken_at はスナップショットから読んだ場合のデータ時点（最新のDBを読んだ場合は null）。
+    """
+    weeks = request.GET.get('weeks', '12')
+    weeks = min(int(weeks), 104) if weeks.isdigit() and int(weeks) > 0 else 12
+    status = snapshot.status()
+    today = date.today()
+    return JsonResponse({
+        **cube.summary(weeks, today),
+        'duration_distribution': durations.summary(today - timedelta(weeks=weeks), today),
+        'snapshot_taken_at': status['taken_at'].isoformat() if status['in_use'] else None,
+    })
+
+# =====================
+# オフライン端末からの一括同期（JSON）
+# =====================
+@require_POST
+def sync_api(request):
+    """
+    行動ログ・日記の作成・編集をまとめて受け取り、1回の通信で保存する。
+    各項目の client_id により、同じバッチを再送しても重複しない。
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'errors': {'auth': ['ログインが必要です。']}}, status=401)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        return JsonResponse({'errors': {'batch': ['JSONオブジェクトを送信してください。']}}, status=400)
+    
+    results, errors = sync.sync_batch(request.user, payload)
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    return JsonResponse(results)
+
+# =====================
+# 端末との差分同期（JSON）
+# =====================
+def changes_api(request):
+    """
+    前回の同期以降の変更（日記・行動ログ・目標・AI提案）を変更番号順に返す。
+    ?since= に前回の応答の next を、?limit= に1回の件数を指定する。
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'errors': {'auth': ['ログインが必要です。']}}, status=401)
+    since = request.GET.get('since', '0')
+    limit = request.GET.get('limit', str(changes.CHANGES_PAGE_SIZE))
+    errors = {}
+    if not since.isdigit():
+        errors['since'] = ['変更番号は0以上の整数で指定してください。']
+    if not limit.isdigit() or int(limit) == 0:
+        errors['limit'] = ['件数は1以上の整数で指定してください。']
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    
+    return JsonResponse(changes.changes_since(
+        request.user, int(since), min(int(limit), changes.CHANGES_MAX_PAGE_SIZE)
+    ))
+
+def action_name_suggestions_api(request):
+    """
+    行動名の入力補完。?q= で始まる過去の行動名を、よく・最近使ったものから順に返す。
+    ?category= でカテゴリを絞り込み、?limit= で件数を指定する。
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'errors': {'auth': ['ログインが必要です。']}}, status=401)
+    category = request.GET.get('category') or None
+    limit = request.GET.get('limit', str(autocomplete.DEFAULT_LIMIT))
+    errors = {}
+    if category is not None and not category.isdigit():
+        errors['category'] = ['カテゴリIDは整数で指定してください。']
+    if not limit.isdigit() or int(limit) == 0:
+        errors['limit'] = ['件数は1以上の整数で指定してください。']
+    if errors:
+        return JsonResponse({'errors': errors}, status=400)
+    
+    return JsonResponse({'suggestions': autocomplete.suggest(
+        request.user.pk,
+        request.GET.get('q', ''),
+        int(category) if category is not None else None,
+        int(limit),
+    )})
+
+# =====================
+# 運用監視用のメトリクス（Prometheus 形式）
+# =====================
+def metrics_view(request):
+    """
+    全ワーカーを合算したメトリクスを返す（スタッフ、METRICS_TOKEN を付けたアクセス、METRICS_ALLOWED_IPS からのアクセスのみ）
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    allowed = (
+        request.user.is_staff
+        or (token and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()))
+        or request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+    )
+    if not allowed:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# =====================
+# バックグラウンドジョブの状態（JSON）
+# =====================
+def job_status_api(request, job_id):
+    """
+    ジョブの状態を返す（依頼したユーザーとスタッフのみ）
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'errors': {'auth': ['ログインが必要です。']}}, status=401)
+    job = Job.objects.filter(id=job_id).first()
+    if job is None or (job.user_id != request.user.pk and not request.user.is_staff):
+        return JsonResponse({'errors': {'job': ['ジョブが見つかりません。']}}, status=404)
+    
+    return JsonResponse({
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'run_at': job.run_at,
+        'finished_at': job.finished_at,
+        'result': job.result,
+    })
+
 # =====================
 # プロフィールページ
 # =====================
@@ -395,19 +721,34 @@ def profile(request):
         # プロフィール更新処理
         profile.bio = request.POST.get('bio', '')
         profile.notification_enabled = request.POST.get('notification_enabled') == 'on'
-        profile.ai_feedback_frequency = request.POST.get('ai_feedback_frequency', 'daily')
+        try:
+            profile.reminder_time = time.fromisoformat(request.POST.get('reminder_time', ''))
+        except ValueError:
+            pass  # 未入力・不正な値のときは変更しない
+        frequency = request.POST.get('ai_feedback_frequency', 'daily')
+        if frequency in dict(UserProfile._meta.get_field('ai_feedback_frequency').choices):
+            profile.ai_feedback_frequency = frequency  # 選択肢にない値のときは変更しない
+        joined_leaderboard = profile.share_on_leaderboard
+        profile.share_on_leaderboard = request.POST.get('share_on_leaderboard') == 'on'
         
         # 興味のあるカテゴリを更新
         selected_categories = request.POST.getlist('preferred_categories')
         profile.preferred_categories.set(selected_categories)
         
         profile.save()
+        if profile.share_on_leaderboard != joined_leaderboard:
+            # ランキングへの参加・不参加を集計値に反映
+            leaderboard.set_participation(request.user.pk, profile.share_on_leaderboard)
         messages.success(request, 'プロフィールを更新しました。')
         return redirect('myapp:profile')
     
-    categories = HabitCategory.objects.all()
+    # 興味のあるカテゴリはIDだけを取得し、カテゴリ自体はレジストリから引く
+    preferred_ids = set(profile.preferred_categories.values_list('id', flat=True))
     
     return render(request, 'myapp/profile.html', {
         'profile': profile,
-        'categories': categories
+        'categories': categories.all_categories(),
+        'preferred_categories': [
+            category for category in categories.all_categories() if category.pk in preferred_ids
+        ]
     })
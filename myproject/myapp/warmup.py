@@ -0,0 +1,128 @@
+from importlib import import_module
+import logging
+from pathlib import Path
+import pkgutil
+import time
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.urls import URLResolver, get_resolver
+
+logger = logging.getLogger(__name__)
+
+# =====================
+# ワーカー起動時のウォームアップ
+# =====================
+#
+# 起動直後のリクエストで発生する初回コスト（モジュールの読み込み、URL表の構築、
+# テンプレートのコンパイル、DB接続）を、リクエストを受ける前に済ませる。
+#
+# gunicorn では gunicorn.conf.py の例のように、DB以外はマスター（preload_app）で、
+# DB接続はフォーク後の各ワーカー（post_fork）で行う。接続をフォークで共有しないため。
+
+# ウォームアップの対象にしないサブパッケージ（実行時に読み込まれないもの）
+SKIPPED_PACKAGES = {'migrations', 'management', 'tests'}
+
+
+def _project_apps():
+    """
+    このプロジェクト内（BASE_DIR 以下）のアプリ
+    """
+    base_dir = Path(settings.BASE_DIR).resolve()
+    return [
+        app_config for app_config in apps.get_app_configs()
+        if base_dir in Path(app_config.path).resolve().parents
+    ]
+
+
+def prepare_imports():
+    """
+    プロジェクト内アプリのモジュールをすべて読み込む（NumPy など重い依存もここで読み込まれる）
+    """
+    for app_config in _project_apps():
+        for module in pkgutil.iter_modules([app_config.path]):
+            if module.name not in SKIPPED_PACKAGES:
+                import_module(f'{app_config.name}.{module.name}')
+
+
+def _compile_patterns(resolver):
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex  # 正規表現は初回アクセス時にコンパイルされる
+        if isinstance(pattern, URLResolver):
+            _compile_patterns(pattern)
+
+
+def prepare_urls():
+    """
+    URL表を読み込み、逆引き用の辞書と各パターンの正規表現を作っておく
+    """
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for _, namespace_resolver in resolver.namespace_dict.values():
+        namespace_resolver.reverse_dict
+    _compile_patterns(resolver)
+
+
+def prepare_templates():
+    """
+    プロジェクト内のテンプレートをすべてコンパイルし、テンプレートローダーのキャッシュに載せる
+    """
+    base_dir = Path(settings.BASE_DIR).resolve()
+    for engine in engines.all():
+        for template_dir in engine.template_dirs:
+            template_dir = Path(template_dir).resolve()
+            if template_dir != base_dir and base_dir not in template_dir.parents:
+                continue  # Django 本体・外部アプリのテンプレートは対象外
+            for path in sorted(template_dir.rglob('*.html')):
+                name = path.relative_to(template_dir).as_posix()
+                try:
+                    engine.get_template(name)
+                except TemplateSyntaxError:
+                    logger.exception('テンプレート %s をコンパイルできませんでした', name)
+
+
+def prepare_database():
+    """
+    DB接続を確立し、プロセス内に保持するカテゴリ一覧・AI提案ルールを読み込む
+    """
+    for alias in connections:
+        if connections[alias].settings_dict.get('SNAPSHOT_OF'):
+            continue  # 分析用スナップショットは作成前のことがあり、使うときに開く
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    cache.get('warmup')  # キャッシュの接続・ディレクトリ確認
+
+    # NumPy などの読み込み時間は imports の手順に含めるため、ここで読み込む
+    from . import categories, rules
+    categories.all_categories()
+    rules.get_ruleset()
+
+
+# 実行順のウォームアップ手順
+STEPS = {
+    'imports': prepare_imports,
+    'urls': prepare_urls,
+    'templates': prepare_templates,
+    'database': prepare_database,
+}
+
+
+def warm_up(steps=None):
+    """
+    ウォームアップを実行し、{手順名: 所要秒数} を返す。
+    steps で実行する手順を選べる（既定はすべて）。
+    """
+    timings = {}
+    for name, step in STEPS.items():
+        if steps is not None and name not in steps:
+            continue
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    logger.info(
+        'ウォームアップ完了: %s',
+        ', '.join(f'{name}={seconds * 1000:.1f}ms' for name, seconds in timings.items())
+    )
+    return timings
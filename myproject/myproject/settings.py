@@ -41,11 +41,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'myproject.myapp.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'myproject.myapp.middleware.ShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,6 +83,38 @@ DATABASES = {
     }
 }
 
+# ユーザー別データ（日記・行動ログ・目標・AI提案・プロフィール）を分けて保存する SQLite ファイルの数。
+# 1 のときはすべて default に保存する。増やしたら migrate_shards → rebalance_shards を実行。
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', '1'))
+for i in range(1, SHARD_COUNT):
+    DATABASES[f'shard{i}'] = {
+        'ENGINE': 'myproject.myapp.shard_sqlite',
+        'NAME': BASE_DIR / f'db_shard{i}.sqlite3',
+    }
+if SHARD_COUNT > 1:
+    # シャードから default を読んでいる間も書き込めるよう、すべてのファイルを WAL モードにする
+    for database in DATABASES.values():
+        database['OPTIONS'] = {'init_command': 'PRAGMA journal_mode = WAL'}
+SHARD_DATABASES = ['default'] + [f'shard{i}' for i in range(1, SHARD_COUNT)]
+
+# 分析用の読み取り専用スナップショット（refresh_snapshot で作成）。
+# 分析ページ・運営向け集計は、作成から ANALYTICS_SNAPSHOT_MAX_AGE 秒以内のスナップショットを読む（0 で無効）。
+ANALYTICS_SNAPSHOT_DIR = BASE_DIR / 'snapshots'
+ANALYTICS_SNAPSHOT_MAX_AGE = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', '300'))
+for alias in SHARD_DATABASES:
+    DATABASES[f'{alias}_snapshot'] = {
+        'ENGINE': DATABASES[alias]['ENGINE'],
+        'NAME': f"file:{ANALYTICS_SNAPSHOT_DIR / f'{alias}.sqlite3'}?mode=ro",
+        'SNAPSHOT_OF': alias,
+        'SHARED': 'default_snapshot',
+        'TEST': {'MIRROR': alias},
+    }
+
+DATABASE_ROUTERS = [
+    'myproject.myapp.snapshot.SnapshotRouter',
+    'myproject.myapp.shards.ShardRouter',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -130,6 +164,75 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ホット/コールド階層化：この日数より古い行動ログ・AI提案をアーカイブへ移す
+ARCHIVE_HORIZON_DAYS = 90
+ARCHIVE_DIR = BASE_DIR / 'archive'
+# アーカイブのセグメントをユーザーID の剰余でこの数に分ける（1ユーザー分の読み込みで開くファイルを 1/この数 にする）
+ARCHIVE_USER_BUCKETS = 64
+
+# AI提案・振り返りレポートの生成をバックグラウンドジョブ（manage.py run_workers）に任せる
+AI_COACH_ASYNC = False
+
+# リマインダー通知の送信先（DatabaseOutbox / FileOutbox / EmailOutbox）
+NOTIFICATION_OUTBOX = 'myproject.myapp.notifications.DatabaseOutbox'
+
+# メトリクス（/metrics）：各プロセスの値を書き出すディレクトリと、スタッフ以外が取得する方法。
+# 既定はスタッフのみ。収集側には METRICS_TOKEN を渡し「Authorization: Bearer <トークン>」で取得させる。
+# METRICS_ALLOWED_IPS は REMOTE_ADDR で判定するため、リバースプロキシ（nginx など）の接続元を入れないこと
+# （プロキシ経由のアクセスはすべてプロキシのアドレスになり、誰でも取得できてしまう）。
+METRICS_DIR = BASE_DIR / 'metrics'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = []
+
+# スロークエリログ：この時間（ミリ秒）以上かかったSQLを、実行計画・発行元とともに SLOW_QUERY_LOG へ記録（0 で無効）。
+# 実際のファイルはプロセスごとに slow_queries.<pid>.log となり、それぞれ maxBytes × backupCount までローテーションする。
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_LOG = BASE_DIR / 'slow_queries.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'myproject.myapp.slowlog.ProcessRotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'myproject.myapp.slowlog': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# キャッシュ（複数ワーカー間で共有するためファイルに保存）
+# default は活動カレンダーなどユーザーごとの内容を置くため、上限をユーザー数より十分大きくする
+# （上限に達すると 1/CULL_FREQUENCY の件数が無作為に削除される）。
+# versions は期限なしのバージョンキー（1ユーザーあたり数件、数十バイト）用で、間引かない。
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '50000'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'versions',
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
 # ログイン・ログアウト設定
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
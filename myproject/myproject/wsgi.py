@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.myproject.settings')
 
 application = get_wsgi_application()
+
+# DJANGO_WARMUP=1 のとき、リクエストを受ける前にURL表・テンプレート・DB接続などを準備する。
+# （gunicorn で preload_app を使う場合は gunicorn.conf.py のフックで行うため不要）
+if os.environ.get('DJANGO_WARMUP') == '1':
+    from myproject.myapp.warmup import warm_up
+    warm_up()